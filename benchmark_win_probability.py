@@ -0,0 +1,255 @@
+"""
+Win Probability Backtest
+
+Replays the archived bucket games in time order, builds each player's features
+as of the game with the same code the Win Probability page uses, and scores
+the model against the ELO baseline. Reports AUC, Brier score, log loss,
+calibration and serving throughput in one run.
+
+Usage:
+    python benchmark_win_probability.py
+    python benchmark_win_probability.py --max-games 5000 --output backtest.json
+"""
+
+import argparse
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+from sklearn.metrics import roc_auc_score, brier_score_loss, log_loss
+
+from utils import model_registry
+from utils.win_probability import (
+    ELO_FALLBACK_THRESHOLD, MIN_GAMES_REQUIRED, calculate_elo_expected,
+    calculate_player_features, predict_win_probability, process_games_for_player
+)
+
+DATA_DIR = os.path.join("pages", "bucket_data")
+MODEL_PATH = os.path.join("pages", "models", "global_model_optimized.pkl")
+REGISTRY_NAME = "win_probability"
+
+BUCKETS = [
+    "800-1000", "1000-1200", "1200-1400", "1400-1600", "1600-1800",
+    "1800-2000", "2000-2200", "2200-2400", "2400+"
+]
+
+HISTORY_GAMES = 100  # Same window the page fetches per player
+CALIBRATION_BINS = 10
+
+
+def load_model_package(model_path):
+    model_package = model_registry.load_model(REGISTRY_NAME)
+    if model_package is not None:
+        print(f"Model: registry version {model_package['version']}")
+        return model_package
+    with open(model_path, 'rb') as f:
+        print(f"Model: {model_path}")
+        return pickle.load(f)
+
+
+def load_histories(data_dir, buckets):
+    """Map lowercase username -> games sorted newest first, across all buckets."""
+    histories = {}
+    for bucket in buckets:
+        safe_name = bucket.replace('+', '_plus')
+        file_path = os.path.join(data_dir, f"bucket_{safe_name}_games.json")
+        if not os.path.exists(file_path):
+            print(f"  {bucket}: not found, skipping")
+            continue
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+        for username, games in data.items():
+            histories.setdefault(username.lower(), []).extend(games)
+        print(f"  {bucket}: {len(data)} players")
+
+    for username, games in histories.items():
+        unique = {g['id']: g for g in games if g.get('id')}
+        histories[username] = sorted(unique.values(), key=lambda g: g.get('createdAt', 0), reverse=True)
+    return histories
+
+
+def build_events(histories):
+    """Unique games in both players' archives, oldest first.
+
+    Archives are truncated per player, so a game between two archived
+    players can still be missing from one side's history.
+    """
+    archived = {username: {g['id'] for g in games} for username, games in histories.items()}
+    events = {}
+    for games in histories.values():
+        for game in games:
+            players = game.get('players', {})
+            white = players.get('white', {}).get('user', {}).get('name', '').lower()
+            black = players.get('black', {}).get('user', {}).get('name', '').lower()
+            if (white in archived and black in archived and game['id'] not in events
+                    and game['id'] in archived[white] and game['id'] in archived[black]):
+                events[game['id']] = (game.get('createdAt', 0), game, white, black)
+    return sorted(events.values(), key=lambda e: e[0])
+
+
+def index_processed_games(histories):
+    """Per player: game id -> position, and each game processed once by the serving code."""
+    positions = {}
+    processed = {}
+    for username, games in histories.items():
+        positions[username] = {g['id']: i for i, g in enumerate(games)}
+        processed[username] = [
+            (process_games_for_player([g], username) or [None])[0] for g in games
+        ]
+    return positions, processed
+
+
+def features_as_of(username, game_id, positions, processed):
+    """Player features from the HISTORY_GAMES games played before ``game_id``."""
+    idx = positions[username][game_id]
+    window = processed[username][idx + 1: idx + 1 + HISTORY_GAMES]
+    return calculate_player_features([p for p in window if p is not None])
+
+
+def calibration_table(y_true, y_prob, n_bins=CALIBRATION_BINS):
+    bins = np.clip((y_prob * n_bins).astype(int), 0, n_bins - 1)
+    counts = np.bincount(bins, minlength=n_bins)
+    predicted = np.bincount(bins, weights=y_prob, minlength=n_bins)
+    observed = np.bincount(bins, weights=y_true, minlength=n_bins)
+    rows = []
+    for b in range(n_bins):
+        if counts[b]:
+            rows.append({
+                'bin': f"{b / n_bins:.1f}-{(b + 1) / n_bins:.1f}",
+                'predicted': predicted[b] / counts[b],
+                'observed': observed[b] / counts[b],
+                'count': int(counts[b])
+            })
+    return rows
+
+
+def score(y_true, y_prob):
+    y_prob = np.clip(y_prob, 1e-6, 1 - 1e-6)
+    return {
+        'auc': roc_auc_score(y_true, y_prob),
+        'brier': brier_score_loss(y_true, y_prob),
+        'log_loss': log_loss(y_true, y_prob),
+        'calibration': calibration_table(y_true, y_prob)
+    }
+
+
+def run_backtest(model_package, histories, max_games=None):
+    positions, processed = index_processed_games(histories)
+    events = build_events(histories)
+    if max_games:
+        events = events[-max_games:]
+
+    y_true, model_probs, elo_probs = [], [], []
+    fallback_count = 0
+    skipped = 0
+    feature_time = 0.0
+    predict_time = 0.0
+
+    for _, game, white, black in events:
+        start = time.perf_counter()
+        white_features = features_as_of(white, game['id'], positions, processed)
+        black_features = features_as_of(black, game['id'], positions, processed)
+        feature_time += time.perf_counter() - start
+
+        if white_features is None or black_features is None:
+            skipped += 1
+            continue
+
+        start = time.perf_counter()
+        prob_white, _, _, _, used_fallback = predict_win_probability(
+            model_package, white_features, black_features, True
+        )
+        predict_time += time.perf_counter() - start
+
+        # Same target as training: white win = 1, draw or loss = 0
+        y_true.append(1 if game.get('winner') == 'white' else 0)
+        model_probs.append(prob_white)
+        elo_probs.append(calculate_elo_expected(black_features['rating'] - white_features['rating']))
+        fallback_count += int(used_fallback)
+
+    evaluated = len(y_true)
+    if evaluated == 0 or len(set(y_true)) < 2:
+        return None
+
+    y_true = np.array(y_true)
+    return {
+        'games_replayed': len(events),
+        'games_evaluated': evaluated,
+        'games_skipped': skipped,
+        'elo_fallbacks': fallback_count,
+        'model': score(y_true, np.array(model_probs)),
+        'elo': score(y_true, np.array(elo_probs)),
+        'throughput': {
+            'feature_players_per_sec': 2 * len(events) / feature_time if feature_time else 0,
+            'predictions_per_sec': evaluated / predict_time if predict_time else 0,
+            'end_to_end_per_sec': evaluated / (feature_time + predict_time)
+        }
+    }
+
+
+def print_report(report):
+    print(f"\n{'=' * 60}")
+    print("BACKTEST RESULTS")
+    print(f"{'=' * 60}")
+    print(f"Games replayed:  {report['games_replayed']:,}")
+    print(f"Games evaluated: {report['games_evaluated']:,} "
+          f"(skipped {report['games_skipped']:,} with fewer than {MIN_GAMES_REQUIRED} prior games)")
+    print(f"ELO fallbacks:   {report['elo_fallbacks']:,} (|diff| > {ELO_FALLBACK_THRESHOLD})")
+
+    print(f"\n{'Model':<15} {'AUC':>8} {'Brier':>8} {'LogLoss':>9}")
+    print("-" * 43)
+    for label, key in [('Win Prob Model', 'model'), ('ELO Baseline', 'elo')]:
+        m = report[key]
+        print(f"{label:<15} {m['auc']:>8.4f} {m['brier']:>8.4f} {m['log_loss']:>9.4f}")
+    print(f"AUC vs ELO: {(report['model']['auc'] - report['elo']['auc']) * 100:+.2f}%")
+
+    for label, key in [('Model', 'model'), ('ELO', 'elo')]:
+        print(f"\nCalibration ({label})")
+        print(f"{'Bin':<10} {'Predicted':>10} {'Observed':>10} {'Count':>8}")
+        for row in report[key]['calibration']:
+            print(f"{row['bin']:<10} {row['predicted']:>10.3f} {row['observed']:>10.3f} {row['count']:>8,}")
+
+    tp = report['throughput']
+    print("\nThroughput")
+    print(f"  Feature builds:  {tp['feature_players_per_sec']:,.0f} players/s")
+    print(f"  Predictions:     {tp['predictions_per_sec']:,.0f} predictions/s")
+    print(f"  End to end:      {tp['end_to_end_per_sec']:,.0f} games/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the win probability model on archived games")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--model", default=MODEL_PATH, help="Pickle used when no registry version is active")
+    parser.add_argument("--max-games", type=int, default=None, help="Only replay the most recent N games")
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("WIN PROBABILITY BACKTEST")
+    print("=" * 60)
+
+    model_package = load_model_package(args.model)
+
+    print("\nLoading archived games...")
+    histories = load_histories(args.data_dir, BUCKETS)
+    if not histories:
+        print("ERROR: No bucket data found")
+        return
+
+    report = run_backtest(model_package, histories, args.max_games)
+    if report is None:
+        print("ERROR: Not enough games with history for both players")
+        return
+
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
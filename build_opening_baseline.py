@@ -0,0 +1,87 @@
+"""
+Opening Population Baseline
+
+Builds the expected-score table the Opening Repertoire page compares players
+against: score per (opening family, color, rating band) over every archived
+bucket game. The table is saved as a NumPy array the page memory-maps.
+
+Usage:
+    python build_opening_baseline.py
+    python build_opening_baseline.py --data-dir pages/bucket_data --output-dir pages/opening_baseline
+"""
+
+import argparse
+import json
+import os
+import time
+
+from utils.opening_baseline import (
+    ALL_BANDS, BASELINE_DIR, BAND_LABELS, COLORS, MIN_BASELINE_GAMES, build_baseline, save_baseline, split_keys
+)
+
+DATA_DIR = os.path.join("pages", "bucket_data")
+
+BUCKETS = [
+    "800-1000", "1000-1200", "1200-1400", "1400-1600", "1600-1800",
+    "1800-2000", "2000-2200", "2200-2400", "2400+"
+]
+
+
+def load_unique_games(data_dir, buckets):
+    """Every archived game once, even when both players are in the buckets."""
+    games = {}
+    for bucket in buckets:
+        safe_name = bucket.replace('+', '_plus')
+        file_path = os.path.join(data_dir, f"bucket_{safe_name}_games.json")
+        if not os.path.exists(file_path):
+            print(f"  {bucket}: not found, skipping")
+            continue
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+        for player_games in data.values():
+            for game in player_games:
+                if game.get('id'):
+                    games[game['id']] = game
+        print(f"  {bucket}: {len(data)} players")
+    return list(games.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the opening population baseline table")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--output-dir", default=BASELINE_DIR)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("OPENING POPULATION BASELINE")
+    print("=" * 60)
+
+    print("\nLoading archived games...")
+    games = load_unique_games(args.data_dir, BUCKETS)
+    if not games:
+        print("ERROR: No archived games found")
+        return
+
+    start = time.perf_counter()
+    table, openings = build_baseline(games)
+    elapsed = time.perf_counter() - start
+    save_baseline(table, openings, args.output_dir)
+
+    opening, color, band = split_keys(table['key'])
+    detailed = (opening < len(openings)) & (band < ALL_BANDS)
+    usable = (table['games'][detailed] >= MIN_BASELINE_GAMES).sum()
+
+    print(f"\nBuilt from {len(games):,} games in {elapsed:.2f}s")
+    print(f"  Openings: {len(openings):,}")
+    print(f"  Opening x color x band rows: {detailed.sum():,} ({usable:,} with {MIN_BASELINE_GAMES}+ games)")
+    print("\nPopulation score by band:")
+    for row, row_opening, row_color, row_band in zip(table, opening, color, band):
+        if row_opening != len(openings) or row_band == ALL_BANDS:
+            continue
+        score = (row['wins'] + 0.5 * row['draws']) / row['games'] * 100
+        print(f"  {COLORS[row_color]:<5} {BAND_LABELS[row_band]:>9}: {score:5.1f}% over {row['games']:,} games")
+    print(f"Saved to: {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Model Registry Exporter
+
+Converts a pickled model package (as saved by the training notebooks) into a
+versioned registry entry that the app loads without unpickling and hot-reloads
+when the CURRENT pointer changes.
+
+Usage:
+    python export_model_registry.py pages/win_probability_model.pkl win_probability
+    python export_model_registry.py pages/rating_models/rating_prediction_model.pkl rating_prediction
+    python export_model_registry.py --activate rating_prediction 20250101-120000
+"""
+
+import argparse
+import pickle
+
+from utils.model_registry import REGISTRY_DIR, activate_version, export_model_package, list_versions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export pickled model packages into the model registry")
+    parser.add_argument("source", help="Path to the pickled package, or the model name with --activate")
+    parser.add_argument("name", help="Registry name (e.g. win_probability), or the version with --activate")
+    parser.add_argument("--version", help="Version label (default: timestamp)")
+    parser.add_argument("--registry", default=REGISTRY_DIR, help="Registry directory")
+    parser.add_argument("--no-activate", action="store_true", help="Export without switching CURRENT")
+    parser.add_argument("--activate", action="store_true", help="Only switch CURRENT to an existing version")
+    args = parser.parse_args()
+
+    if args.activate:
+        activate_version(args.source, args.name, args.registry)
+        print(f"Activated {args.source}/{args.name}")
+        return
+
+    with open(args.source, 'rb') as f:
+        model_package = pickle.load(f)
+
+    version_dir = export_model_package(
+        model_package,
+        args.name,
+        registry_dir=args.registry,
+        version=args.version,
+        activate=not args.no_activate
+    )
+
+    print(f"Exported {args.source} -> {version_dir}")
+    print(f"Versions: {', '.join(list_versions(args.name, args.registry))}")
+
+
+if __name__ == "__main__":
+    main()
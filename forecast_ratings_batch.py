@@ -0,0 +1,169 @@
+"""
+Batch Rating Forecasts
+
+Forecasts every player's rating for the next N days in one batched run and
+writes the results to a Parquet table (one row per player per day). Players
+come from the archived bucket games, a Lichess team, explicit usernames, or
+any combination.
+
+Usage:
+    python forecast_ratings_batch.py
+    python forecast_ratings_batch.py --no-buckets --team my-club --days 60
+    python forecast_ratings_batch.py --no-buckets --users Hikaru DrNykterstein
+"""
+
+import argparse
+import json
+import os
+import pickle
+import time
+from datetime import datetime
+
+import pandas as pd
+import requests
+
+from utils import model_registry
+from utils.rating_forecast import forecast_ratings_batch
+from utils.rating_series import build_daily_rating_series, create_grouped_features, games_to_rating_df
+from utils.win_probability import fetch_user_games, get_api_headers
+
+DATA_DIR = os.path.join("pages", "bucket_data")
+MODEL_PATH = os.path.join("pages", "rating_models", "rating_prediction_model.pkl")
+REGISTRY_NAME = "rating_prediction"
+OUTPUT_PATH = os.path.join("forecasts", "rating_forecasts.parquet")
+
+BUCKETS = [
+    "800-1000", "1000-1200", "1200-1400", "1400-1600", "1600-1800",
+    "1800-2000", "2000-2200", "2200-2400", "2400+"
+]
+
+MIN_DAYS = 14  # Same minimum history the Rating Prediction page requires
+
+
+def load_model_package(model_path):
+    model_package = model_registry.load_model(REGISTRY_NAME)
+    if model_package is not None:
+        print(f"Model: registry version {model_package['version']}")
+        return model_package
+    with open(model_path, 'rb') as f:
+        print(f"Model: {model_path}")
+        return pickle.load(f)
+
+
+def load_bucket_games(data_dir, buckets):
+    """Map lowercase username -> archived games across all buckets."""
+    games_by_user = {}
+    for bucket in buckets:
+        safe_name = bucket.replace('+', '_plus')
+        file_path = os.path.join(data_dir, f"bucket_{safe_name}_games.json")
+        if not os.path.exists(file_path):
+            print(f"  {bucket}: not found, skipping")
+            continue
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+        for username, games in data.items():
+            games_by_user.setdefault(username.lower(), []).extend(games)
+        print(f"  {bucket}: {len(data)} players")
+    return games_by_user
+
+
+def fetch_team_members(team_id):
+    """Usernames of a Lichess team's members."""
+    url = f"https://lichess.org/api/team/{team_id}/users"
+    response = requests.get(url, headers=get_api_headers(), stream=True, timeout=60)
+    response.raise_for_status()
+    return [json.loads(line)['username'] for line in response.iter_lines() if line]
+
+
+def fetch_games(usernames, perf_type, max_games):
+    games_by_user = {}
+    for i, username in enumerate(usernames, 1):
+        games, error = fetch_user_games(username, max_games=max_games, perf_type=perf_type)
+        if error:
+            print(f"  [{i}/{len(usernames)}] {username}: {error}")
+            continue
+        games_by_user[username.lower()] = games
+        print(f"  [{i}/{len(usernames)}] {username}: {len(games)} games")
+    return games_by_user
+
+
+def build_forecast_table(model_package, games_by_user, days, min_days=MIN_DAYS):
+    """Long table of forecasts: username, day, date, predicted_rating, current_rating."""
+    # Drop games seen twice (same player in several buckets, or bucket + API)
+    games_by_user = {
+        user: list({g.get('id', i): g for i, g in enumerate(games)}.values())
+        for user, games in games_by_user.items()
+    }
+    daily = build_daily_rating_series(games_to_rating_df(games_by_user), min_games=1, min_days=min_days)
+    if daily.empty:
+        return None
+    features = create_grouped_features(daily).fillna(0)
+
+    usernames, predictions = forecast_ratings_batch(model_package, features, days=days)
+
+    last = features.groupby('username', sort=False).last().loc[usernames]
+    forecast = pd.DataFrame(predictions, index=pd.Index(usernames, name='username'),
+                            columns=pd.RangeIndex(1, days + 1, name='day'))
+    table = forecast.stack().rename('predicted_rating').reset_index()
+    table['date'] = table['username'].map(last['date']) + pd.to_timedelta(table['day'], unit='D')
+    table['current_rating'] = table['username'].map(last['rating'])
+    table['model_version'] = model_package.get('version', 'pickle')
+    table['generated_at'] = datetime.now()
+    return table[['username', 'day', 'date', 'predicted_rating', 'current_rating',
+                  'model_version', 'generated_at']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forecast ratings for many players in one batch")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--no-buckets", action="store_true", help="Skip the archived bucket players")
+    parser.add_argument("--team", help="Also forecast every member of this Lichess team")
+    parser.add_argument("--users", nargs="*", default=[], help="Also forecast these Lichess usernames")
+    parser.add_argument("--perf", default="blitz", help="Game type fetched for --team/--users")
+    parser.add_argument("--max-games", type=int, default=500, help="Games fetched per player from the API")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--model", default=MODEL_PATH, help="Pickle used when no registry version is active")
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("BATCH RATING FORECAST")
+    print("=" * 60)
+
+    model_package = load_model_package(args.model)
+
+    games_by_user = {}
+    if not args.no_buckets:
+        print("\nLoading archived games...")
+        games_by_user.update(load_bucket_games(args.data_dir, BUCKETS))
+
+    usernames = list(args.users)
+    if args.team:
+        print(f"\nFetching members of team {args.team}...")
+        usernames += fetch_team_members(args.team)
+    if usernames:
+        print(f"\nFetching {args.perf} games for {len(usernames)} players...")
+        for user, games in fetch_games(usernames, args.perf, args.max_games).items():
+            games_by_user.setdefault(user, []).extend(games)
+
+    if not games_by_user:
+        print("ERROR: No players to forecast")
+        return
+
+    start = time.perf_counter()
+    table = build_forecast_table(model_package, games_by_user, args.days)
+    if table is None:
+        print(f"ERROR: No player has {MIN_DAYS}+ active days")
+        return
+    elapsed = time.perf_counter() - start
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    table.to_parquet(args.output, index=False)
+
+    players = table['username'].nunique()
+    print(f"\nForecast {players:,} players x {args.days} days in {elapsed:.2f}s")
+    print(f"Saved {len(table):,} rows to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
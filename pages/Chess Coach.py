@@ -10,6 +10,9 @@ import sys
 import time
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.session_manager import get_username, set_username
+from utils.engine_pool import ENGINE_PATH, EnginePool
+from utils.eval_cache import EvalCache
+from utils.game_review import review_games
 
 try:
     from dotenv import load_dotenv
@@ -199,6 +202,7 @@ st.markdown("""
 GROQ_API_KEY = os.environ.get('GROQ_API_KEY')
 DEFAULT_MAX_GAMES = 200
 MAX_GAMES_OPTIONS = [100, 200, 500, 1000]
+REVIEW_GAMES_OPTIONS = [0, 10, 25, 50]  # Most recent games reviewed by the local engine (0 = off)
 TIME_FILTERS = {
     "All Time": None,
     "Last Week": 7,
@@ -257,8 +261,20 @@ def fetch_user_games(username, max_games=200, perf_type="blitz", since_days=None
         return None, f"Error: {str(e)}"
 
 
-def analyze_games(games, username):
-    """Comprehensive game analysis"""
+@st.cache_resource
+def get_engine_pool():
+    """Local UCI engines shared across sessions, with the on-disk eval cache, or None"""
+    if not ENGINE_PATH:
+        return None
+    try:
+        return EnginePool(ENGINE_PATH, cache=EvalCache())
+    except Exception:
+        return None
+
+
+def analyze_games(games, username, reviews=None, cached_reviews=None):
+    """Comprehensive game analysis; ``reviews`` are engine reviews by game id,
+    ``cached_reviews`` reviews of other games from the eval cache (accuracy only)"""
     if not games:
         return None
     
@@ -286,7 +302,7 @@ def analyze_games(games, username):
         'opponents': defaultdict(lambda: {'games': 0, 'wins': 0, 'losses': 0, 'rating': 0}),
         'hourly_performance': defaultdict(lambda: {'games': 0, 'wins': 0}),
         'rating_history': [],
-        'blunders_estimate': 0
+        'engine_review': None
     }
     
     total_moves = 0
@@ -296,6 +312,8 @@ def analyze_games(games, username):
     week_ago = today - timedelta(days=7)
     accuracy_sum = 0
     accuracy_count = 0
+    reviews = reviews or {}
+    cached_reviews = cached_reviews or {}
     
     for i, game in enumerate(games):
         players = game.get('players', {})
@@ -385,8 +403,11 @@ def analyze_games(games, username):
                 if stats['worst_loss'] is None or opponent_rating < stats['worst_loss']:
                     stats['worst_loss'] = opponent_rating
         
-        # Accuracy
+        # Accuracy: Lichess's when the game was analyzed there, otherwise the local engine review
         player_accuracy = player_info.get('accuracy')
+        review = reviews.get(game.get('id')) or cached_reviews.get(game.get('id'))
+        if not player_accuracy and review:
+            player_accuracy = review['accuracy']
         if player_accuracy:
             accuracy_sum += player_accuracy
             accuracy_count += 1
@@ -414,6 +435,20 @@ def analyze_games(games, username):
     stats['time_trouble_rate'] = stats['time_trouble_games'] / stats['total_games'] * 100 if stats['total_games'] > 0 else 0
     stats['avg_accuracy'] = accuracy_sum / accuracy_count if accuracy_count > 0 else 0
     
+    # Engine review totals
+    if reviews:
+        reviewed = list(reviews.values())
+        review_accuracy = [r['accuracy'] for r in reviewed if r['accuracy'] is not None]
+        review_acpl = [r['acpl'] for r in reviewed if r['acpl'] is not None]
+        stats['engine_review'] = {
+            'games': len(reviewed),
+            'blunders_per_game': sum(r['blunders'] for r in reviewed) / len(reviewed),
+            'mistakes_per_game': sum(r['mistakes'] for r in reviewed) / len(reviewed),
+            'inaccuracies_per_game': sum(r['inaccuracies'] for r in reviewed) / len(reviewed),
+            'accuracy': np.mean(review_accuracy) if review_accuracy else 0,
+            'acpl': np.mean(review_acpl) if review_acpl else 0
+        }
+    
     # Rating change
     if len(stats['rating_history']) >= 20:
         stats['rating_change'] = stats['current_rating'] - stats['rating_history'][19]['rating']
@@ -510,6 +545,14 @@ def create_system_prompt(stats, username, game_type):
         else:
             accuracy_insight = f"Low accuracy ({stats['avg_accuracy']:.1f}%) - consider playing slower time controls"
     
+    # Engine review insight
+    review_str = ""
+    review = stats.get('engine_review')
+    if review:
+        review_str = (f"- Engine review of last {review['games']} games: {review['blunders_per_game']:.1f} blunders, "
+                      f"{review['mistakes_per_game']:.1f} mistakes, {review['inaccuracies_per_game']:.1f} inaccuracies per game "
+                      f"({review['accuracy']:.1f}% accuracy, {review['acpl']:.0f} average centipawn loss)\n")
+    
     # Time management insight
     time_insight = ""
     if stats['time_trouble_rate'] > 30:
@@ -541,7 +584,7 @@ PLAYER PROFILE:
 ACCURACY & TIME:
 - Average Accuracy: {stats['avg_accuracy']:.1f}% (if available)
 - {accuracy_insight}
-- Time Trouble Rate: {stats['time_trouble_rate']:.1f}%
+{review_str}- Time Trouble Rate: {stats['time_trouble_rate']:.1f}%
 - {time_insight}
 - Average Game Length: {stats['avg_moves']:.0f} moves
 
@@ -741,6 +784,12 @@ with st.sidebar:
     time_filter = st.selectbox("Time Filter", list(TIME_FILTERS.keys()), index=0)
     since_days = TIME_FILTERS[time_filter]
     
+    review_count = 0
+    if ENGINE_PATH:
+        review_count = st.selectbox("Engine review", REVIEW_GAMES_OPTIONS, index=0,
+                                    format_func=lambda n: f"Last {n} games" if n else "Off",
+                                    help="Review recent games with the local engine for blunders and accuracy")
+    
     if st.button("📊 Load My Data", type="primary", use_container_width=True):
         if not username:
             st.warning("Enter username!")
@@ -764,7 +813,18 @@ with st.sidebar:
                     games = result
                 
                 if games and not isinstance(games, tuple):
-                    stats = analyze_games(games, username)
+                    reviews = cached_reviews = None
+                    pool = get_engine_pool() if review_count else None
+                    if pool is not None:
+                        review_progress = st.progress(0, text="Reviewing games with the engine...")
+                        cache_before = pool.cache.stats()
+                        reviews = review_games(pool, games[:review_count], username,
+                                               progress=lambda done, total: review_progress.progress(done / total))
+                        review_progress.empty()
+                        st.session_state.review_cache_report = pool.cache.report(cache_before)
+                        # Older games whose positions were all searched before get accuracy for free
+                        cached_reviews = review_games(pool, games[review_count:], username, cached_only=True)
+                    stats = analyze_games(games, username, reviews, cached_reviews)
                     if stats:
                         st.session_state.user_stats = stats
                         st.session_state.coach_username = username
@@ -853,6 +913,19 @@ with st.sidebar:
         if stats['avg_accuracy'] > 0:
             st.markdown(f"**Avg Accuracy:** {stats['avg_accuracy']:.1f}%")
         
+        review = stats.get('engine_review')
+        if review:
+            st.markdown(f"**Engine review ({review['games']} games):** "
+                        f"{review['blunders_per_game']:.1f} blunders, {review['mistakes_per_game']:.1f} mistakes, "
+                        f"{review['inaccuracies_per_game']:.1f} inaccuracies per game, "
+                        f"{review['acpl']:.0f} ACPL")
+            cache_report = st.session_state.get('review_cache_report')
+            if cache_report and cache_report['lookups']:
+                st.caption(f"Eval cache: {cache_report['hit_rate']:.0f}% of {cache_report['lookups']:,} positions "
+                           f"were already known ({cache_report['memory_hits']:,} from memory, "
+                           f"{cache_report['disk_hits']:,} from disk, "
+                           f"{cache_report['repeats']:,} repeated within the batch)")
+        
         st.markdown("---")
         
         # Export options
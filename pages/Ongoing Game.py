@@ -4,10 +4,25 @@ import chess
 import chess.pgn
 from io import StringIO
 import chess.svg
+import chess.engine
+import plotly.graph_objects as go
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.session_manager import get_username, set_username, get_token
+from utils import model_registry
+from utils.cache_manager import fetch_player_features_cached
+from utils.win_probability import calculate_elo_expected, predict_win_probability
+from utils.live_win_probability import LiveWinProbability, parse_base_time
+from utils.eval_cache import EvalCache
+from utils.engine_pool import ENGINE_PATH, EnginePool
+from utils.live_analysis import LiveGameAnalysis
+
+WIN_PROBABILITY_MODEL = "win_probability"
+ENGINE_TIME = 0.1  # Seconds of engine analysis per new position
+LIVE_ENGINES = 2  # Engine processes shared by every viewer of the page
+ANALYSIS_REFRESH = 1.0  # Seconds between checks for finished evals while searches are pending
+JUDGEMENT_MARKS = {'blunder': ('??', '#f44336'), 'mistake': ('?', '#ff9800'), 'inaccuracy': ('?!', '#ffd54f')}
 
 st.set_page_config(
     page_title="Game Viewer",
@@ -100,7 +115,7 @@ def fetch_recent_game_pgn(username, token):
         "Authorization": f"Bearer {token}",
         "Accept": "application/x-chess-pgn"
     }
-    params = {"max": 1, "pgnInJson": False}
+    params = {"max": 1, "pgnInJson": False, "clocks": True}
     try:
         response = requests.get(url, headers=headers, params=params, timeout=10)
         if response.status_code == 200:
@@ -114,21 +129,125 @@ def parse_pgn(pgn_text):
     """Parse PGN and extract game info"""
     game = chess.pgn.read_game(StringIO(pgn_text))
     if game is None:
-        return None, None, None
+        return None, None, None, None
     
     headers = dict(game.headers)
     
-    # Get moves in both UCI and SAN format
+    # Get moves in both UCI and SAN format, plus [%clk] remaining times
     moves_uci = []
     moves_san = []
+    clocks = []
     board = chess.Board()
     
-    for move in game.mainline_moves():
-        moves_san.append(board.san(move))
-        moves_uci.append(move.uci())
-        board.push(move)
+    for node in game.mainline():
+        moves_san.append(board.san(node.move))
+        moves_uci.append(node.move.uci())
+        clocks.append(node.clock())
+        board.push(node.move)
     
-    return headers, moves_uci, moves_san
+    return headers, moves_uci, moves_san, clocks
+
+def perf_type_from_headers(headers):
+    """Lichess perf type from the Event tag, e.g. 'Rated Blitz game' -> 'blitz'"""
+    event = headers.get('Event', '').lower()
+    for perf in ['bullet', 'blitz', 'rapid', 'classical']:
+        if perf in event:
+            return perf
+    return 'blitz'
+
+def pregame_win_probability(headers):
+    """White's pre-game win probability: the win probability model when one is
+    registered and both players have enough games, otherwise ELO from the tags"""
+    white, black = headers.get('White', ''), headers.get('Black', '')
+    model_package = model_registry.load_model(WIN_PROBABILITY_MODEL)
+    if model_package is not None and white and black:
+        perf_type = perf_type_from_headers(headers)
+        white_features, _ = fetch_player_features_cached(white, perf_type)
+        black_features, _ = fetch_player_features_cached(black, perf_type)
+        if white_features and black_features:
+            prob_white, _, _, _, _ = predict_win_probability(model_package, white_features, black_features, True)
+            return prob_white, "Win probability model"
+    
+    try:
+        rating_diff = float(headers.get('BlackElo')) - float(headers.get('WhiteElo'))
+        return calculate_elo_expected(rating_diff), "ELO ratings"
+    except (TypeError, ValueError):
+        return 0.5, "No ratings available"
+
+@st.cache_resource
+def get_engine_pool():
+    """Local UCI engines with the on-disk eval cache, shared across reruns, or None"""
+    if not ENGINE_PATH:
+        return None
+    try:
+        return EnginePool(ENGINE_PATH, size=LIVE_ENGINES, cache=EvalCache())
+    except Exception:
+        return None
+
+def update_live_tracker(headers, moves_uci, clocks, use_engine):
+    """Feed only the new moves to the tracker and engine analysis; start new ones for a new game"""
+    tracker = st.session_state.live_tracker
+    same_game = (
+        tracker is not None
+        and st.session_state.live_site == headers.get('Site')
+        and st.session_state.live_engine == use_engine
+    )
+    if not same_game or not tracker.sync(moves_uci, clocks):
+        pregame_prob, pregame_source = pregame_win_probability(headers)
+        tracker = LiveWinProbability(pregame_prob, parse_base_time(headers.get('TimeControl')))
+        tracker.sync(moves_uci, clocks)
+        st.session_state.live_tracker = tracker
+        st.session_state.live_site = headers.get('Site')
+        st.session_state.live_engine = use_engine
+        st.session_state.pregame_source = pregame_source
+    
+    # Engine evals arrive in the background; only plies not seen before are searched
+    analysis = st.session_state.live_analysis
+    if not use_engine:
+        if analysis is not None:
+            analysis.cancel()
+        st.session_state.live_analysis = None
+    elif not same_game or analysis is None or not analysis.sync(moves_uci):
+        if analysis is not None:
+            analysis.cancel()
+        analysis = LiveGameAnalysis(get_engine_pool(), chess.engine.Limit(time=ENGINE_TIME))
+        analysis.sync(moves_uci)
+        st.session_state.live_analysis = analysis
+
+def apply_engine_evals():
+    """Move finished engine evals into the tracker; returns how many arrived"""
+    analysis = st.session_state.live_analysis
+    tracker = st.session_state.live_tracker
+    if analysis is None or tracker is None:
+        return 0
+    arrived = analysis.poll()
+    for ply, cp in analysis.evals.items():
+        if ply < len(tracker.history):
+            tracker.set_eval(ply, cp)
+    return len(arrived)
+
+def create_live_probability_chart(history, current_index):
+    """White's win probability by ply with the current position marked"""
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=list(range(len(history))),
+        y=[p * 100 for p in history],
+        mode='lines',
+        line=dict(color='#667eea', width=2),
+        fill='tozeroy',
+        fillcolor='rgba(102, 126, 234, 0.2)',
+        hovertemplate='Ply %{x}: %{y:.1f}%<extra></extra>'
+    ))
+    fig.add_hline(y=50, line_dash='dash', line_color='#888')
+    fig.add_vline(x=current_index, line_color='#4CAF50')
+    fig.update_layout(
+        height=220,
+        yaxis=dict(range=[0, 100], title='White win %'),
+        xaxis=dict(title='Ply'),
+        margin=dict(l=20, r=20, t=10, b=20),
+        showlegend=False
+    )
+    return fig
 
 def get_board_at_move(moves_uci, move_index):
     """Get board state at specific move index"""
@@ -152,8 +271,24 @@ def board_to_svg(board, last_move=None, size=400):
         }
     )
 
-def format_moves_display(moves_san, current_index):
-    """Format moves for display with current move highlighted"""
+def format_engine_note(analysis, ply):
+    """Judgement mark and eval after a move, '…' while its search is pending"""
+    if analysis is None:
+        return ''
+    if ply in analysis.pending:
+        return '<small style="color: #777;">…</small>'
+    cp = analysis.evals.get(ply)
+    if cp is None:
+        return ''
+    note = ''
+    judgement = analysis.judgement(ply)
+    if judgement:
+        mark, color = JUDGEMENT_MARKS[judgement]
+        note += f'<span style="color: {color}; font-weight: bold;">{mark}</span>'
+    return note + f'<small style="color: #888;">{cp / 100:+.1f}</small>'
+
+def format_moves_display(moves_san, current_index, analysis=None):
+    """Format moves for display with current move highlighted and engine evals as they arrive"""
     html = '<div style="font-family: monospace; line-height: 2; color: #f0f0f0;">'
     
     for i in range(0, len(moves_san), 2):
@@ -162,22 +297,70 @@ def format_moves_display(moves_san, current_index):
         
         # White's move
         if current_index == i + 1:
-            html += f'<span class="move-current">{moves_san[i]}</span> '
+            html += f'<span class="move-current">{moves_san[i]}</span>{format_engine_note(analysis, i + 1)} '
         else:
-            html += f'<span class="move-item">{moves_san[i]}</span> '
+            html += f'<span class="move-item">{moves_san[i]}</span>{format_engine_note(analysis, i + 1)} '
         
         # Black's move
         if i + 1 < len(moves_san):
             if current_index == i + 2:
-                html += f'<span class="move-current">{moves_san[i+1]}</span> '
+                html += f'<span class="move-current">{moves_san[i+1]}</span>{format_engine_note(analysis, i + 2)} '
             else:
-                html += f'<span class="move-item">{moves_san[i+1]}</span> '
+                html += f'<span class="move-item">{moves_san[i+1]}</span>{format_engine_note(analysis, i + 2)} '
         
         html += '&nbsp;&nbsp;'
     
     html += '</div>'
     return html
 
+def live_analysis_panel(auto_refresh=False):
+    """Win probability and move list, refreshed as engine evals finish"""
+    apply_engine_evals()
+    analysis = st.session_state.live_analysis
+    
+    # Live win probability
+    tracker = st.session_state.live_tracker
+    if tracker is not None:
+        st.markdown("### 📈 Win Probability")
+    
+        current = min(st.session_state.current_move, len(tracker.history) - 1)
+        prob_white = tracker.history[current]
+        delta = prob_white - tracker.history[current - 1] if current > 0 else None
+    
+        col_white_prob, col_black_prob = st.columns(2)
+        with col_white_prob:
+            st.metric("⚪ White", f"{prob_white * 100:.1f}%",
+                      f"{delta * 100:+.1f}%" if delta is not None else None)
+        with col_black_prob:
+            st.metric("⚫ Black", f"{(1 - prob_white) * 100:.1f}%",
+                      f"{-delta * 100:+.1f}%" if delta is not None else None)
+    
+        st.plotly_chart(create_live_probability_chart(tracker.history, current), use_container_width=True)
+        basis = "engine eval" if st.session_state.live_engine else "material"
+        st.caption(f"Pre-game: {tracker.pregame_prob * 100:.1f}% ({st.session_state.pregame_source}), "
+                   f"updated each move from {basis} and clocks")
+        if analysis is not None and analysis.pending:
+            st.caption(f"⏳ Engine: {len(analysis.pending)} positions still being analyzed")
+    
+    # Moves display
+    st.markdown("### 📝 Moves")
+    
+    moves_html = format_moves_display(
+        st.session_state.moves_san, 
+        st.session_state.current_move,
+        analysis
+    )
+    
+    st.markdown(f"""
+    <div style="max-height: 300px; overflow-y: auto; padding: 10px; background: #2d2d2d; border-radius: 10px; color: #f0f0f0;">
+        {moves_html}
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Evals all in: a full rerun re-registers the panel without the refresh timer
+    if auto_refresh and (analysis is None or not analysis.pending):
+        st.rerun()
+
 # Title
 st.markdown("""
 <h1 style="text-align: center;">🎮 Game Viewer</h1>
@@ -197,6 +380,13 @@ if 'moves_san' not in st.session_state:
     st.session_state.moves_san = []
 if 'headers' not in st.session_state:
     st.session_state.headers = {}
+if 'live_tracker' not in st.session_state:
+    st.session_state.live_tracker = None
+    st.session_state.live_site = None
+    st.session_state.live_engine = False
+    st.session_state.pregame_source = None
+if 'live_analysis' not in st.session_state:
+    st.session_state.live_analysis = None
 
 # Sidebar controls
 with st.sidebar:
@@ -214,6 +404,11 @@ with st.sidebar:
     with col2:
         fetch_recent = st.button("📜 Last Game", use_container_width=True)
     
+    use_engine = False
+    if ENGINE_PATH:
+        use_engine = st.checkbox("Use local engine eval", value=False,
+                                 help="Win probability uses the engine score instead of material balance")
+    
     if fetch_ongoing or fetch_recent:
         if username:
             with st.spinner("Fetching game..."):
@@ -223,11 +418,12 @@ with st.sidebar:
                     pgn, error = fetch_recent_game_pgn(username, token)
                 
                 if pgn:
-                    headers, moves_uci, moves_san = parse_pgn(pgn)
+                    headers, moves_uci, moves_san, clocks = parse_pgn(pgn)
                     if headers:
                         st.session_state.headers = headers
                         st.session_state.moves_uci = moves_uci
                         st.session_state.moves_san = moves_san
+                        update_live_tracker(headers, moves_uci, clocks, use_engine and get_engine_pool() is not None)
                         st.session_state.current_move = len(moves_uci)  # Start at final position
                         st.session_state.game_loaded = True
                         st.success(f"✅ Loaded {len(moves_uci)} moves")
@@ -385,19 +581,10 @@ if st.session_state.game_loaded:
         if 'lichess.org' in site:
             st.markdown(f"[🔗 View on Lichess]({site})")
         
-        # Moves display
-        st.markdown("### 📝 Moves")
-        
-        moves_html = format_moves_display(
-            st.session_state.moves_san, 
-            st.session_state.current_move
-        )
-        
-        st.markdown(f"""
-        <div style="max-height: 300px; overflow-y: auto; padding: 10px; background: #2d2d2d; border-radius: 10px; color: #f0f0f0;">
-            {moves_html}
-        </div>
-        """, unsafe_allow_html=True)
+        # Live win probability and moves; re-run every ANALYSIS_REFRESH seconds while evals are pending
+        analysis = st.session_state.live_analysis
+        auto_refresh = analysis is not None and bool(analysis.pending)
+        st.fragment(live_analysis_panel, run_every=ANALYSIS_REFRESH if auto_refresh else None)(auto_refresh)
 
 else:
     # Welcome screen when no game loaded
@@ -6,12 +6,13 @@ import json
 import plotly.express as px
 import plotly.graph_objs as go
 from plotly.subplots import make_subplots
-from collections import defaultdict
-from datetime import datetime, timedelta
+from datetime import timedelta
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.session_manager import get_username, set_username, get_token
+from utils.opening_matcher import OpeningMatcher
+from utils.opening_book import BOOK_PATH, LEFT_BY_LABELS, find_book_deviations, deviation_summary, deviations_by_opening
 
 st.set_page_config(page_title="Opening Coach", page_icon="📚", layout="wide")
 
@@ -548,186 +549,141 @@ def fetch_user_games(username, max_games=500, perf_type="blitz"):
         return None
 
 
-def analyze_opening_performance(games, username):
-    """Comprehensive opening analysis"""
-    opening_stats = defaultdict(lambda: {
-        'games': 0, 'wins': 0, 'draws': 0, 'losses': 0,
-        'as_white': 0, 'as_black': 0,
-        'white_wins': 0, 'black_wins': 0,
-        'accuracy_sum': 0, 'accuracy_count': 0,
-        'time_sum': 0, 'time_count': 0,
-        'avg_opponent_rating': [],
-        'rating_diff_sum': 0,
-        'recent_results': [],
-        'eco_codes': set(),
-        'variations': defaultdict(lambda: {'games': 0, 'wins': 0})
-    })
-    
-    # Track by rating bracket
-    rating_bracket_stats = defaultdict(lambda: defaultdict(lambda: {'games': 0, 'wins': 0}))
-    
-    # Track time-based trends
-    monthly_openings = defaultdict(lambda: defaultdict(lambda: {'games': 0, 'wins': 0}))
-    
+RATING_BRACKETS = ["<1200", "1200-1400", "1400-1600", "1600-1800", "1800-2000", "2000+"]
+RATING_BRACKET_EDGES = [-np.inf, 1200, 1400, 1600, 1800, 2000, np.inf]
+
+
+def build_game_frame(games, username):
+    """One row per game with the opening and result columns the analysis needs"""
+    username = username.lower()
+    rows = []
     for game in games:
         opening = game.get('opening', {})
         opening_name = opening.get('name', 'Unknown')
-        eco = opening.get('eco', '')
-        
         if opening_name == 'Unknown':
             continue
         
-        # Get base opening name
-        base_opening = opening_name.split(':')[0].split(',')[0].strip()
-        variation = opening_name if ':' in opening_name or ',' in opening_name else None
-        
         players = game.get('players', {})
-        is_white = players.get('white', {}).get('user', {}).get('name', '').lower() == username.lower()
-        color = 'white' if is_white else 'black'
-        
-        player_info = players.get(color, {})
+        is_white = players.get('white', {}).get('user', {}).get('name', '').lower() == username
+        player_info = players.get('white' if is_white else 'black', {})
         opponent_info = players.get('black' if is_white else 'white', {})
-        opponent_rating = opponent_info.get('rating', 0)
-        
-        winner = game.get('winner')
-        if winner == color:
-            result = 'win'
-        elif winner is None:
-            result = 'draw'
-        else:
-            result = 'loss'
-        
-        stats = opening_stats[base_opening]
-        stats['games'] += 1
-        stats['eco_codes'].add(eco)
-        
-        if result == 'win':
-            stats['wins'] += 1
-        elif result == 'draw':
-            stats['draws'] += 1
-        else:
-            stats['losses'] += 1
-        
-        if is_white:
-            stats['as_white'] += 1
-            if result == 'win':
-                stats['white_wins'] += 1
-        else:
-            stats['as_black'] += 1
-            if result == 'win':
-                stats['black_wins'] += 1
-        
-        # Accuracy
-        accuracy = player_info.get('accuracy')
-        if accuracy:
-            stats['accuracy_sum'] += accuracy
-            stats['accuracy_count'] += 1
         
         # Time usage (from clocks)
         clocks = game.get('clocks', [])
-        if clocks and len(clocks) >= 2:
-            initial_time = clocks[0] / 100 if is_white else clocks[1] / 100
-            final_idx = -2 if is_white else -1
-            if len(clocks) > abs(final_idx):
-                final_time = clocks[final_idx] / 100
-                time_used = initial_time - final_time
-                if time_used > 0:
-                    stats['time_sum'] += time_used
-                    stats['time_count'] += 1
-        
-        # Opponent rating
-        if opponent_rating:
-            stats['avg_opponent_rating'].append(opponent_rating)
+        time_used = None
+        if len(clocks) > (2 if is_white else 1):
+            time_used = (clocks[0 if is_white else 1] - clocks[-2 if is_white else -1]) / 100
         
-        # Recent results (last 5)
-        if len(stats['recent_results']) < 5:
-            stats['recent_results'].append(result)
-        
-        # Variation tracking
-        if variation:
-            stats['variations'][variation]['games'] += 1
-            if result == 'win':
-                stats['variations'][variation]['wins'] += 1
-        
-        # Rating bracket analysis
-        if opponent_rating:
-            if opponent_rating < 1200:
-                bracket = "<1200"
-            elif opponent_rating < 1400:
-                bracket = "1200-1400"
-            elif opponent_rating < 1600:
-                bracket = "1400-1600"
-            elif opponent_rating < 1800:
-                bracket = "1600-1800"
-            elif opponent_rating < 2000:
-                bracket = "1800-2000"
-            else:
-                bracket = "2000+"
-            
-            rating_bracket_stats[base_opening][bracket]['games'] += 1
-            if result == 'win':
-                rating_bracket_stats[base_opening][bracket]['wins'] += 1
-        
-        # Monthly tracking
-        game_date = datetime.fromtimestamp(game.get('createdAt', 0) / 1000)
-        month_key = game_date.strftime('%Y-%m')
-        monthly_openings[month_key][base_opening]['games'] += 1
-        if result == 'win':
-            monthly_openings[month_key][base_opening]['wins'] += 1
+        rows.append((
+            opening_name,
+            opening.get('eco', ''),
+            is_white,
+            game.get('winner'),
+            player_info.get('accuracy') or None,
+            time_used,
+            opponent_info.get('rating', 0) or None,
+            game.get('createdAt', 0)
+        ))
     
-    # Calculate aggregates
-    results = []
-    for opening, stats in opening_stats.items():
-        if stats['games'] >= 3:
-            win_rate = (stats['wins'] / stats['games']) * 100
-            avg_accuracy = stats['accuracy_sum'] / stats['accuracy_count'] if stats['accuracy_count'] > 0 else 0
-            avg_time = stats['time_sum'] / stats['time_count'] if stats['time_count'] > 0 else 0
-            avg_opp_rating = sum(stats['avg_opponent_rating']) / len(stats['avg_opponent_rating']) if stats['avg_opponent_rating'] else 0
-            
-            white_wr = (stats['white_wins'] / stats['as_white'] * 100) if stats['as_white'] > 0 else 0
-            black_wr = (stats['black_wins'] / stats['as_black'] * 100) if stats['as_black'] > 0 else 0
-            
-            # Get ECO category
-            eco_codes = list(stats['eco_codes'])
-            eco_category = eco_codes[0][0] if eco_codes and eco_codes[0] else 'X'
-            
-            # Calculate trend from recent results
-            recent_wins = sum(1 for r in stats['recent_results'] if r == 'win')
-            recent_wr = (recent_wins / len(stats['recent_results']) * 100) if stats['recent_results'] else 0
-            trend = recent_wr - win_rate
-            
-            results.append({
-                'opening': opening,
-                'games': stats['games'],
-                'win_rate': win_rate,
-                'wins': stats['wins'],
-                'draws': stats['draws'],
-                'losses': stats['losses'],
-                'as_white': stats['as_white'],
-                'as_black': stats['as_black'],
-                'white_wr': white_wr,
-                'black_wr': black_wr,
-                'avg_accuracy': avg_accuracy,
-                'avg_time': avg_time,
-                'avg_opponent_rating': avg_opp_rating,
-                'eco_category': eco_category,
-                'eco_codes': eco_codes[:3],
-                'trend': trend,
-                'recent_results': stats['recent_results'],
-                'variations': dict(stats['variations'])
-            })
+    frame = pd.DataFrame(rows, columns=['full_name', 'eco', 'is_white', 'winner', 'accuracy',
+                                        'time_used', 'opponent_rating', 'created_at'])
+    frame['accuracy'] = frame['accuracy'].astype(float)
+    frame['time_used'] = frame['time_used'].astype(float).where(lambda t: t > 0)
+    frame['opponent_rating'] = frame['opponent_rating'].astype(float)
+    
+    # Base opening and variation
+    names = frame['full_name'].astype('category')
+    base = names.cat.categories.str.split(':').str[0].str.split(',').str[0].str.strip()
+    frame['opening'] = pd.Categorical(base[names.cat.codes])
+    has_variation = names.cat.categories.str.contains(':|,', regex=True)
+    frame['variation'] = frame['full_name'].where(has_variation[names.cat.codes])
+    
+    color = np.where(frame['is_white'], 'white', 'black')
+    frame['result'] = np.select([frame['winner'] == color, frame['winner'].isna()], ['win', 'draw'], 'loss')
+    frame['win'] = frame['result'] == 'win'
+    frame['draw'] = frame['result'] == 'draw'
+    frame['white_win'] = frame['win'] & frame['is_white']
+    frame['bracket'] = pd.cut(frame['opponent_rating'], RATING_BRACKET_EDGES, right=False, labels=RATING_BRACKETS)
+    # Format each distinct month once
+    months, month_codes = np.unique(frame['created_at'].to_numpy().astype('datetime64[ms]').astype('datetime64[M]'),
+                                    return_inverse=True)
+    frame['month'] = pd.Categorical.from_codes(month_codes, np.datetime_as_string(months, unit='M'))
+    return frame
+
+
+def analyze_opening_performance(games, username):
+    """Comprehensive opening analysis.
+    
+    Returns the per-opening table (openings with 3+ games), plus games/wins
+    per (opening, rating bracket) and per (month, opening) as long tables.
+    Each output is one groupby over the normalized game frame.
+    """
+    frame = build_game_frame(games, username)
+    if frame.empty:
+        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+    by_opening = frame.groupby('opening', sort=False, observed=True)
+    
+    df = by_opening.agg(
+        games=('win', 'size'),
+        wins=('win', 'sum'),
+        draws=('draw', 'sum'),
+        as_white=('is_white', 'sum'),
+        white_wins=('white_win', 'sum'),
+        avg_accuracy=('accuracy', 'mean'),
+        avg_time=('time_used', 'mean'),
+        avg_opponent_rating=('opponent_rating', 'mean')
+    )
+    df['losses'] = df['games'] - df['wins'] - df['draws']
+    df['as_black'] = df['games'] - df['as_white']
+    black_wins = df['wins'] - df['white_wins']
+    df['win_rate'] = df['wins'] / df['games'] * 100
+    df['white_wr'] = (df['white_wins'] / df['as_white'] * 100).where(df['as_white'] > 0, 0)
+    df['black_wr'] = (black_wins / df['as_black'] * 100).where(df['as_black'] > 0, 0)
+    df[['avg_accuracy', 'avg_time', 'avg_opponent_rating']] = df[['avg_accuracy', 'avg_time', 'avg_opponent_rating']].fillna(0)
+    
+    # ECO codes in order of appearance; category from the first one
+    eco_codes = frame.drop_duplicates(['opening', 'eco']).groupby('opening', observed=True)['eco'].agg(lambda e: list(e[:3]))
+    df['eco_codes'] = eco_codes
+    df['eco_category'] = [codes[0][0] if codes and codes[0] else 'X' for codes in df['eco_codes']]
+    
+    # Trend: the 5 most recent games against the overall win rate
+    recent = frame[by_opening.cumcount() < 5].groupby('opening', observed=True)
+    df['recent_results'] = recent['result'].agg(list)
+    df['trend'] = recent['win'].mean() * 100 - df['win_rate']
     
-    df = pd.DataFrame(results)
+    variations = frame.dropna(subset=['variation']).groupby(['opening', 'variation'], observed=True, sort=False)['win'].agg(['size', 'sum'])
+    variation_dicts = {opening: {} for opening in df.index}
+    for (opening, variation), (count, wins) in variations.iterrows():
+        variation_dicts[opening][variation] = {'games': int(count), 'wins': int(wins)}
+    df['variations'] = pd.Series(variation_dicts)
     
-    return df, dict(rating_bracket_stats), dict(monthly_openings)
+    df = df[df['games'] >= 3].reset_index()
+    df['opening'] = df['opening'].astype(str)
+    df = df[['opening', 'games', 'win_rate', 'wins', 'draws', 'losses', 'as_white', 'as_black',
+             'white_wr', 'black_wr', 'avg_accuracy', 'avg_time', 'avg_opponent_rating',
+             'eco_category', 'eco_codes', 'trend', 'recent_results', 'variations']]
+    
+    # Rating bracket and monthly breakdowns
+    rating_brackets = frame.groupby(['opening', 'bracket'], observed=True)['win'].agg(games='size', wins='sum').reset_index()
+    monthly = frame.groupby(['month', 'opening'], observed=True)['win'].agg(games='size', wins='sum').reset_index()
+    for table in (rating_brackets, monthly):
+        table['opening'] = table['opening'].astype(str)
+    
+    return df, rating_brackets, monthly
+
+
+@st.cache_resource
+def get_opening_matcher(names):
+    """Compiled, memoized name matcher, shared across reruns and sessions"""
+    return OpeningMatcher(names)
 
 
 def get_opening_category(opening_name):
     """Match opening to database"""
-    for category, data in OPENING_DATABASE.items():
-        if category.lower() in opening_name.lower():
-            return category, data
-    return None, None
+    category = get_opening_matcher(tuple(OPENING_DATABASE)).match(opening_name)
+    if category is None:
+        return None, None
+    return category, OPENING_DATABASE[category]
 
 
 def get_eco_badge_class(eco_category):
@@ -842,8 +798,11 @@ def generate_repertoire(df, style='balanced'):
         white_prefs = ['Italian', 'Queen\'s Gambit', 'London', 'Spanish']
         black_prefs = ['Sicilian', 'French', 'King\'s Indian', 'Slav']
     
+    white_matcher = get_opening_matcher(tuple(white_prefs))
+    black_matcher = get_opening_matcher(tuple(black_prefs))
+    
     for opening, data in OPENING_DATABASE.items():
-        if data['color'] == 'white' and any(p.lower() in opening.lower() for p in white_prefs):
+        if data['color'] == 'white' and opening in white_matcher:
             if len(repertoire['white']) < 3:
                 repertoire['white'].append({
                     'name': opening,
@@ -851,7 +810,7 @@ def generate_repertoire(df, style='balanced'):
                     'style': data['style'],
                     'difficulty': data['difficulty']
                 })
-        elif data['color'] == 'black' and any(p.lower() in opening.lower() for p in black_prefs):
+        elif data['color'] == 'black' and opening in black_matcher:
             if len(repertoire['black']) < 3:
                 repertoire['black'].append({
                     'name': opening,
@@ -915,6 +874,13 @@ if analyze_btn and username:
         
         recommendations = generate_recommendations(df, username)
         
+        if BOOK_PATH:
+            status.text("Comparing games with the opening book...")
+            progress_bar.progress(90)
+            book_deviations = find_book_deviations(games, username)
+        else:
+            book_deviations = None
+        
         progress_bar.progress(100)
         status.empty()
         progress_bar.empty()
@@ -925,6 +891,7 @@ if analyze_btn and username:
         st.session_state.monthly_data = monthly_data
         st.session_state.recommendations = recommendations
         st.session_state.opening_games = games
+        st.session_state.book_deviations = book_deviations
 
 # Display results
 if 'opening_df' in st.session_state and not st.session_state.opening_df.empty:
@@ -932,6 +899,7 @@ if 'opening_df' in st.session_state and not st.session_state.opening_df.empty:
     recommendations = st.session_state.recommendations
     rating_brackets = st.session_state.rating_brackets
     monthly_data = st.session_state.monthly_data
+    book_deviations = st.session_state.get('book_deviations')
     
     # Overview stats
     st.markdown('<div class="section-header"><p class="section-title">📊 Overview</p></div>', unsafe_allow_html=True)
@@ -1022,6 +990,30 @@ if 'opening_df' in st.session_state and not st.session_state.opening_df.empty:
     
     st.plotly_chart(fig, use_container_width=True, key="performance_map")
     
+    # Book deviations
+    st.markdown('<div class="section-header"><p class="section-title">📖 Where You Leave Theory</p></div>', unsafe_allow_html=True)
+    
+    if book_deviations is None:
+        st.info("Set the POLYGLOT_BOOK environment variable to a Polyglot opening book (.bin) to see where your games leave book")
+    elif not book_deviations.empty:
+        summary = deviation_summary(book_deviations)
+        cols = st.columns(len(summary))
+        for col, (_, row) in zip(cols, summary.iterrows()):
+            with col:
+                st.markdown(f"""
+                <div class="stat-highlight">
+                    <div class="stat-highlight-value" style="color: {'#4CAF50' if row['score'] >= 50 else '#f44336'};">{row['score']:.1f}%</div>
+                    <div class="stat-highlight-label">{LEFT_BY_LABELS[row['left_by']]} ({row['games']} games, {row['avg_book_plies'] / 2:.1f} moves)</div>
+                </div>
+                """, unsafe_allow_html=True)
+        
+        by_opening = deviations_by_opening(book_deviations)
+        if not by_opening.empty:
+            by_opening['avg_book_moves'] = (by_opening['avg_book_plies'] / 2).round(1)
+            by_opening = by_opening[['opening', 'games', 'avg_book_moves', 'you_left', 'score_you_left', 'score']].round(1)
+            by_opening.columns = ['Opening', 'Games', 'Moves in Book', 'You Left First %', 'Score When You Left %', 'Score %']
+            st.dataframe(by_opening, use_container_width=True, hide_index=True)
+    
     # Tabs for detailed analysis
     tab1, tab2, tab3, tab4, tab5 = st.tabs(["📋 All Openings", "🎨 By Color", "📈 Trends", "🎓 Quiz", "📚 Repertoire Builder"])
     
@@ -1179,19 +1171,14 @@ if 'opening_df' in st.session_state and not st.session_state.opening_df.empty:
         # Heatmap: Opening vs Rating Bracket
         st.markdown("### 🔥 Performance Heatmap (Opening vs Opponent Rating)")
         
-        if rating_brackets:
+        if not rating_brackets.empty:
             # Prepare heatmap data
-            heatmap_data = []
-            brackets = ["<1200", "1200-1400", "1400-1600", "1600-1800", "1800-2000", "2000+"]
+            brackets = RATING_BRACKETS
             top_openings = df.nlargest(8, 'games')['opening'].tolist()
             
-            for opening in top_openings:
-                row_data = []
-                for bracket in brackets:
-                    data = rating_brackets.get(opening, {}).get(bracket, {'games': 0, 'wins': 0})
-                    wr = (data['wins'] / data['games'] * 100) if data['games'] > 0 else np.nan
-                    row_data.append(wr)
-                heatmap_data.append(row_data)
+            win_rates = rating_brackets.assign(win_rate=rating_brackets['wins'] / rating_brackets['games'] * 100)
+            heatmap_data = (win_rates.pivot(index='opening', columns='bracket', values='win_rate')
+                            .reindex(index=top_openings, columns=brackets).to_numpy().tolist())
             
             fig_heatmap = go.Figure(data=go.Heatmap(
                 z=heatmap_data,
@@ -1220,27 +1207,15 @@ if 'opening_df' in st.session_state and not st.session_state.opening_df.empty:
     with tab3:
         st.markdown("### 📈 Opening Trends Over Time")
         
-        if monthly_data:
+        if not monthly_data.empty:
             # Get top 5 openings
             top_5 = df.nlargest(5, 'games')['opening'].tolist()
             
             # Prepare timeline data
-            timeline_data = []
-            for month, openings in sorted(monthly_data.items()):
-                for opening in top_5:
-                    if opening in openings:
-                        data = openings[opening]
-                        wr = (data['wins'] / data['games'] * 100) if data['games'] > 0 else None
-                        if wr is not None:
-                            timeline_data.append({
-                                'month': month,
-                                'opening': opening,
-                                'win_rate': wr,
-                                'games': data['games']
-                            })
+            timeline_df = monthly_data[monthly_data['opening'].isin(top_5)].sort_values('month', kind='stable')
+            timeline_df = timeline_df.assign(win_rate=timeline_df['wins'] / timeline_df['games'] * 100)
             
-            if timeline_data:
-                timeline_df = pd.DataFrame(timeline_data)
+            if not timeline_df.empty:
                 
                 fig_timeline = px.line(
                     timeline_df,
@@ -1300,13 +1275,13 @@ if 'opening_df' in st.session_state and not st.session_state.opening_df.empty:
         
         # Find openings user plays that have quizzes
         user_openings = df['opening'].tolist()
+        quiz_matcher = get_opening_matcher(tuple(OPENING_QUIZ))
         available_quizzes = []
         
         for opening in user_openings:
-            for quiz_opening, questions in OPENING_QUIZ.items():
-                if quiz_opening.lower() in opening.lower():
-                    available_quizzes.append((quiz_opening, questions))
-                    break
+            quiz_opening = quiz_matcher.match(opening)
+            if quiz_opening:
+                available_quizzes.append((quiz_opening, OPENING_QUIZ[quiz_opening]))
         
         if available_quizzes:
             selected_quiz = st.selectbox(
@@ -5,9 +5,14 @@ import plotly.express as px
 import plotly.graph_objs as go
 import sys
 import os
+import chess
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.session_manager import get_username, set_username, get_token
 from utils.cache_manager import fetch_user_games_cached
+from utils.opening_trie import MoveTrie, parse_moves
+from utils.position_index import PositionIndex
+from utils.opening_baseline import BASELINE_DIR, TABLE_FILE, OpeningBaseline, base_opening_name, compare_to_baseline
+from utils.opening_book import BOOK_PATH, LEFT_BY_LABELS, find_book_deviations, deviation_summary, frequent_deviations
 
 st.set_page_config(page_title="Opening Repertoire", page_icon="♟️", layout="wide")
 
@@ -135,34 +140,54 @@ def process_games(games, username):
         if opening_name == 'Unknown':
             continue
         
-        # Get base opening name
-        base_opening = opening_name.split(':')[0].split(',')[0].strip()
-        
         games_data.append({
-            'opening_name': base_opening,
+            'opening_name': base_opening_name(opening_name),
             'full_name': opening_name,
             'eco': opening.get('eco', ''),
             'color': color,
             'outcome': outcome,
+            'rating': players.get(color, {}).get('rating'),
         })
     
     return pd.DataFrame(games_data)
 
-def analyze_openings(df):
-    """Analyze opening statistics"""
+@st.cache_resource
+def load_opening_baseline(table_mtime):
+    """Memory-map the baseline once per build of its table file."""
+    return OpeningBaseline.load()
+
+def get_opening_baseline():
+    """Population expected scores (None until build_opening_baseline.py has run)."""
+    table_path = os.path.join(BASELINE_DIR, TABLE_FILE)
+    if not os.path.exists(table_path):
+        return None
+    return load_opening_baseline(os.path.getmtime(table_path))
+
+def analyze_openings(df, baseline=None):
+    """Analyze opening statistics, compared with the population baseline when available"""
+    if baseline is not None:
+        df = df.copy()
+        df['expected'], df['expected_var'] = baseline.expected(df['opening_name'], df['color'], df['rating'])
+    
     # Most played openings with color
     most_played = df.groupby(['opening_name', 'color']).agg(
         games=('opening_name', 'size'),
         win_rate=('outcome', 'mean')
     ).reset_index()
     most_played['win_rate'] *= 100
+    if baseline is not None:
+        most_played = compare_to_baseline(most_played, df, ['opening_name', 'color'])
     most_played = most_played.sort_values('games', ascending=False)
     
-    # Struggling openings (min 5 games, low win rate)
-    struggling = most_played[most_played['games'] >= 5].sort_values('win_rate').head(10)
+    # Rank against the population when possible, otherwise by raw win rate
+    rank_by = 'vs_expected' if baseline is not None else 'win_rate'
+    ranked = most_played[most_played['games'] >= 5].dropna(subset=[rank_by])
+    
+    # Struggling openings (min 5 games, low score)
+    struggling = ranked.sort_values(rank_by).head(10)
     
     # Best openings
-    best = most_played[most_played['games'] >= 5].sort_values('win_rate', ascending=False).head(10)
+    best = ranked.sort_values(rank_by, ascending=False).head(10)
     
     # As White
     white_openings = df[df['color'] == 'white'].groupby('opening_name').agg(
@@ -170,6 +195,8 @@ def analyze_openings(df):
         win_rate=('outcome', 'mean')
     ).reset_index()
     white_openings['win_rate'] *= 100
+    if baseline is not None:
+        white_openings = compare_to_baseline(white_openings, df[df['color'] == 'white'], ['opening_name'])
     white_openings = white_openings.sort_values('games', ascending=False)
     
     # As Black (against opponent openings)
@@ -178,6 +205,8 @@ def analyze_openings(df):
         win_rate=('outcome', 'mean')
     ).reset_index()
     black_openings['win_rate'] *= 100
+    if baseline is not None:
+        black_openings = compare_to_baseline(black_openings, df[df['color'] == 'black'], ['opening_name'])
     black_openings = black_openings.sort_values('games', ascending=False)
     
     return most_played, struggling, best, white_openings, black_openings
@@ -190,6 +219,13 @@ def get_winrate_class(wr):
         return 'winrate-bad'
     return 'winrate-neutral'
 
+def expectation_note(row):
+    """'+4.2 vs expected (±6.1)' for rows compared with the population baseline"""
+    if pd.isna(row.get('vs_expected')):
+        return ''
+    margin = (row['ci_high'] - row['ci_low']) / 2
+    return f" • {row['vs_expected']:+.1f} vs expected (±{margin:.1f})"
+
 def get_row_class(wr):
     """Get row CSS class based on win rate"""
     if wr >= 55:
@@ -235,7 +271,20 @@ if analyze_btn and username:
             st.warning("No opening data available")
             st.stop()
         
-        most_played, struggling, best, white_openings, black_openings = analyze_openings(df)
+        baseline = get_opening_baseline()
+        most_played, struggling, best, white_openings, black_openings = analyze_openings(df, baseline)
+        
+        # Move trie: reuse the player's existing one so only new games are inserted
+        trie = st.session_state.get('rep_trie')
+        if trie is None or st.session_state.get('rep_trie_user') != username.lower():
+            trie = MoveTrie()
+        trie.add_games(games, username)
+        
+        # Positions by Zobrist hash, so transposed move orders count together
+        position_index = PositionIndex(games, username)
+        
+        # First ply each game left the opening book, if one is configured
+        deviations = find_book_deviations(games, username) if BOOK_PATH else None
     
     # Store in session
     st.session_state.rep_df = df
@@ -244,6 +293,10 @@ if analyze_btn and username:
     st.session_state.rep_best = best
     st.session_state.rep_white = white_openings
     st.session_state.rep_black = black_openings
+    st.session_state.rep_trie = trie
+    st.session_state.rep_trie_user = username.lower()
+    st.session_state.rep_positions = position_index
+    st.session_state.rep_deviations = deviations
 
 # Display results
 if 'rep_df' in st.session_state:
@@ -253,6 +306,9 @@ if 'rep_df' in st.session_state:
     best = st.session_state.rep_best
     white_openings = st.session_state.rep_white
     black_openings = st.session_state.rep_black
+    trie = st.session_state.get('rep_trie')
+    position_index = st.session_state.get('rep_positions')
+    deviations = st.session_state.get('rep_deviations')
     
     # Summary Cards
     col1, col2, col3, col4 = st.columns(4)
@@ -296,7 +352,7 @@ if 'rep_df' in st.session_state:
         """, unsafe_allow_html=True)
     
     # Tabs for White/Black
-    tab1, tab2, tab3 = st.tabs(["⚪ As White", "⚫ As Black", "📊 Overview"])
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["⚪ As White", "⚫ As Black", "📊 Overview", "🌳 Move Explorer", "🔁 Tricky Positions", "📖 Book Deviations"])
     
     with tab1:
         st.markdown('<div class="section-header"><p class="section-title">⚪ Your White Repertoire</p></div>', unsafe_allow_html=True)
@@ -345,7 +401,7 @@ if 'rep_df' in st.session_state:
                         {row['opening_name']}
                     </div>
                     <div class="opening-stats">
-                        <span class="opening-games">{row['games']} games</span>
+                        <span class="opening-games">{row['games']} games{expectation_note(row)}</span>
                         <span class="opening-winrate {wr_class}">{row['win_rate']:.1f}%</span>
                     </div>
                 </div>
@@ -400,7 +456,7 @@ if 'rep_df' in st.session_state:
                         {row['opening_name']}
                     </div>
                     <div class="opening-stats">
-                        <span class="opening-games">{row['games']} games</span>
+                        <span class="opening-games">{row['games']} games{expectation_note(row)}</span>
                         <span class="opening-winrate {wr_class}">{row['win_rate']:.1f}%</span>
                     </div>
                 </div>
@@ -409,6 +465,12 @@ if 'rep_df' in st.session_state:
             st.info("No Black games found")
     
     with tab3:
+        if 'vs_expected' in most_played:
+            st.caption("Ranked by your score minus the population's in the same opening, color and rating band; "
+                       "± is the 95% interval.")
+        else:
+            st.caption("Ranked by raw win rate. Run build_opening_baseline.py to compare against players of your rating.")
+        
         col1, col2 = st.columns(2)
         
         with col1:
@@ -423,7 +485,7 @@ if 'rep_df' in st.session_state:
                         {row['opening_name']}
                     </div>
                     <div class="opening-stats">
-                        <span class="opening-games">{row['games']} games</span>
+                        <span class="opening-games">{row['games']} games{expectation_note(row)}</span>
                         <span class="opening-winrate winrate-good">{row['win_rate']:.1f}%</span>
                     </div>
                 </div>
@@ -441,7 +503,7 @@ if 'rep_df' in st.session_state:
                         {row['opening_name']}
                     </div>
                     <div class="opening-stats">
-                        <span class="opening-games">{row['games']} games</span>
+                        <span class="opening-games">{row['games']} games{expectation_note(row)}</span>
                         <span class="opening-winrate winrate-bad">{row['win_rate']:.1f}%</span>
                     </div>
                 </div>
@@ -506,6 +568,102 @@ if 'rep_df' in st.session_state:
             </div>
             """, unsafe_allow_html=True)
 
+    with tab4:
+        st.markdown('<div class="section-header"><p class="section-title">🌳 Move Explorer</p></div>', unsafe_allow_html=True)
+        
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            line = st.text_input("Moves so far", value="", placeholder="e.g. 1.e4 c5 2.Nf3 (empty = starting position)")
+        with col2:
+            explorer_color = st.selectbox("Playing as", ["white", "black"], format_func=str.title)
+        
+        moves = parse_moves(line)
+        node = trie.find(moves) if trie else None
+        if node is None:
+            st.info("You never reached this position in the analyzed games")
+        else:
+            reached = trie.node_stats(node, explorer_color)
+            player_to_move = (len(moves) % 2 == 0) == (explorer_color == 'white')
+            st.markdown(f"Reached in **{reached['games']}** games as {explorer_color.title()} • "
+                        f"score **{reached['score']:.1f}%** • "
+                        f"{'your move' if player_to_move else 'opponent to move'}")
+            
+            # Same position via any move order
+            if position_index is not None and moves:
+                board = chess.Board()
+                for san in moves:
+                    board.push_san(san)
+                transposed = position_index.lookup(board, explorer_color)
+                if transposed and transposed['games'] > reached['games']:
+                    st.caption(f"🔁 Reached {transposed['games']} times counting other move orders "
+                               f"(score {transposed['score']:.1f}%)")
+            
+            continuations = trie.continuations(moves, explorer_color)
+            if continuations:
+                explorer_df = pd.DataFrame(continuations)
+                explorer_df['avg_opponent_rating'] = explorer_df['avg_opponent_rating'].round(0)
+                explorer_df['score'] = explorer_df['score'].round(1)
+                explorer_df.columns = ['Move', 'Games', 'Wins', 'Draws', 'Losses', 'Score %', 'Avg Opponent']
+                st.dataframe(explorer_df, use_container_width=True, hide_index=True)
+            else:
+                st.info("No further moves recorded from this position")
+
+    with tab5:
+        st.markdown('<div class="section-header"><p class="section-title">🔁 Positions You Mishandle</p></div>', unsafe_allow_html=True)
+        st.caption("Positions from the first 20 plies where it was your move and you scored 40% or less, "
+                   "counted across every move order that reached them.")
+        
+        weak_positions = position_index.mishandled_positions() if position_index is not None else pd.DataFrame()
+        if weak_positions.empty:
+            st.success("No position with 3+ games where you score 40% or less")
+        else:
+            for _, row in weak_positions.head(10).iterrows():
+                color_class = 'color-white' if row['color'] == 'white' else 'color-black'
+                transposition_note = f" • {row['move_orders']} move orders" if row['move_orders'] > 1 else ""
+                st.markdown(f"""
+                <div class="opening-row opening-row-bad">
+                    <div class="opening-name">
+                        <span class="color-indicator {color_class}"></span>
+                        {row['line']}
+                    </div>
+                    <div class="opening-stats">
+                        <span class="opening-games">{row['games']} games{transposition_note}</span>
+                        <span class="opening-winrate winrate-bad">{row['score']:.1f}%</span>
+                    </div>
+                </div>
+                """, unsafe_allow_html=True)
+                st.markdown(f"[🔍 Open in analysis board](https://lichess.org/analysis/{row['fen'].replace(' ', '_')})")
+
+    with tab6:
+        st.markdown('<div class="section-header"><p class="section-title">📖 Where You Leave Theory</p></div>', unsafe_allow_html=True)
+        
+        if deviations is None:
+            st.info("Set the POLYGLOT_BOOK environment variable to a Polyglot opening book (.bin) to see where your games leave book")
+        elif deviations.empty:
+            st.info("No standard games with moves to compare against the book")
+        else:
+            summary = deviation_summary(deviations)
+            cols = st.columns(len(summary))
+            for col, (_, row) in zip(cols, summary.iterrows()):
+                with col:
+                    st.markdown(f"""
+                    <div class="summary-card">
+                        <div class="summary-value">{row['score']:.1f}%</div>
+                        <div class="summary-label">{LEFT_BY_LABELS[row['left_by']]} • {row['games']} games • {row['avg_book_plies'] / 2:.1f} moves in book</div>
+                    </div>
+                    """, unsafe_allow_html=True)
+            
+            st.markdown("#### Your most repeated deviations")
+            own = frequent_deviations(deviations)
+            if own.empty:
+                st.success("You don't leave book the same way twice")
+            else:
+                own['score'] = own['score'].round(1)
+                own['move'] = own['book_plies'] // 2 + 1
+                own = own[['opening', 'color', 'move', 'deviation', 'book_moves', 'games', 'score']]
+                own.columns = ['Opening', 'Color', 'Move #', 'You Played', 'Book Moves', 'Games', 'Score %']
+                st.dataframe(own, use_container_width=True, hide_index=True)
+
 else:
     # Welcome screen
     st.markdown("""
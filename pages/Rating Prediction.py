@@ -12,6 +12,11 @@ from plotly.subplots import make_subplots
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.session_manager import get_username, set_username, get_token
+from utils import model_registry
+from utils.feature_state import load_feature_state, save_feature_state
+from utils.rating_forecast import forecast_ratings
+from utils.rating_series import rating_history_to_daily, merge_rating_history
+from utils.rating_simulation import simulate_rating_paths
 
 st.set_page_config(page_title="Rating Prediction", page_icon="🔮", layout="wide")
 
@@ -122,6 +127,8 @@ st.markdown("""
 # Model path - relative to this script
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(SCRIPT_DIR, 'rating_models', 'rating_prediction_model.pkl')
+REGISTRY_NAME = 'rating_prediction'
+RECENT_GAMES = 200  # Activity/outcome columns only; ratings come from the rating history
 
 # Game type icons
 GAME_TYPE_CONFIG = {
@@ -133,8 +140,8 @@ GAME_TYPE_CONFIG = {
 
 
 @st.cache_resource
-def load_model():
-    """Load the trained model."""
+def load_pickled_model():
+    """Load the trained model from the legacy pickle."""
     if os.path.exists(MODEL_PATH):
         with open(MODEL_PATH, 'rb') as f:
             model_package = pickle.load(f)
@@ -142,6 +149,14 @@ def load_model():
     return None
 
 
+def load_model():
+    """Load the trained model, preferring the active registry version."""
+    model_package = model_registry.load_model(REGISTRY_NAME)
+    if model_package is not None:
+        return model_package
+    return load_pickled_model()
+
+
 @st.cache_data(ttl=1800)
 def fetch_user_games(username, max_games=500, perf_type="blitz"):
     """Fetch user games from Lichess API."""
@@ -269,129 +284,32 @@ def process_games_to_daily(games, username):
     return daily
 
 
-def create_features(df):
-    """Create features for prediction (same as training)."""
-    df = df.copy()
-    
-    # Lag features
-    for lag in [1, 2, 3, 5, 7]:
-        df[f'rating_lag_{lag}'] = df['rating'].shift(lag)
-    
-    # Rolling statistics
-    for window in [3, 7, 14, 30]:
-        df[f'rating_ma_{window}'] = df['rating'].shift(1).rolling(window, min_periods=1).mean()
-        df[f'rating_std_{window}'] = df['rating'].shift(1).rolling(window, min_periods=1).std()
-        df[f'rating_min_{window}'] = df['rating'].shift(1).rolling(window, min_periods=1).min()
-        df[f'rating_max_{window}'] = df['rating'].shift(1).rolling(window, min_periods=1).max()
-        df[f'winrate_ma_{window}'] = df['daily_winrate'].shift(1).rolling(window, min_periods=1).mean()
-        df[f'games_ma_{window}'] = df['daily_games'].shift(1).rolling(window, min_periods=1).mean()
-    
-    # Trend features
-    df['rating_change_1d'] = df['rating'].diff().shift(1)
-    df['rating_change_7d'] = (df['rating'] - df['rating'].shift(7)).shift(1)
-    df['rating_change_14d'] = (df['rating'] - df['rating'].shift(14)).shift(1)
-    df['rating_change_30d'] = (df['rating'] - df['rating'].shift(30)).shift(1)
-    
-    # EMA
-    df['rating_ema_7'] = df['rating'].shift(1).ewm(span=7, adjust=False).mean()
-    df['rating_ema_14'] = df['rating'].shift(1).ewm(span=14, adjust=False).mean()
-    df['rating_ema_30'] = df['rating'].shift(1).ewm(span=30, adjust=False).mean()
-    
-    # Volatility
-    df['rating_volatility_7'] = df['rating_change_1d'].shift(1).rolling(7, min_periods=1).std()
-    df['rating_volatility_14'] = df['rating_change_1d'].shift(1).rolling(14, min_periods=1).std()
-    
-    # Streaks
-    df['win_streak'] = (df['daily_winrate'] > 0.5).astype(int)
-    df['win_streak'] = df['win_streak'].groupby((df['win_streak'] != df['win_streak'].shift()).cumsum()).cumsum()
-    df['win_streak'] = df['win_streak'].shift(1)
-    
-    # Time features
-    df['day_of_week'] = df['date'].dt.dayofweek
-    df['month'] = df['date'].dt.month
-    df['is_weekend'] = (df['day_of_week'] >= 5).astype(int)
-    
-    # Fill NaN
-    df = df.fillna(method='bfill').fillna(method='ffill').fillna(0)
+@st.cache_data(ttl=1800)
+def build_daily_series(username, perf_type):
+    """Daily series merging the full rating history with recent games' activity."""
+    games = fetch_user_games(username, max_games=RECENT_GAMES, perf_type=perf_type)
+    if not games:
+        return None
+    games_daily = process_games_to_daily(games, username)
+    history_daily = rating_history_to_daily(fetch_rating_history(username), perf_type)
+    return merge_rating_history(history_daily, games_daily)
+
+
+def create_features(df, username, perf_type):
+    """Create features for prediction (same as training).
     
-    return df
+    Only days newer than the user's saved feature state are computed; the
+    state keeps the rolling windows, EMAs and streak between requests.
+    """
+    state = load_feature_state(username, perf_type)
+    state.update(df)
+    save_feature_state(state, username, perf_type)
+    return state.frame()
 
 
 def predict_future_ratings(model_package, current_features, days=30):
     """Predict future ratings with proper feature updates."""
-    model = model_package['model']
-    scaler = model_package['scaler']
-    feature_cols = model_package['feature_columns']
-    
-    predictions = []
-    
-    # Keep history of predictions for rolling calculations
-    rating_history = current_features['rating'].tolist()
-    winrate_history = current_features['daily_winrate'].tolist()
-    games_history = current_features['daily_games'].tolist()
-    
-    current_row = current_features.iloc[-1:].copy()
-    
-    for i in range(days):
-        # Get features and predict
-        X = current_row[feature_cols].values
-        X_scaled = scaler.transform(X)
-        pred = model.predict(X_scaled)[0]
-        predictions.append(pred)
-        
-        # Add prediction to history
-        rating_history.append(pred)
-        winrate_history.append(0.5)  # Assume 50% win rate for future
-        games_history.append(current_row['daily_games'].values[0])  # Keep same activity
-        
-        # Update ALL features for next iteration
-        
-        # Lag features
-        current_row['rating_lag_1'] = rating_history[-2] if len(rating_history) >= 2 else pred
-        current_row['rating_lag_2'] = rating_history[-3] if len(rating_history) >= 3 else pred
-        current_row['rating_lag_3'] = rating_history[-4] if len(rating_history) >= 4 else pred
-        current_row['rating_lag_5'] = rating_history[-6] if len(rating_history) >= 6 else pred
-        current_row['rating_lag_7'] = rating_history[-8] if len(rating_history) >= 8 else pred
-        
-        # Rolling statistics (use last N values from history)
-        for window in [3, 7, 14, 30]:
-            recent_ratings = rating_history[-window:] if len(rating_history) >= window else rating_history
-            recent_winrates = winrate_history[-window:] if len(winrate_history) >= window else winrate_history
-            recent_games = games_history[-window:] if len(games_history) >= window else games_history
-            
-            current_row[f'rating_ma_{window}'] = np.mean(recent_ratings)
-            current_row[f'rating_std_{window}'] = np.std(recent_ratings) if len(recent_ratings) > 1 else 0
-            current_row[f'rating_min_{window}'] = np.min(recent_ratings)
-            current_row[f'rating_max_{window}'] = np.max(recent_ratings)
-            current_row[f'winrate_ma_{window}'] = np.mean(recent_winrates)
-            current_row[f'games_ma_{window}'] = np.mean(recent_games)
-        
-        # Trend features
-        current_row['rating_change_1d'] = pred - rating_history[-2] if len(rating_history) >= 2 else 0
-        current_row['rating_change_7d'] = pred - rating_history[-8] if len(rating_history) >= 8 else 0
-        current_row['rating_change_14d'] = pred - rating_history[-15] if len(rating_history) >= 15 else 0
-        current_row['rating_change_30d'] = pred - rating_history[-31] if len(rating_history) >= 31 else 0
-        
-        # EMA updates (exponential decay)
-        alpha_7 = 2 / (7 + 1)
-        alpha_14 = 2 / (14 + 1)
-        alpha_30 = 2 / (30 + 1)
-        current_row['rating_ema_7'] = alpha_7 * pred + (1 - alpha_7) * current_row['rating_ema_7'].values[0]
-        current_row['rating_ema_14'] = alpha_14 * pred + (1 - alpha_14) * current_row['rating_ema_14'].values[0]
-        current_row['rating_ema_30'] = alpha_30 * pred + (1 - alpha_30) * current_row['rating_ema_30'].values[0]
-        
-        # Volatility (std of recent changes)
-        if len(rating_history) >= 8:
-            changes_7 = [rating_history[j] - rating_history[j-1] for j in range(-7, 0)]
-            current_row['rating_volatility_7'] = np.std(changes_7)
-        if len(rating_history) >= 15:
-            changes_14 = [rating_history[j] - rating_history[j-1] for j in range(-14, 0)]
-            current_row['rating_volatility_14'] = np.std(changes_14)
-        
-        # Update rating in current row
-        current_row['rating'] = pred
-    
-    return predictions
+    return forecast_ratings(model_package, current_features, days=days)
 
 
 def generate_insights(current_rating, predictions, daily_df):
@@ -482,7 +400,8 @@ if model_package is None:
     
     The rating prediction model needs to be trained first. Please run the `rating_prediction_analysis.ipynb` notebook to train and save the model.
     
-    Expected model path: `pages/rating_models/rating_prediction_model.pkl`
+    Expected model path: `pages/rating_models/rating_prediction_model.pkl`, or a registry
+    version exported with `python export_model_registry.py <package.pkl> rating_prediction`
     """)
     st.stop()
 
@@ -511,22 +430,19 @@ if username:
 
 if predict_btn and username:
     with st.spinner("Fetching data and making predictions..."):
-        # Fetch games
-        games = fetch_user_games(username, max_games=500, perf_type=game_type)
+        # Rating history plus recent games, merged per day
+        daily_df = build_daily_series(username, game_type)
         
-        if not games:
+        if daily_df is None:
             st.error("❌ No games found or user doesn't exist")
             st.stop()
         
-        # Process to daily
-        daily_df = process_games_to_daily(games, username)
-        
-        if daily_df is None or len(daily_df) < 14:
+        if len(daily_df) < 14:
             st.warning("⚠️ Not enough data for prediction (need at least 14 days of games)")
             st.stop()
         
         # Create features
-        features_df = create_features(daily_df)
+        features_df = create_features(daily_df, username, game_type)
         
         # Current rating
         current_rating = daily_df['rating'].iloc[-1]
@@ -538,12 +454,16 @@ if predict_btn and username:
             st.error(f"Prediction error: {e}")
             st.stop()
         
+        # Uncertainty: simulated rating paths from activity and ELO expectations
+        simulation = simulate_rating_paths(daily_df[daily_df['has_games']], days=forecast_days)
+        
         # Generate insights
         insights = generate_insights(current_rating, predictions, daily_df)
         
         # Store in session
         st.session_state.pred_daily = daily_df
         st.session_state.pred_predictions = predictions
+        st.session_state.pred_simulation = simulation
         st.session_state.pred_current = current_rating
         st.session_state.pred_insights = insights
         st.session_state.pred_game_type = game_type
@@ -552,6 +472,7 @@ if predict_btn and username:
 if 'pred_predictions' in st.session_state:
     daily_df = st.session_state.pred_daily
     predictions = st.session_state.pred_predictions
+    simulation = st.session_state.get('pred_simulation')
     current_rating = st.session_state.pred_current
     insights = st.session_state.pred_insights
     game_type = st.session_state.pred_game_type
@@ -634,20 +555,40 @@ if 'pred_predictions' in st.session_state:
         line=dict(color='#f44336', width=2, dash='dash')
     ))
     
-    # Confidence band (simplified: ±MAE)
-    mae = model_metrics.get('MAE', 10)
-    upper = [p + mae for p in predictions]
-    lower = [p - mae for p in predictions]
-    
-    fig.add_trace(go.Scatter(
-        x=future_dates + future_dates[::-1],
-        y=upper + lower[::-1],
-        fill='toself',
-        fillcolor='rgba(244, 67, 54, 0.1)',
-        line=dict(width=0),
-        name='Confidence Band',
-        showlegend=True
-    ))
+    # Confidence bands: spread of the simulated paths around the forecast
+    if simulation is not None:
+        bands = [
+            (0.05, 0.95, '90% Range', 'rgba(244, 67, 54, 0.1)'),
+            (0.25, 0.75, '50% Range', 'rgba(244, 67, 54, 0.2)')
+        ]
+        for low_q, high_q, label, color in bands:
+            upper = list(np.asarray(predictions) + simulation['quantiles'][high_q] - simulation['mean'])
+            lower = list(np.asarray(predictions) + simulation['quantiles'][low_q] - simulation['mean'])
+            fig.add_trace(go.Scatter(
+                x=future_dates + future_dates[::-1],
+                y=upper + lower[::-1],
+                fill='toself',
+                fillcolor=color,
+                line=dict(width=0),
+                name=label,
+                hoverinfo='skip',
+                showlegend=True
+            ))
+    else:
+        # Simplified: ±MAE
+        mae = model_metrics.get('MAE', 10)
+        upper = [p + mae for p in predictions]
+        lower = [p - mae for p in predictions]
+        
+        fig.add_trace(go.Scatter(
+            x=future_dates + future_dates[::-1],
+            y=upper + lower[::-1],
+            fill='toself',
+            fillcolor='rgba(244, 67, 54, 0.1)',
+            line=dict(width=0),
+            name='Confidence Band',
+            showlegend=True
+        ))
     
     # Add vertical line at current date
     fig.add_vline(x=last_date, line_dash="dot", line_color="gray")
@@ -705,7 +646,7 @@ if 'pred_predictions' in st.session_state:
         st.markdown("**Recent Performance:**")
         
         recent_games = len(daily_df)
-        recent_wr = daily_df['daily_winrate'].mean() * 100
+        recent_wr = daily_df.loc[daily_df['has_games'], 'daily_winrate'].mean() * 100
         rating_7d = daily_df['rating'].iloc[-1] - daily_df['rating'].iloc[-min(7, len(daily_df))]
         
         st.markdown(f"""
@@ -7,11 +7,11 @@ import plotly.express as px
 import plotly.graph_objs as go
 from plotly.subplots import make_subplots
 from datetime import datetime, timedelta
-from collections import defaultdict
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.session_manager import get_username, set_username, get_token
+from utils.time_usage import TimeStatsAccumulator
 
 st.set_page_config(page_title="Time Management", page_icon="⏱️", layout="wide")
 
@@ -149,169 +149,42 @@ st.markdown("""
 token = get_token()
 
 
-@st.cache_data(ttl=1800)
-def fetch_user_games(username, max_games=500, perf_type="blitz"):
-    """Fetch user games with clock data"""
+def stream_user_games(username, max_games=None, perf_type="blitz"):
+    """Yield user games with clock data one at a time as they arrive (all games when max_games is None)"""
     url = f"https://lichess.org/api/games/user/{username}"
     headers = {"Accept": "application/x-ndjson"}
     params = {
-        "max": max_games,
         "rated": "true",
         "perfType": perf_type,
         "clocks": "true",
         "opening": "true"
     }
-    
-    games = []
-    try:
-        response = requests.get(url, headers=headers, params=params, stream=True, timeout=60)
-        if response.status_code == 404:
-            return None
-        response.raise_for_status()
-        for line in response.iter_lines():
-            if line:
-                games.append(json.loads(line.decode('utf-8')))
-        return games if games else None
-    except Exception as e:
-        st.error(f"Error: {e}")
-        return None
-
-
-def analyze_time_usage(games, username):
-    """Comprehensive time analysis"""
-    time_data = []
-    all_move_times = []
-    phase_times = {'opening': [], 'middlegame': [], 'endgame': []}
-    
-    for game in games:
-        if 'clocks' not in game or not game['clocks']:
-            continue
-        
-        players = game.get('players', {})
-        is_white = players.get('white', {}).get('user', {}).get('name', '').lower() == username.lower()
-        color = 'white' if is_white else 'black'
-        
-        clocks = game.get('clocks', [])
-        if len(clocks) < 4:
-            continue
-        
-        # Extract player's clock times
-        player_clocks = []
-        for i, clock in enumerate(clocks):
-            if (i % 2 == 0 and is_white) or (i % 2 == 1 and not is_white):
-                player_clocks.append(clock / 100)  # Convert to seconds
-        
-        if len(player_clocks) < 2:
-            continue
-        
-        # Calculate time per move
-        time_per_move = []
-        for i in range(1, len(player_clocks)):
-            time_spent = player_clocks[i-1] - player_clocks[i]
-            if time_spent >= 0:  # Ignore increment additions
-                time_per_move.append(time_spent)
-                all_move_times.append({
-                    'move_number': i,
-                    'time_spent': time_spent
-                })
-        
-        if not time_per_move:
-            continue
-        
-        total_moves = len(time_per_move)
-        initial_time = player_clocks[0]
-        final_time = player_clocks[-1] if player_clocks else 0
-        
-        # Phase breakdown
-        opening_end = min(10, total_moves)
-        middlegame_end = min(30, total_moves)
-        
-        opening_time = time_per_move[:opening_end]
-        middlegame_time = time_per_move[opening_end:middlegame_end]
-        endgame_time = time_per_move[middlegame_end:]
-        
-        if opening_time:
-            phase_times['opening'].extend(opening_time)
-        if middlegame_time:
-            phase_times['middlegame'].extend(middlegame_time)
-        if endgame_time:
-            phase_times['endgame'].extend(endgame_time)
-        
-        # Game result
-        winner = game.get('winner')
-        if winner == color:
-            result = 'win'
-        elif winner is None:
-            result = 'draw'
-        else:
-            result = 'loss'
-        
-        # Time trouble detection
-        min_clock = min(player_clocks)
-        time_trouble = min_clock < 30
-        critical_time = min_clock < 10
-        
-        # Find longest think
-        max_think = max(time_per_move) if time_per_move else 0
-        max_think_move = time_per_move.index(max_think) + 1 if max_think > 0 else 0
-        
-        game_data = {
-            'game_id': game.get('id'),
-            'date': pd.to_datetime(game.get('createdAt', 0) / 1000, unit='s'),
-            'speed': game.get('speed'),
-            'color': color,
-            'result': result,
-            'total_moves': total_moves,
-            'initial_time': initial_time,
-            'final_time': final_time,
-            'time_used': initial_time - final_time,
-            'avg_time_per_move': np.mean(time_per_move),
-            'median_time_per_move': np.median(time_per_move),
-            'max_think': max_think,
-            'max_think_move': max_think_move,
-            'opening_avg': np.mean(opening_time) if opening_time else 0,
-            'middlegame_avg': np.mean(middlegame_time) if middlegame_time else 0,
-            'endgame_avg': np.mean(endgame_time) if endgame_time else 0,
-            'time_trouble': time_trouble,
-            'critical_time': critical_time,
-            'min_clock': min_clock,
-            'clock_history': player_clocks,
-            'time_per_move': time_per_move
-        }
-        
-        time_data.append(game_data)
-    
-    return pd.DataFrame(time_data), all_move_times, phase_times
-
-
-def calculate_time_stats(df):
-    """Calculate overall time statistics"""
-    if df.empty:
-        return None
-    
-    stats = {
-        'total_games': len(df),
-        'time_trouble_rate': df['time_trouble'].mean() * 100,
-        'critical_time_rate': df['critical_time'].mean() * 100,
-        'avg_time_per_move': df['avg_time_per_move'].mean(),
-        'avg_final_clock': df['final_time'].mean(),
-        'avg_max_think': df['max_think'].mean(),
-        
-        # By result
-        'win_time_trouble': df[df['result'] == 'win']['time_trouble'].mean() * 100,
-        'loss_time_trouble': df[df['result'] == 'loss']['time_trouble'].mean() * 100,
-        
-        # Win rates
-        'wr_no_trouble': (df[~df['time_trouble']]['result'] == 'win').mean() * 100 if len(df[~df['time_trouble']]) > 0 else 0,
-        'wr_with_trouble': (df[df['time_trouble']]['result'] == 'win').mean() * 100 if len(df[df['time_trouble']]) > 0 else 0,
-        
-        # Phase averages
-        'opening_avg': df['opening_avg'].mean(),
-        'middlegame_avg': df['middlegame_avg'].mean(),
-        'endgame_avg': df['endgame_avg'].mean()
-    }
-    
-    return stats
+    if max_games:
+        params["max"] = max_games
+    
+    response = requests.get(url, headers=headers, params=params, stream=True, timeout=60)
+    if response.status_code == 404:
+        return
+    response.raise_for_status()
+    for line in response.iter_lines():
+        if line:
+            yield json.loads(line.decode('utf-8'))
+
+
+@st.cache_data(ttl=1800, show_spinner=False)
+def analyze_time_usage(username, max_games, perf_type):
+    """Comprehensive time analysis over the streamed games.
+    
+    Returns (accumulator, games seen). Every game adds one small summary row;
+    clock and move-time histories are kept for the most recent games only.
+    """
+    accumulator = TimeStatsAccumulator()
+    games_seen = 0
+    for game in stream_user_games(username, max_games, perf_type):
+        accumulator.add_game(game, username)
+        games_seen += 1
+    accumulator.stats()  # Fold in the last buffered moves before caching
+    return accumulator, games_seen
 
 
 def generate_recommendations(stats, df):
@@ -421,31 +294,19 @@ def create_clock_gauge(value, max_value, title, threshold_bad=30, threshold_warn
     return fig
 
 
-def create_time_curve(df):
-    """Create average time per move curve"""
-    # Aggregate time per move by move number
-    move_times = defaultdict(list)
-    
-    for _, row in df.iterrows():
-        for i, time_spent in enumerate(row['time_per_move']):
-            move_times[i + 1].append(time_spent)
-    
-    # Calculate averages
-    curve_data = []
-    for move_num in sorted(move_times.keys()):
-        if len(move_times[move_num]) >= 5:  # Minimum sample size
-            curve_data.append({
-                'move': move_num,
-                'avg_time': np.mean(move_times[move_num]),
-                'median_time': np.median(move_times[move_num]),
-                'std_time': np.std(move_times[move_num]),
-                'count': len(move_times[move_num])
-            })
-    
-    if not curve_data:
-        return None
+def create_time_curve(stats):
+    """Create average time per move curve from per-move-number stats"""
+    curve_df = pd.DataFrame({
+        'move': stats['position'] + 1,
+        'avg_time': stats['mean'],
+        'median_time': stats['median'],
+        'std_time': stats['std'],
+        'count': stats['count']
+    })
+    curve_df = curve_df[curve_df['count'] >= 5]  # Minimum sample size
     
-    curve_df = pd.DataFrame(curve_data)
+    if curve_df.empty:
+        return None
     
     fig = go.Figure()
     
@@ -502,19 +363,18 @@ def create_time_curve(df):
     return fig
 
 
-def create_result_comparison(df):
+def create_result_comparison(accumulator):
     """Compare time metrics between wins and losses"""
-    wins = df[df['result'] == 'win']
-    losses = df[df['result'] == 'loss']
+    means, games = accumulator.result_means()
     
-    if len(wins) < 5 or len(losses) < 5:
+    if games['win'] < 5 or games['loss'] < 5:
         return None
     
     metrics = ['avg_time_per_move', 'opening_avg', 'middlegame_avg', 'endgame_avg', 'max_think', 'final_time']
     labels = ['Avg/Move', 'Opening', 'Middlegame', 'Endgame', 'Max Think', 'Final Clock']
     
-    win_values = [wins[m].mean() for m in metrics]
-    loss_values = [losses[m].mean() for m in metrics]
+    win_values = [means['win'][m] for m in metrics]
+    loss_values = [means['loss'][m] for m in metrics]
     
     fig = go.Figure()
     
@@ -550,29 +410,22 @@ def create_result_comparison(df):
     return fig
 
 
-def create_heatmap(df):
+def create_heatmap(accumulator):
     """Create move number vs time spent heatmap"""
-    # Bin move numbers and time
-    all_data = []
-    
-    for _, row in df.iterrows():
-        for i, time_spent in enumerate(row['time_per_move'][:50]):  # First 50 moves
-            all_data.append({
-                'move_bin': (i // 5) * 5,  # Bin by 5 moves
-                'time_bin': min(int(time_spent // 5) * 5, 30),  # Bin by 5 seconds, cap at 30+
-                'count': 1
-            })
-    
-    if not all_data:
+    # Binned by 5 moves and 5 seconds (30s+ together) over the first 50 moves
+    if accumulator.heatmap is None:
         return None
-    
-    heatmap_df = pd.DataFrame(all_data)
-    pivot = heatmap_df.groupby(['move_bin', 'time_bin']).size().unstack(fill_value=0)
+    counts = accumulator.heatmap
+    move_bins, time_bins = accumulator.heatmap_edges
+    played = np.flatnonzero(counts.sum(axis=1))
+    if not len(played):
+        return None
+    counts, move_bins = counts[:played[-1] + 1], move_bins[:played[-1] + 1]
     
     fig = go.Figure(data=go.Heatmap(
-        z=pivot.values,
-        x=[f'{int(c)}s' for c in pivot.columns],
-        y=[f'Move {int(r)}-{int(r)+4}' for r in pivot.index],
+        z=counts,
+        x=[f'{t}s' for t in time_bins],
+        y=[f'Move {m}-{m + 4}' for m in move_bins],
         colorscale='Viridis',
         hovertemplate='%{y}<br>Time: %{x}<br>Count: %{z}<extra></extra>'
     ))
@@ -589,10 +442,8 @@ def create_heatmap(df):
     return fig
 
 
-def create_single_game_chart(game_row):
+def create_single_game_chart(clocks, times):
     """Create clock timeline for a single game"""
-    clocks = game_row['clock_history']
-    times = game_row['time_per_move']
     
     fig = make_subplots(
         rows=2, cols=1,
@@ -657,7 +508,8 @@ with col2:
     game_type = st.selectbox("Type", ["blitz", "rapid", "bullet", "classical"], index=0, label_visibility="collapsed")
 
 with col3:
-    max_games = st.selectbox("Games", [100, 200, 500, 1000], index=1, label_visibility="collapsed")
+    max_games = st.selectbox("Games", [100, 200, 500, 1000, 5000, None], index=1, label_visibility="collapsed",
+                             format_func=lambda x: "All games" if x is None else f"{x} games")
 
 with col4:
     analyze_btn = st.button("⏱️ Analyze", type="primary", use_container_width=True)
@@ -667,32 +519,40 @@ if username:
 
 if analyze_btn and username:
     with st.spinner("Analyzing time management..."):
-        games = fetch_user_games(username, max_games, game_type)
+        try:
+            accumulator, games_seen = analyze_time_usage(username, max_games, game_type)
+        except Exception as e:
+            st.error(f"Error: {e}")
+            st.stop()
         
-        if not games:
+        if not games_seen:
             st.error("❌ No games found or user doesn't exist")
             st.stop()
         
-        df, all_move_times, phase_times = analyze_time_usage(games, username)
-        
-        if df.empty:
+        if not accumulator.total_games:
             st.warning("No games with clock data found")
             st.stop()
         
-        stats = calculate_time_stats(df)
+        df = accumulator.games()
+        clock_history, move_times = accumulator.recent_games()
+        stats = accumulator.stats()
         recommendations = generate_recommendations(stats, df)
         
         st.session_state.time_df = df
         st.session_state.time_stats = stats
         st.session_state.time_recommendations = recommendations
-        st.session_state.time_phase = phase_times
+        st.session_state.time_accumulator = accumulator
+        st.session_state.time_clocks = clock_history
+        st.session_state.time_moves = move_times
 
 # Display results
 if 'time_df' in st.session_state and not st.session_state.time_df.empty:
     df = st.session_state.time_df
     stats = st.session_state.time_stats
     recommendations = st.session_state.time_recommendations
-    phase_times = st.session_state.time_phase
+    accumulator = st.session_state.time_accumulator
+    clock_history = st.session_state.time_clocks
+    move_times = st.session_state.time_moves
     
     # Key Stats Cards
     col1, col2, col3, col4, col5 = st.columns(5)
@@ -801,7 +661,7 @@ if 'time_df' in st.session_state and not st.session_state.time_df.empty:
             """, unsafe_allow_html=True)
     
     with col2:
-        fig_comparison = create_result_comparison(df)
+        fig_comparison = create_result_comparison(accumulator)
         if fig_comparison:
             st.plotly_chart(fig_comparison, use_container_width=True, key="result_comparison")
     
@@ -822,7 +682,7 @@ if 'time_df' in st.session_state and not st.session_state.time_df.empty:
     
     with tab1:
         st.markdown("### Average Time per Move by Move Number")
-        fig_curve = create_time_curve(df)
+        fig_curve = create_time_curve(accumulator.move_stats())
         if fig_curve:
             st.plotly_chart(fig_curve, use_container_width=True, key="time_curve")
             st.caption("Shaded area shows standard deviation. Green = Opening, Orange = Middlegame, Red = Endgame")
@@ -831,7 +691,7 @@ if 'time_df' in st.session_state and not st.session_state.time_df.empty:
     
     with tab2:
         st.markdown("### Time Usage Heatmap")
-        fig_heatmap = create_heatmap(df)
+        fig_heatmap = create_heatmap(accumulator)
         if fig_heatmap:
             st.plotly_chart(fig_heatmap, use_container_width=True, key="time_heatmap")
             st.caption("Brighter colors indicate more frequent time usage patterns")
@@ -843,10 +703,10 @@ if 'time_df' in st.session_state and not st.session_state.time_df.empty:
         
         # Game selector
         game_options = []
-        for i, row in df.head(20).iterrows():
-            result_emoji = '✅' if row['result'] == 'win' else '❌' if row['result'] == 'loss' else '➖'
-            trouble_emoji = '⚠️' if row['time_trouble'] else ''
-            game_options.append(f"{result_emoji} {row['date'].strftime('%Y-%m-%d')} - {row['total_moves']} moves {trouble_emoji}")
+        for row in df.head(20).itertuples():
+            result_emoji = '✅' if row.result == 'win' else '❌' if row.result == 'loss' else '➖'
+            trouble_emoji = '⚠️' if row.time_trouble else ''
+            game_options.append(f"{result_emoji} {row.date.strftime('%Y-%m-%d')} - {row.total_moves} moves {trouble_emoji}")
         
         if game_options:
             selected_idx = st.selectbox("Select a game", range(len(game_options)), format_func=lambda x: game_options[x])
@@ -863,7 +723,7 @@ if 'time_df' in st.session_state and not st.session_state.time_df.empty:
             with col4:
                 st.metric("Time Trouble", "Yes ⚠️" if selected_game['time_trouble'] else "No ✅")
             
-            fig_game = create_single_game_chart(selected_game)
+            fig_game = create_single_game_chart(clock_history[selected_idx], move_times[selected_idx])
             st.plotly_chart(fig_game, use_container_width=True, key="single_game_chart")
     
     with tab4:
@@ -2,13 +2,21 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import pickle
-import requests
-import json
 import time
 from pathlib import Path
 import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime, timedelta
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import model_registry
+from utils.win_probability import (
+    FEATURE_COLUMNS, MIN_GAMES_REQUIRED, ELO_FALLBACK_THRESHOLD,
+    predict_win_probability, predict_matchup_matrix
+)
+from utils.cache_manager import fetch_player_features_cached
+from utils.tournament_sim import simulate_tournament, standings_table
 
 st.set_page_config(
     page_title="Win Probability",
@@ -18,33 +26,9 @@ st.set_page_config(
 
 CURRENT_DIR = Path(__file__).parent
 MODEL_PATH = CURRENT_DIR / "models" / "global_model_optimized.pkl"
+REGISTRY_NAME = "win_probability"
 GAME_TYPE = "blitz"
 GAMES_TO_FETCH = 100
-MIN_GAMES_REQUIRED = 10
-ELO_FALLBACK_THRESHOLD = 400
-
-
-# Feature columns must match the trained model
-FEATURE_COLUMNS = [
-    # Rating
-    'rating_diff', 'elo_expected',
-    
-    # Player features
-    'form_5_adj', 'form_10_adj', 'form_20_adj',
-    'streak_norm', 'time_management', 'time_trouble_rate',
-    'is_white', 'color_advantage',
-    'rating_trend_norm', 'residual_ma10', 'avg_game_length',
-    'eco_A_wr', 'eco_B_wr', 'eco_C_wr', 'eco_D_wr', 'eco_E_wr',
-    
-    # Opponent features
-    'opp_form_5_adj', 'opp_form_10_adj', 'opp_streak_norm',
-    'opp_time_management', 'opp_rating_trend_norm', 'opp_residual_ma10',
-    'has_opponent_data',
-    
-    # Difference features
-    'form_5_diff', 'form_10_diff', 'streak_diff',
-    'time_mgmt_diff', 'residual_diff'
-]
 
 
 def format_probability(prob):
@@ -53,318 +37,17 @@ def format_probability(prob):
 
 
 @st.cache_resource
-def load_model():
+def load_pickled_model():
     with open(MODEL_PATH, 'rb') as f:
         return pickle.load(f)
 
 
-def get_api_headers():
-    return {"Accept": "application/x-ndjson"}
-
-
-def fetch_user_games(username, max_games=100, perf_type="blitz"):
-    url = f"https://lichess.org/api/games/user/{username}"
-    headers = get_api_headers()
-    params = {
-        "max": max_games,
-        "rated": "true",
-        "perfType": perf_type,
-        "clocks": "true",
-        "opening": "true"
-    }
-    
-    games = []
-    try:
-        response = requests.get(url, headers=headers, params=params, stream=True, timeout=30)
-        
-        if response.status_code == 404:
-            return None, "User not found"
-        
-        response.raise_for_status()
-        
-        for line in response.iter_lines():
-            if line:
-                game = json.loads(line.decode('utf-8'))
-                games.append(game)
-        
-        if len(games) == 0:
-            return None, f"No {perf_type} games found"
-        
-        return games, None
-        
-    except requests.exceptions.Timeout:
-        return None, "Request timeout"
-    except requests.exceptions.RequestException as e:
-        return None, f"API error: {str(e)}"
-
-
-def process_games_for_player(games, username):
-    processed = []
-    
-    for game in games:
-        try:
-            players = game.get('players', {})
-            white_info = players.get('white', {})
-            black_info = players.get('black', {})
-            
-            white_user = white_info.get('user', {}).get('name', '').lower()
-            black_user = black_info.get('user', {}).get('name', '').lower()
-            
-            is_white = white_user == username.lower()
-            player_color = 'white' if is_white else 'black'
-            
-            player_info = white_info if is_white else black_info
-            opponent_info = black_info if is_white else white_info
-            
-            player_rating = player_info.get('rating')
-            opponent_rating = opponent_info.get('rating')
-            
-            if not player_rating or not opponent_rating:
-                continue
-            
-            winner = game.get('winner')
-            if winner == player_color:
-                outcome_numeric = 1.0
-            elif winner is None:
-                outcome_numeric = 0.5
-            else:
-                outcome_numeric = 0.0
-            
-            clocks = game.get('clocks', [])
-            time_trouble = 0
-            
-            if clocks and len(clocks) > 0:
-                player_clocks = []
-                for i, clock in enumerate(clocks):
-                    if (i % 2 == 0 and is_white) or (i % 2 == 1 and not is_white):
-                        player_clocks.append(clock / 100)
-                
-                if player_clocks:
-                    min_clock = min(player_clocks)
-                    time_trouble = 1 if min_clock < 30 else 0
-            
-            opening = game.get('opening', {})
-            opening_eco = opening.get('eco', 'X')
-            eco_category = opening_eco[0] if opening_eco else 'X'
-            
-            moves_str = game.get('moves', '')
-            num_moves = len(moves_str.split()) // 2 if moves_str else 0
-            
-            processed.append({
-                'player_rating': player_rating,
-                'opponent_rating': opponent_rating,
-                'rating_gap': opponent_rating - player_rating,
-                'outcome_numeric': outcome_numeric,
-                'player_color': player_color,
-                'time_trouble': time_trouble,
-                'eco_category': eco_category,
-                'num_moves': num_moves
-            })
-            
-        except Exception:
-            continue
-    
-    return processed
-
-
-def calculate_elo_expected(rating_diff):
-    return 1 / (1 + 10 ** (rating_diff / 400))
-
-
-def calculate_player_features(processed_games):
-    if len(processed_games) < MIN_GAMES_REQUIRED:
-        return None
-    
-    df = pd.DataFrame(processed_games)
-    
-    current_rating = df.iloc[0]['player_rating']
-    
-    form_5 = df.head(5)['outcome_numeric'].mean()
-    form_10 = df.head(10)['outcome_numeric'].mean()
-    form_20 = df.head(20)['outcome_numeric'].mean()
-    
-    streak = 0
-    for outcome in df['outcome_numeric']:
-        if outcome == 1:
-            if streak >= 0:
-                streak += 1
-            else:
-                streak = 1
-        elif outcome == 0:
-            if streak <= 0:
-                streak -= 1
-            else:
-                streak = -1
-        else:
-            break
-    
-    time_trouble_rate = df['time_trouble'].mean()
-    
-    white_games = df[df['player_color'] == 'white']
-    black_games = df[df['player_color'] == 'black']
-    
-    white_wr = white_games['outcome_numeric'].mean() if len(white_games) > 0 else 0.5
-    black_wr = black_games['outcome_numeric'].mean() if len(black_games) > 0 else 0.5
-    
-    if len(df) >= 20:
-        rating_trend = df.iloc[0]['player_rating'] - df.iloc[19]['player_rating']
-    else:
-        rating_trend = 0
-    
-    avg_game_length = df.head(20)['num_moves'].mean()
-    
-    eco_wrs = {}
-    for eco_cat in ['A', 'B', 'C', 'D', 'E']:
-        eco_games = df[df['eco_category'] == eco_cat]
-        if len(eco_games) >= 3:
-            eco_wrs[eco_cat] = eco_games['outcome_numeric'].mean()
-        else:
-            eco_wrs[eco_cat] = 0.5
-    
-    residuals = []
-    for _, row in df.head(10).iterrows():
-        expected = calculate_elo_expected(row['rating_gap'])
-        residual = row['outcome_numeric'] - expected
-        residuals.append(residual)
-    residual_ma10 = np.mean(residuals) if residuals else 0
-    
-    games_last_7d = len(df)
-    
-    return {
-        'rating': current_rating,
-        'form_5': form_5,
-        'form_10': form_10,
-        'form_20': form_20,
-        'streak': streak,
-        'time_trouble_rate': time_trouble_rate,
-        'white_wr': white_wr,
-        'black_wr': black_wr,
-        'rating_trend': rating_trend,
-        'avg_game_length': avg_game_length,
-        'eco_A_wr': eco_wrs['A'],
-        'eco_B_wr': eco_wrs['B'],
-        'eco_C_wr': eco_wrs['C'],
-        'eco_D_wr': eco_wrs['D'],
-        'eco_E_wr': eco_wrs['E'],
-        'residual_ma10': residual_ma10,
-        'games_last_7d': games_last_7d,
-        'games_analyzed': len(df)
-    }
-
-
-def prepare_model_features(player_features, opponent_features, is_white):
-    """
-    Prepare features for the model including opponent and difference features.
-    """
-    rating_diff = opponent_features['rating'] - player_features['rating']
-    elo_expected = calculate_elo_expected(rating_diff)
-    
-    # Player features (adjusted)
-    form_5_adj = player_features['form_5'] - 0.5
-    form_10_adj = player_features['form_10'] - 0.5
-    form_20_adj = player_features['form_20'] - 0.5
-    streak_norm = player_features['streak'] / 10
-    time_management = 1 - player_features['time_trouble_rate']
-    rating_trend_norm = player_features['rating_trend'] / 100
-    
-    if is_white:
-        color_advantage = player_features['white_wr'] - 0.5
-    else:
-        color_advantage = player_features['black_wr'] - 0.5
-    
-    # Opponent features (adjusted)
-    opp_form_5_adj = opponent_features['form_5'] - 0.5
-    opp_form_10_adj = opponent_features['form_10'] - 0.5
-    opp_streak_norm = opponent_features['streak'] / 10
-    opp_time_management = 1 - opponent_features['time_trouble_rate']
-    opp_rating_trend_norm = opponent_features['rating_trend'] / 100
-    
-    # Difference features
-    form_5_diff = form_5_adj - opp_form_5_adj
-    form_10_diff = form_10_adj - opp_form_10_adj
-    streak_diff = streak_norm - opp_streak_norm
-    time_mgmt_diff = time_management - opp_time_management
-    residual_diff = player_features['residual_ma10'] - opponent_features['residual_ma10']
-    
-    features = {
-        # Rating
-        'rating_diff': rating_diff,
-        'elo_expected': elo_expected,
-        
-        # Player features
-        'form_5_adj': form_5_adj,
-        'form_10_adj': form_10_adj,
-        'form_20_adj': form_20_adj,
-        'streak_norm': streak_norm,
-        'time_management': time_management,
-        'time_trouble_rate': player_features['time_trouble_rate'],
-        'is_white': 1 if is_white else 0,
-        'color_advantage': color_advantage,
-        'rating_trend_norm': rating_trend_norm,
-        'residual_ma10': player_features['residual_ma10'],
-        'avg_game_length': player_features['avg_game_length'],
-        'eco_A_wr': player_features['eco_A_wr'],
-        'eco_B_wr': player_features['eco_B_wr'],
-        'eco_C_wr': player_features['eco_C_wr'],
-        'eco_D_wr': player_features['eco_D_wr'],
-        'eco_E_wr': player_features['eco_E_wr'],
-        
-        # Opponent features
-        'opp_form_5_adj': opp_form_5_adj,
-        'opp_form_10_adj': opp_form_10_adj,
-        'opp_streak_norm': opp_streak_norm,
-        'opp_time_management': opp_time_management,
-        'opp_rating_trend_norm': opp_rating_trend_norm,
-        'opp_residual_ma10': opponent_features['residual_ma10'],
-        'has_opponent_data': 1,
-        
-        # Difference features
-        'form_5_diff': form_5_diff,
-        'form_10_diff': form_10_diff,
-        'streak_diff': streak_diff,
-        'time_mgmt_diff': time_mgmt_diff,
-        'residual_diff': residual_diff
-    }
-    
-    return features
-
-
-def predict_win_probability(model_package, player_a_features, player_b_features, a_is_white):
-    """
-    Predict win probability with ELO fallback for extreme rating differences.
-    """
-    rating_diff = abs(player_a_features['rating'] - player_b_features['rating'])
-    
-    # Prepare features for display (always needed)
-    a_model_features = prepare_model_features(player_a_features, player_b_features, a_is_white)
-    b_model_features = prepare_model_features(player_b_features, player_a_features, not a_is_white)
-    
-    # Fallback: Extreme rating difference → Use ELO baseline
-    if rating_diff > ELO_FALLBACK_THRESHOLD:
-        elo_prob_a = calculate_elo_expected(player_b_features['rating'] - player_a_features['rating'])
-        elo_prob_b = 1 - elo_prob_a
-        
-        return elo_prob_a, elo_prob_b, a_model_features, b_model_features, True
-    
-    # Normal: Use ML model
-    model = model_package['model']
-    feature_columns = model_package.get('feature_columns', FEATURE_COLUMNS)
-    
-    a_input = np.array([[a_model_features[col] for col in feature_columns]])
-    b_input = np.array([[b_model_features[col] for col in feature_columns]])
-    
-    prob_a = model.predict_proba(a_input)[0, 1]
-    prob_b = model.predict_proba(b_input)[0, 1]
-    
-    total = prob_a + prob_b
-    if total > 0:
-        prob_a_normalized = prob_a / total
-        prob_b_normalized = prob_b / total
-    else:
-        prob_a_normalized = 0.5
-        prob_b_normalized = 0.5
-    
-    return prob_a_normalized, prob_b_normalized, a_model_features, b_model_features, False
+def load_model():
+    """Active registry version (hot-reloaded on deploy), else the legacy pickle."""
+    model_package = model_registry.load_model(REGISTRY_NAME)
+    if model_package is not None:
+        return model_package
+    return load_pickled_model()
 
 
 def create_probability_bar(prob_a, prob_b, name_a, name_b):
@@ -639,29 +322,20 @@ if model_loaded:
                 progress_bar = st.progress(0)
                 status_text = st.empty()
                 
-                status_text.text(f"Fetching games for {player_a_username}...")
-                games_a, error_a = fetch_user_games(player_a_username, GAMES_TO_FETCH, GAME_TYPE)
-                progress_bar.progress(25)
+                status_text.text(f"Loading {player_a_username}...")
+                player_a_features, error_a = fetch_player_features_cached(player_a_username, GAME_TYPE, GAMES_TO_FETCH)
+                progress_bar.progress(40)
                 
                 if error_a:
                     st.error(f"Error fetching {player_a_username}: {error_a}")
                 else:
-                    status_text.text(f"Fetching games for {player_b_username}...")
-                    games_b, error_b = fetch_user_games(player_b_username, GAMES_TO_FETCH, GAME_TYPE)
-                    progress_bar.progress(50)
+                    status_text.text(f"Loading {player_b_username}...")
+                    player_b_features, error_b = fetch_player_features_cached(player_b_username, GAME_TYPE, GAMES_TO_FETCH)
+                    progress_bar.progress(75)
                     
                     if error_b:
                         st.error(f"Error fetching {player_b_username}: {error_b}")
                     else:
-                        status_text.text("Processing games...")
-                        
-                        processed_a = process_games_for_player(games_a, player_a_username)
-                        processed_b = process_games_for_player(games_b, player_b_username)
-                        progress_bar.progress(75)
-                        
-                        player_a_features = calculate_player_features(processed_a)
-                        player_b_features = calculate_player_features(processed_b)
-                        
                         if player_a_features is None:
                             st.error(f"{player_a_username} doesn't have enough {GAME_TYPE} games (minimum {MIN_GAMES_REQUIRED})")
                         elif player_b_features is None:
@@ -798,8 +472,105 @@ if model_loaded:
                                     st.markdown("**Model Details**")
                                     prediction_method = "ELO Baseline (fallback)" if used_fallback else "LightGBM (Optimized)"
                                     st.write(f"- Prediction Method: {prediction_method}")
+                                    if model_package.get('version'):
+                                        st.write(f"- Model Version: {model_package['version']}")
                                     st.write(f"- Features: {len(FEATURE_COLUMNS)}")
                                     st.write(f"- Game Type: {GAME_TYPE}")
                                     st.write(f"- ELO Fallback Threshold: {ELO_FALLBACK_THRESHOLD}")
                                     if optimization_info:
-                                        st.write(f"- Optuna Trials: {optimization_info.get('n_trials', 'N/A')}")
\ No newline at end of file
+                                        st.write(f"- Optuna Trials: {optimization_info.get('n_trials', 'N/A')}")
+
+    st.markdown("---")
+    st.subheader("Matchup Matrix")
+    st.markdown("Win probabilities for every pairing in a roster (club, arena, team), scored in one batch.")
+    
+    roster_text = st.text_area("Lichess usernames (one per line or comma separated)", key="roster", height=120)
+    matrix_color = st.radio(
+        "Row player plays",
+        options=["White", "Black", "Average"],
+        horizontal=True,
+        index=2
+    )
+    
+    col_fmt, col_rounds, col_iter = st.columns(3)
+    with col_fmt:
+        tournament_format = st.selectbox("Project standings", options=["None", "Round robin", "Swiss"])
+    with col_rounds:
+        tournament_rounds = st.number_input(
+            "Rounds (Swiss) / cycles (round robin), 0 = auto", min_value=0, max_value=20, value=0
+        )
+    with col_iter:
+        simulations = st.select_slider("Simulations", options=[1000, 10000, 50000, 100000], value=10000)
+    
+    matrix_button = st.button("Build Matchup Matrix")
+    
+    if matrix_button:
+        roster = list(dict.fromkeys(
+            name.strip() for name in roster_text.replace(',', '\n').splitlines() if name.strip()
+        ))
+        if len(roster) < 2:
+            st.error("Please enter at least two usernames")
+        else:
+            progress_bar = st.progress(0)
+            status_text = st.empty()
+            names = []
+            roster_features = []
+            skipped = []
+            
+            for i, username in enumerate(roster):
+                status_text.text(f"Loading {username} ({i + 1}/{len(roster)})...")
+                features, error = fetch_player_features_cached(username, GAME_TYPE, GAMES_TO_FETCH)
+                if error or features is None:
+                    skipped.append(username)
+                else:
+                    names.append(username)
+                    roster_features.append(features)
+                progress_bar.progress((i + 1) / len(roster))
+            
+            status_text.empty()
+            progress_bar.empty()
+            
+            if skipped:
+                st.warning(f"Skipped (not found or fewer than {MIN_GAMES_REQUIRED} {GAME_TYPE} games): {', '.join(skipped)}")
+            
+            if len(names) < 2:
+                st.error("Not enough players with data to build a matrix")
+            else:
+                matrix = predict_matchup_matrix(model_package, roster_features)
+                probs = matrix[matrix_color.lower()]
+                
+                fig = go.Figure(data=go.Heatmap(
+                    z=probs * 100,
+                    x=names,
+                    y=names,
+                    zmin=0,
+                    zmax=100,
+                    colorscale='RdBu',
+                    colorbar=dict(title='Win %'),
+                    hovertemplate='%{y} vs %{x}: %{z:.1f}%<extra></extra>'
+                ))
+                fig.update_layout(
+                    height=max(400, 25 * len(names)),
+                    xaxis=dict(title='Opponent'),
+                    yaxis=dict(title='Player', autorange='reversed'),
+                    margin=dict(l=20, r=20, t=20, b=20)
+                )
+                st.plotly_chart(fig, use_container_width=True)
+                
+                df_matrix = pd.DataFrame(probs * 100, index=names, columns=names).round(1)
+                df_matrix.insert(0, 'Expected Score', np.nanmean(probs, axis=1).round(3))
+                st.dataframe(df_matrix.sort_values('Expected Score', ascending=False), use_container_width=True)
+                
+                fallback_pairs = int(matrix['fallback'].sum() // 2)
+                if fallback_pairs:
+                    st.caption(f"{fallback_pairs} pairing(s) exceed a {ELO_FALLBACK_THRESHOLD} rating difference and use the ELO baseline.")
+                
+                if tournament_format != "None":
+                    fmt = "swiss" if tournament_format == "Swiss" else "round_robin"
+                    with st.spinner(f"Simulating {simulations:,} tournaments..."):
+                        result = simulate_tournament(
+                            matrix['average'], fmt=fmt, iterations=simulations, rounds=int(tournament_rounds) or None
+                        )
+                    st.markdown(f"**Projected Standings** ({tournament_format}, {result['rounds']} "
+                                f"{'rounds' if fmt == 'swiss' else 'cycle(s)'}, {simulations:,} simulations)")
+                    st.dataframe(standings_table(result, names), use_container_width=True, hide_index=True)
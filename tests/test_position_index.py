@@ -0,0 +1,31 @@
+from utils.position_index import PositionIndex
+
+
+def _game(game_id, moves, winner='black'):
+    return {
+        'id': game_id,
+        'moves': moves,
+        'winner': winner,
+        'players': {'white': {'user': {'name': 'me'}}, 'black': {'user': {'name': 'opponent'}}}
+    }
+
+
+def test_mishandled_positions_keeps_independent_lines_with_equal_records():
+    games = [_game(f"e{i}", 'e4 e5 Nf3 Nc6') for i in range(3)] + \
+        [_game(f"d{i}", 'd4 d5 c4 e6') for i in range(3)]
+    index = PositionIndex(games, 'me', max_plies=4, workers=1)
+
+    weak = index.mishandled_positions()
+
+    assert sorted(weak['line']) == ['d4 d5 c4 e6', 'e4 e5 Nf3 Nc6']
+    assert (weak['games'] == 3).all()
+    assert (weak['score'] == 0).all()
+
+
+def test_mishandled_positions_reports_deepest_position_of_a_line():
+    games = [_game(f"g{i}", 'e4 e5 Nf3 Nc6') for i in range(3)]
+    index = PositionIndex(games, 'me', max_plies=4, workers=1)
+
+    weak = index.mishandled_positions()
+
+    assert weak['line'].tolist() == ['e4 e5 Nf3 Nc6']
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+from utils.time_usage import RaggedArray
+
+EVAL_CAP = 1000  # Centipawns; beyond this the position is simply won
+CP_LOGIT = 0.00368208  # Lichess centipawn -> win% curve
+# Drop in the mover's win % that makes a move an inaccuracy / mistake / blunder (Lichess: 0.1/0.2/0.3 winning chances)
+INACCURACY, MISTAKE, BLUNDER = 5.0, 10.0, 15.0
+JUDGEMENTS = ('inaccuracy', 'mistake', 'blunder')
+JUDGEMENT_COLUMNS = ('inaccuracies', 'mistakes', 'blunders')
+MIN_WINDOW, MAX_WINDOW = 2, 8  # Volatility window in plies, a tenth of the game within these bounds
+MIN_WEIGHT, MAX_WEIGHT = 0.5, 12.0  # Bounds on a move's volatility weight
+
+
+def win_percent(cp):
+    """White's win % (0-100) for White-side centipawn scores (scalar or array)."""
+    cp = np.clip(cp, -EVAL_CAP, EVAL_CAP)
+    return 100 / (1 + np.exp(-CP_LOGIT * cp))
+
+
+def move_accuracy(win_before, win_after):
+    """Accuracy (0-100) of moves from the mover's win % before and after them."""
+    drop = np.asarray(win_before) - np.asarray(win_after)
+    # +1: Lichess's allowance for imperfect analysis
+    return np.clip(103.1668100711649 * np.exp(-0.04354415386753951 * drop) - 3.166924740191411 + 1, 0, 100)
+
+
+def judge(drop):
+    """Judgement code per win % drop: 0 = fine, then 1..3 for JUDGEMENTS."""
+    drop = np.asarray(drop)
+    return (drop >= INACCURACY).astype(np.int8) + (drop >= MISTAKE) + (drop >= BLUNDER)
+
+
+def judgement_name(code):
+    return JUDGEMENTS[code - 1] if code else None
+
+
+def move_table(evals):
+    """Every move of every game as flat arrays.
+
+    ``evals`` is a RaggedArray (or list of lists) of White-side centipawns per
+    ply, starting with the initial position. Returns a dict of equal-length
+    arrays: game, ply (1-based), color (0 = White), win_before/win_after (the
+    mover's win %), accuracy, cp_loss (capped, mover's view) and judgement code.
+    """
+    if not isinstance(evals, RaggedArray):
+        evals = RaggedArray.from_lists(evals)
+    cp = np.clip(evals.values.astype(np.float64), -EVAL_CAP, EVAL_CAP)
+    wp = win_percent(cp)
+    game = evals.game_ids()
+    position = evals.positions()
+
+    # A move joins each entry to the next one of the same game
+    before = np.flatnonzero(position < np.repeat(evals.lengths, evals.lengths) - 1)
+    color = (position[before] % 2).astype(np.int8)
+    sign = np.where(color == 0, 1.0, -1.0)
+    win_before = np.where(color == 0, wp[before], 100 - wp[before])
+    win_after = np.where(color == 0, wp[before + 1], 100 - wp[before + 1])
+    return {
+        'game': game[before],
+        'ply': position[before] + 1,
+        'color': color,
+        'win_before': win_before,
+        'win_after': win_after,
+        'accuracy': move_accuracy(win_before, win_after),
+        'cp_loss': np.maximum(0.0, sign * (cp[before] - cp[before + 1])),
+        'judgement': judge(win_before - win_after),
+    }
+
+
+def _volatility_weights(evals, moves):
+    """Lichess's per-move weight: std of White's win % over a window around the move."""
+    wp = win_percent(evals.values.astype(np.float64))
+    prefix = np.concatenate([[0.0], np.cumsum(wp)])
+    prefix_sq = np.concatenate([[0.0], np.cumsum(wp ** 2)])
+
+    game = moves['game']
+    n_moves = np.maximum(evals.lengths - 1, 0)
+    window = np.clip(n_moves // 10, MIN_WINDOW, MAX_WINDOW)[game]
+    # The first window covers the first (window - 1) moves, then it slides one ply per move
+    start = evals.offsets[game] + np.maximum(0, moves['ply'] - 1 - (window - 2))
+    end = start + window
+    mean = (prefix[end] - prefix[start]) / window
+    variance = np.maximum((prefix_sq[end] - prefix_sq[start]) / window - mean ** 2, 0.0)
+    return np.clip(np.sqrt(variance), MIN_WEIGHT, MAX_WEIGHT)
+
+
+def accuracy_table(evals):
+    """Per game and color: moves, Lichess-style accuracy, ACPL and judgement counts.
+
+    Game accuracy is the mean of the volatility-weighted and the harmonic mean
+    of the side's move accuracies, as Lichess computes it, so quiet positions
+    count less than critical ones and a few bad moves pull the score down.
+    Everything is computed over flat arrays for all games at once. Returns a
+    DataFrame with one row per (game, color) that has at least one move.
+    """
+    if not isinstance(evals, RaggedArray):
+        evals = RaggedArray.from_lists(evals)
+    moves = move_table(evals)
+    columns = ['game', 'color', 'moves', 'accuracy', 'acpl', *JUDGEMENT_COLUMNS]
+    if not len(moves['game']):
+        return pd.DataFrame(columns=columns)
+
+    weight = _volatility_weights(evals, moves)
+    group = moves['game'] * 2 + moves['color']
+    n_groups = len(evals) * 2
+    count = np.bincount(group, minlength=n_groups)
+    accuracy = moves['accuracy']
+    weighted = np.bincount(group, weights=accuracy * weight, minlength=n_groups) / \
+        np.maximum(np.bincount(group, weights=weight, minlength=n_groups), 1e-12)
+    harmonic = count / np.maximum(np.bincount(group, weights=1 / np.maximum(accuracy, 1), minlength=n_groups), 1e-12)
+
+    table = pd.DataFrame({
+        'game': np.arange(n_groups) // 2,
+        'color': np.where(np.arange(n_groups) % 2 == 0, 'white', 'black'),
+        'moves': count,
+        'accuracy': (weighted + harmonic) / 2,
+        'acpl': np.bincount(group, weights=moves['cp_loss'], minlength=n_groups) / np.maximum(count, 1),
+    })
+    for code, name in enumerate(JUDGEMENT_COLUMNS, start=1):
+        table[name] = np.bincount(group, weights=moves['judgement'] == code, minlength=n_groups).astype(int)
+    return table[table['moves'] > 0].reset_index(drop=True)
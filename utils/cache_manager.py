@@ -3,6 +3,14 @@ import pandas as pd
 import requests
 import json
 from datetime import datetime, timedelta
+from utils.win_probability import (
+    FEATURE_VERSION, fetch_user_games, fetch_latest_game_id,
+    process_games_for_player, calculate_player_features
+)
+
+
+class FeatureFetchError(Exception):
+    """Raised inside cached feature builders so failed fetches are never cached."""
 
 @st.cache_data(ttl=3600)  # Cache for 1 hour
 def fetch_rating_history_cached(username):
@@ -44,4 +52,41 @@ def fetch_profile_cached(username, token):
         client = berserk.Client(session=session)
         return client.users.get_public_data(username)
     except:
-        return None
\ No newline at end of file
+        return None
+
+
+@st.cache_data(ttl=60, show_spinner=False)  # Cache for 1 minute
+def fetch_latest_game_id_cached(username, perf_type):
+    """Cheap max=1 probe for the player's newest game id"""
+    return fetch_latest_game_id(username, perf_type)
+
+
+@st.cache_data(ttl=86400, max_entries=2000, show_spinner=False)  # Cache for 1 day
+def _player_features_snapshot(username, perf_type, latest_game_id, feature_version, max_games):
+    """Fetch and featurize games; the key pins the newest game id and feature version"""
+    games, error = fetch_user_games(username, max_games, perf_type)
+    if error:
+        raise FeatureFetchError(error)
+    return calculate_player_features(process_games_for_player(games, username))
+
+
+def fetch_player_features_cached(username, perf_type="blitz", max_games=100):
+    """Win Probability player features, recomputed only when a new game appears.
+
+    Returns (features, error). features is None when the player has too few games.
+    """
+    username = username.strip().lower()
+    latest_game_id = fetch_latest_game_id_cached(username, perf_type)
+    
+    if latest_game_id is None:
+        # Probe failed or no games: fall through to the uncached path for a real error message
+        games, error = fetch_user_games(username, max_games, perf_type)
+        if error:
+            return None, error
+        return calculate_player_features(process_games_for_player(games, username)), None
+    
+    try:
+        features = _player_features_snapshot(username, perf_type, latest_game_id, FEATURE_VERSION, max_games)
+        return features, None
+    except FeatureFetchError as e:
+        return None, str(e)
@@ -0,0 +1,201 @@
+import os
+import queue
+import shutil
+import threading
+from concurrent.futures import CancelledError, Future
+
+import chess
+import chess.engine
+import chess.polyglot
+
+ENGINE_PATH = os.environ.get("STOCKFISH_PATH") or shutil.which("stockfish")
+ENGINE_THREADS = 1  # Per engine; the pool gets its parallelism from engine count
+ENGINE_HASH_MB = 16
+MATE_SCORE = 10000
+
+
+class AnalysisJob:
+    """One position to search; ``future`` resolves to the engine's info dict."""
+
+    def __init__(self, board, limit, cancel_event=None):
+        self.board = board.copy(stack=False)
+        self.limit = limit
+        self.cancel_event = cancel_event
+        self.future = Future()
+
+
+class EnginePool:
+    """Persistent UCI engine processes fed from one job queue.
+
+    Each engine is owned by a worker thread that takes jobs off the shared
+    queue, so a batch of positions spreads over every engine and no process
+    is started per position. Jobs carry their own ``chess.engine.Limit``
+    (nodes, time or depth). Cancelling a job's future drops it before it
+    starts; setting its ``cancel_event`` also stops a search in progress,
+    which is how a whole batch is abandoned at once. An engine that dies or
+    errors is restarted and only its current job fails; while it cannot be
+    restarted, its worker fails jobs instead of hanging them. With an
+    EvalCache, ``evaluate`` answers known positions without searching and
+    stores new results.
+    """
+
+    def __init__(self, engine_path=ENGINE_PATH, size=None, threads=ENGINE_THREADS, hash_mb=ENGINE_HASH_MB,
+                 cache=None):
+        if not engine_path:
+            raise ValueError("No UCI engine configured; set STOCKFISH_PATH")
+        self.engine_path = engine_path
+        self.cache = cache
+        self.options = {'Threads': threads, 'Hash': hash_mb}
+        self.size = size or os.cpu_count() or 1
+        self.jobs = queue.Queue()
+        self.engine_name = None
+        self._workers = []
+        for _ in range(self.size):
+            engine = self._open()
+            worker = threading.Thread(target=self._work, args=(engine,), daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _open(self):
+        engine = chess.engine.SimpleEngine.popen_uci(self.engine_path)
+        engine.configure({name: value for name, value in self.options.items() if name in engine.options})
+        self.engine_name = engine.id.get('name', os.path.basename(self.engine_path))
+        return engine
+
+    def _restart(self, engine):
+        """Replace a broken engine; None if a new one cannot be started."""
+        if engine is not None:
+            try:
+                engine.close()
+            except Exception:
+                pass
+        try:
+            return self._open()
+        except Exception:
+            return None
+
+    def _work(self, engine):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            if job.cancel_event is not None and job.cancel_event.is_set():
+                job.future.cancel()
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            if engine is None:
+                # An earlier restart failed: retry now rather than leave the job hanging
+                engine = self._restart(None)
+                if engine is None:
+                    job.future.set_exception(chess.engine.EngineError("Engine could not be restarted"))
+                    continue
+            try:
+                job.future.set_result(self._search(engine, job))
+            except CancelledError as e:
+                job.future.set_exception(e)
+            except chess.engine.EngineError as e:
+                job.future.set_exception(e)
+                if isinstance(e, chess.engine.EngineTerminatedError):
+                    engine = self._restart(engine)
+            except Exception as e:  # e.g. a timeout; the engine's state is unknown
+                job.future.set_exception(e)
+                engine = self._restart(engine)
+        if engine is not None:
+            try:
+                engine.quit()
+            except Exception:
+                engine.close()
+
+    def _search(self, engine, job):
+        if job.cancel_event is None:
+            return engine.analyse(job.board, job.limit)
+        with engine.analysis(job.board, job.limit) as analysis:
+            for _ in analysis:
+                if job.cancel_event.is_set():
+                    analysis.stop()
+                    raise CancelledError()
+            return analysis.info
+
+    def submit(self, board, limit, cancel_event=None):
+        """Queue one position; returns a Future of the engine's info dict."""
+        job = AnalysisJob(board, limit, cancel_event)
+        self.jobs.put(job)
+        return job.future
+
+    def analyse_many(self, boards, limit, cancel_event=None):
+        """Queue many positions at once; futures in the same order."""
+        return [self.submit(board, limit, cancel_event) for board in boards]
+
+    def evaluate(self, boards, limit, cancel_event=None):
+        """White-side centipawn score of each board, as Futures.
+
+        Cached positions resolve at once; the rest are searched, each distinct
+        position only once per call, and their scores are added to the cache,
+        which is written to disk once the call's last search finishes.
+        """
+        if self.cache is not None:
+            cached = self.cache.get_many(boards, limit, self.engine_name)
+        else:
+            cached = [None] * len(boards)
+        searches = {}
+        futures = []
+        for board, cp in zip(boards, cached):
+            if cp is not None:
+                future = Future()
+                future.set_result(cp)
+            else:
+                position = (chess.polyglot.zobrist_hash(board), board.turn)
+                if position not in searches:
+                    future = Future()
+                    future.set_running_or_notify_cancel()  # Stopped through cancel_event, not cancel()
+                    searches[position] = (board, future)
+                future = searches[position][1]
+            futures.append(future)
+
+        remaining = [len(searches)]
+        lock = threading.Lock()
+
+        def finished():
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last and self.cache is not None:
+                self.cache.flush()
+
+        for board, future in searches.values():
+            search = self.submit(board, limit, cancel_event)
+            search.add_done_callback(
+                lambda search, board=board, future=future: self._score(search, board, limit, future, finished))
+        return futures
+
+    def _score(self, search, board, limit, future, finished):
+        error = None
+        try:
+            cp = search.result()['score'].white().score(mate_score=MATE_SCORE)
+        except KeyError:
+            error = chess.engine.EngineError("Search returned no score")
+        except Exception as e:  # Cancelled, or the engine failed
+            error = e
+        else:
+            if self.cache is not None:
+                self.cache.put(board, limit, self.engine_name, cp)
+        finished()
+        if error is None:
+            future.set_result(cp)
+        else:
+            future.set_exception(error)
+
+    def close(self):
+        """Let queued jobs finish, then quit every engine."""
+        for _ in self._workers:
+            self.jobs.put(None)
+        for worker in self._workers:
+            worker.join()
+        if self.cache is not None:
+            self.cache.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
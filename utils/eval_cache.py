@@ -0,0 +1,151 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import chess.polyglot
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pages", "eval_cache")
+CACHE_FILE = "evals.sqlite"
+MEMORY_ENTRIES = 200000  # Positions kept in the in-memory LRU
+FLUSH_EVERY = 500  # New evals buffered before one disk transaction
+LOOKUP_BATCH = 500  # Hashes per SQL IN (...) query
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS evals (
+    hash INTEGER NOT NULL,
+    turn INTEGER NOT NULL,
+    search TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    cp INTEGER NOT NULL,
+    PRIMARY KEY (hash, turn, search, engine)
+) WITHOUT ROWID
+"""
+
+
+def limit_key(limit):
+    """Stable text form of a chess.engine.Limit, e.g. 'nodes=100000'."""
+    fields = ('depth', 'nodes', 'time', 'mate')
+    return ','.join(f"{name}={getattr(limit, name)}" for name in fields if getattr(limit, name) is not None)
+
+
+def _signed(value):
+    # SQLite integers are signed 64-bit; Zobrist hashes are unsigned
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class EvalCache:
+    """White-side centipawn evals by (Zobrist hash, side to move, search limit, engine).
+
+    A SQLite file holds every eval ever computed; an LRU of recent positions
+    sits in front of it, so shared opening positions are answered from
+    memory. New evals are buffered and written FLUSH_EVERY at a time. Safe
+    to use from the engine pool's worker threads. Hit and miss counters back
+    the hit-rate report; a position missing several times in one lookup is
+    one miss, and its repeats count as hits since it is searched only once.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, memory_entries=MEMORY_ENTRIES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, CACHE_FILE)
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(_SCHEMA)
+        self._db.commit()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.repeats = 0
+
+    @staticmethod
+    def key(board, limit, engine):
+        return (_signed(chess.polyglot.zobrist_hash(board)), int(board.turn), limit_key(limit), engine)
+
+    def _remember(self, key, cp):
+        self._memory[key] = cp
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, boards, limit, engine):
+        """Cached eval for each board, None where it was never searched."""
+        keys = [self.key(board, limit, engine) for board in boards]
+        results = [None] * len(keys)
+        missing = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                cp = self._memory.get(key)
+                if cp is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    self._memory.move_to_end(key)
+                    results[i] = cp
+                    self.memory_hits += 1
+
+            search = limit_key(limit)
+            hashes = list({key[0] for key in missing})
+            for start in range(0, len(hashes), LOOKUP_BATCH):
+                batch = hashes[start:start + LOOKUP_BATCH]
+                rows = self._db.execute(
+                    f"SELECT hash, turn, cp FROM evals WHERE search = ? AND engine = ? "
+                    f"AND hash IN ({','.join('?' * len(batch))})",
+                    [search, engine, *batch]
+                )
+                for hash_value, turn, cp in rows:
+                    key = (hash_value, turn, search, engine)
+                    for i in missing.pop(key, ()):
+                        results[i] = cp
+                        self.disk_hits += 1
+                    self._remember(key, cp)
+            self.misses += len(missing)
+            self.repeats += sum(len(positions) - 1 for positions in missing.values())
+        return results
+
+    def get(self, board, limit, engine):
+        return self.get_many([board], limit, engine)[0]
+
+    def put(self, board, limit, engine, cp):
+        key = self.key(board, limit, engine)
+        with self._lock:
+            self._remember(key, cp)
+            self._pending.append((*key, cp))
+            if len(self._pending) >= FLUSH_EVERY:
+                self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self._db.executemany("INSERT OR REPLACE INTO evals VALUES (?, ?, ?, ?, ?)", self._pending)
+            self._db.commit()
+            self._pending = []
+
+    def flush(self):
+        """Write buffered evals to disk."""
+        with self._lock:
+            self._flush()
+
+    def __len__(self):
+        self.flush()
+        return self._db.execute("SELECT COUNT(*) FROM evals").fetchone()[0]
+
+    def stats(self):
+        """Hit/miss counters since the cache was opened."""
+        return {'memory_hits': self.memory_hits, 'disk_hits': self.disk_hits, 'repeats': self.repeats,
+                'misses': self.misses}
+
+    def report(self, since=None):
+        """Hits, misses and hit rate (%) since an earlier ``stats()`` snapshot (or since opening)."""
+        now = self.stats()
+        since = since or dict.fromkeys(now, 0)
+        delta = {name: now[name] - since[name] for name in now}
+        lookups = sum(delta.values())
+        hits = delta['memory_hits'] + delta['disk_hits'] + delta['repeats']
+        return {**delta, 'hits': hits, 'lookups': lookups, 'hit_rate': hits / lookups * 100 if lookups else 0.0}
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._db.close()
@@ -0,0 +1,197 @@
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.rating_series import LAG_DAYS, ROLLING_WINDOWS, CHANGE_DAYS, EMA_SPANS, VOLATILITY_WINDOWS
+
+STATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pages", "feature_state")
+STATE_VERSION = 2  # Bump when the feature definitions change
+
+DAILY_COLUMNS = ['rating', 'daily_wins', 'daily_games', 'daily_winrate', 'avg_opponent_rating',
+                 'avg_rating_diff', 'time_trouble_rate', 'avg_moves']
+TAIL_DAYS = max(max(CHANGE_DAYS) + 1, max(ROLLING_WINDOWS), max(VOLATILITY_WINDOWS) + 2, max(LAG_DAYS))
+KEEP_ROWS = TAIL_DAYS + 1  # Feature rows kept for the forecaster
+
+
+def _std(values):
+    """Sample std (ddof=1) like pandas rolling, NaN for fewer than two values."""
+    if len(values) < 2:
+        return math.nan
+    return float(np.std(values, ddof=1))
+
+
+class RatingFeatureState:
+    """Rating-prediction features for one user, built one day at a time.
+
+    Holds only what the next day's features depend on (the last TAIL_DAYS
+    ratings, win rates and game counts, the EMAs and the current streak) plus
+    the most recent feature rows, so memory and per-day work stay constant no
+    matter how long the history gets. Rows match ``create_features`` except
+    on a user's first few days, where the batch version backfilled missing
+    values from later days; here they fall back to the day's own values.
+    """
+
+    def __init__(self):
+        self.last_date = None
+        self.ratings = []
+        self.winrates = []
+        self.games = []
+        self.emas = {span: None for span in EMA_SPANS}
+        self.streak = None
+        self.rows = []
+        self.previous = None  # State before the last day, to replace a day still in progress
+
+    def _snapshot(self):
+        # Lists are replaced, never mutated, so only the EMA dict needs copying
+        state = {k: v for k, v in self.__dict__.items() if k != 'previous'}
+        state['emas'] = dict(self.emas)
+        return state
+
+    def _restore(self, snapshot):
+        self.__dict__.update(snapshot)
+        self.emas = dict(snapshot['emas'])
+
+    def _features(self, day):
+        """Feature row for ``day`` from the state of the preceding days."""
+        ratings, winrates, games = self.ratings, self.winrates, self.games
+        row = {'date': day['date']}
+        row.update({col: day[col] for col in DAILY_COLUMNS})
+
+        for lag in LAG_DAYS:
+            row[f'rating_lag_{lag}'] = ratings[-lag] if len(ratings) >= lag else math.nan
+
+        for w in ROLLING_WINDOWS:
+            recent = ratings[-w:]
+            row[f'rating_ma_{w}'] = float(np.mean(recent)) if recent else math.nan
+            row[f'rating_std_{w}'] = _std(recent)
+            row[f'rating_min_{w}'] = min(recent) if recent else math.nan
+            row[f'rating_max_{w}'] = max(recent) if recent else math.nan
+            row[f'winrate_ma_{w}'] = float(np.mean(winrates[-w:])) if winrates else math.nan
+            row[f'games_ma_{w}'] = float(np.mean(games[-w:])) if games else math.nan
+
+        row['rating_change_1d'] = ratings[-1] - ratings[-2] if len(ratings) >= 2 else math.nan
+        for d in CHANGE_DAYS:
+            row[f'rating_change_{d}d'] = ratings[-1] - ratings[-1 - d] if len(ratings) > d else math.nan
+
+        for span in EMA_SPANS:
+            row[f'rating_ema_{span}'] = self.emas[span] if self.emas[span] is not None else math.nan
+
+        # Volatility: std of the previous days' 1-day changes
+        changes = np.diff(ratings[:-1]) if len(ratings) > 2 else []
+        for w in VOLATILITY_WINDOWS:
+            row[f'rating_volatility_{w}'] = _std(changes[-w:])
+
+        row['win_streak'] = self.streak if self.streak is not None else math.nan
+
+        date = pd.Timestamp(day['date'])
+        row['day_of_week'] = date.dayofweek
+        row['month'] = date.month
+        row['is_weekend'] = int(date.dayofweek >= 5)
+
+        # Fill gaps from the previous row, else from the day itself
+        previous_row = self.rows[-1] if self.rows else None
+        for col, value in row.items():
+            if isinstance(value, float) and math.isnan(value):
+                if previous_row is not None:
+                    row[col] = previous_row[col]
+                elif col.startswith(('rating_lag', 'rating_ma', 'rating_min', 'rating_max', 'rating_ema')):
+                    row[col] = day['rating']
+                elif col.startswith('winrate_ma'):
+                    row[col] = day['daily_winrate']
+                elif col.startswith('games_ma'):
+                    row[col] = day['daily_games']
+                else:
+                    row[col] = 0.0
+        return row
+
+    def append_day(self, day):
+        """Add one day (mapping with 'date' and DAILY_COLUMNS); return its feature row."""
+        self.previous = self._snapshot()
+        row = self._features(day)
+
+        # Advance the state past this day
+        rating = float(day['rating'])
+        for span in EMA_SPANS:
+            alpha = 2 / (span + 1)
+            prev = self.emas[span]
+            self.emas[span] = rating if prev is None else alpha * rating + (1 - alpha) * prev
+        self.streak = (self.streak or 0) + 1 if day['daily_winrate'] > 0.5 else 0
+
+        self.ratings = (self.ratings + [rating])[-TAIL_DAYS:]
+        self.winrates = (self.winrates + [float(day['daily_winrate'])])[-TAIL_DAYS:]
+        self.games = (self.games + [float(day['daily_games'])])[-TAIL_DAYS:]
+        self.rows = (self.rows + [row])[-KEEP_ROWS:]
+        self.last_date = pd.Timestamp(day['date']).isoformat()
+        return row
+
+    def update(self, daily_df):
+        """Compute features only for days after the last one seen.
+
+        A repeated last day with new numbers (games still being played today)
+        replaces the stored one. Returns the number of days computed.
+        """
+        computed = 0
+        last = pd.Timestamp(self.last_date) if self.last_date else None
+        if last is not None:
+            daily_df = daily_df[pd.to_datetime(daily_df['date']) >= last]
+        for day in daily_df.sort_values('date').to_dict('records'):
+            date = pd.Timestamp(day['date'])
+            if last is not None and date == last:
+                stored = self.rows[-1]
+                if all(stored[col] == day[col] for col in DAILY_COLUMNS):
+                    continue
+                self._restore(self.previous)
+            self.append_day(day)
+            last = date
+            computed += 1
+        return computed
+
+    def frame(self):
+        """The most recent feature rows as a DataFrame (oldest first)."""
+        df = pd.DataFrame(self.rows)
+        if not df.empty:
+            df['date'] = pd.to_datetime(df['date'])
+        return df
+
+    def to_dict(self):
+        state = self._snapshot()
+        state['previous'] = self.previous
+        state['version'] = STATE_VERSION
+        return state
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls()
+        if data.get('version') != STATE_VERSION:
+            return state
+        data = {k: v for k, v in data.items() if k != 'version'}
+        data['emas'] = {int(k): v for k, v in data['emas'].items()}
+        if data.get('previous'):
+            data['previous']['emas'] = {int(k): v for k, v in data['previous']['emas'].items()}
+        state.__dict__.update(data)
+        return state
+
+
+def _state_path(username, perf_type, state_dir):
+    return os.path.join(state_dir, f"{username.lower()}_{perf_type}.json")
+
+
+def load_feature_state(username, perf_type, state_dir=STATE_DIR):
+    """Saved feature state for a user, or a fresh one."""
+    try:
+        with open(_state_path(username, perf_type, state_dir)) as f:
+            return RatingFeatureState.from_dict(json.load(f))
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return RatingFeatureState()
+
+
+def save_feature_state(state, username, perf_type, state_dir=STATE_DIR):
+    os.makedirs(state_dir, exist_ok=True)
+    path = _state_path(username, perf_type, state_dir)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state.to_dict(), f, default=str)
+    os.replace(tmp_path, path)
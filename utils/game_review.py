@@ -0,0 +1,95 @@
+import chess
+import chess.engine
+
+from utils.accuracy import JUDGEMENT_COLUMNS, accuracy_table
+from utils.engine_pool import MATE_SCORE
+
+REVIEW_NODES = 100000  # Per position; about a tenth of a second for Stockfish on one core
+
+
+def game_boards(moves):
+    """Board before every move and after the last one, up to the first illegal move."""
+    board = chess.Board()
+    boards = [board.copy(stack=False)]
+    for san in moves.split():
+        try:
+            board.push_san(san)
+        except ValueError:
+            break
+        boards.append(board.copy(stack=False))
+    return boards
+
+
+def terminal_eval(board):
+    """White-side score of a finished position, or None if the game goes on."""
+    if board.is_checkmate():
+        return -MATE_SCORE if board.turn == chess.WHITE else MATE_SCORE
+    if board.is_stalemate() or board.is_insufficient_material():
+        return 0
+    return None
+
+
+def review_games(pool, games, username, limit=None, cancel_event=None, progress=None, cached_only=False):
+    """Engine review of many games on an EnginePool.
+
+    Every position of every game goes to the pool in one ``evaluate`` call,
+    so cached positions (typically the opening) cost nothing and the rest
+    are spread over all of the pool's engines. With ``cached_only`` nothing
+    is searched and only games whose every position is already in the pool's
+    cache are reviewed. ``progress(done, total)`` is called with the finished
+    position count after each game. Games with a failed or cancelled search
+    are left out.
+    Returns {game id: review}: the player's color, White-side centipawn
+    ``evals`` per ply, and the player's moves, accuracy, acpl and judgement
+    counts from accuracy_table (computed for all reviewed games at once).
+    """
+    limit = limit or chess.engine.Limit(nodes=REVIEW_NODES)
+    queued, boards = [], []
+    for game in games:
+        if game.get('variant', 'standard') != 'standard' or not game.get('moves'):
+            continue
+        players = game.get('players', {})
+        is_white = players.get('white', {}).get('user', {}).get('name', '').lower() == username.lower()
+        game_positions = game_boards(game['moves'])
+        evals = [terminal_eval(board) for board in game_positions]
+        plies = [ply for ply, value in enumerate(evals) if value is None]
+        boards.extend(game_positions[ply] for ply in plies)
+        queued.append((game.get('id'), 'white' if is_white else 'black', evals, plies))
+
+    if cached_only:
+        if pool.cache is not None:
+            results = iter(pool.cache.get_many(boards, limit, pool.engine_name))
+        else:
+            results = iter([None] * len(boards))
+    else:
+        results = iter(pool.evaluate(boards, limit, cancel_event))
+    total = len(boards)
+    done = 0
+    reviewed = []
+    for game_id, color, evals, plies in queued:
+        failed = False
+        for ply in plies:
+            result = next(results)
+            try:
+                evals[ply] = result if cached_only else result.result()
+            except Exception:  # Cancelled, or the engine failed
+                evals[ply] = None
+            failed = failed or evals[ply] is None
+            done += 1
+        if progress:
+            progress(done, total)
+        if not failed:
+            reviewed.append((game_id, color, evals))
+
+    table = accuracy_table([evals for _, _, evals in reviewed])
+    table = table.set_index(['game', 'color'])
+    reviews = {}
+    for i, (game_id, color, evals) in enumerate(reviewed):
+        review = {'color': color, 'evals': evals, 'moves': 0, 'accuracy': None, 'acpl': None,
+                  **dict.fromkeys(JUDGEMENT_COLUMNS, 0)}
+        if (i, color) in table.index:
+            row = table.loc[(i, color)]
+            review.update(moves=int(row['moves']), accuracy=float(row['accuracy']), acpl=float(row['acpl']),
+                          **{name: int(row[name]) for name in JUDGEMENT_COLUMNS})
+        reviews[game_id] = review
+    return reviews
@@ -0,0 +1,81 @@
+import threading
+
+import chess
+
+from utils.accuracy import judge, judgement_name, win_percent
+from utils.game_review import terminal_eval
+
+
+class LiveGameAnalysis:
+    """Engine evals for a game in progress, searched once per ply.
+
+    Keeps the eval (or the pending search) of every position seen so far.
+    ``sync`` only submits the plies added since the last call, so refreshing
+    a long game costs one or two searches instead of the whole game. Searches
+    run on an EnginePool under a fixed per-ply limit (e.g. a time budget)
+    and are picked up by ``poll`` as they finish. Ply 0 is the start
+    position, ply n the position after the n-th move.
+    """
+
+    def __init__(self, pool, limit):
+        self.pool = pool
+        self.limit = limit
+        self.board = chess.Board()
+        self.moves = []
+        self.evals = {}  # ply -> White-side centipawns
+        self.pending = {}  # ply -> Future
+        self.failed = set()
+        self.cancel_event = threading.Event()
+        self._submit([(0, self.board.copy(stack=False))])
+
+    def _submit(self, positions):
+        searches = []
+        for ply, board in positions:
+            value = terminal_eval(board)
+            if value is None:
+                searches.append((ply, board))
+            else:
+                self.evals[ply] = value
+        futures = self.pool.evaluate([board for _, board in searches], self.limit, self.cancel_event)
+        for (ply, _), future in zip(searches, futures):
+            self.pending[ply] = future
+
+    def sync(self, moves_uci):
+        """Queue the plies that are new; False if ``moves_uci`` is a different game."""
+        if moves_uci[:len(self.moves)] != self.moves:
+            return False
+        positions = []
+        for uci in moves_uci[len(self.moves):]:
+            self.board.push_uci(uci)
+            self.moves.append(uci)
+            positions.append((len(self.moves), self.board.copy(stack=False)))
+        self._submit(positions)
+        return True
+
+    def poll(self):
+        """Collect finished searches; returns {ply: eval} for those that just arrived."""
+        arrived = {}
+        for ply, future in list(self.pending.items()):
+            if not future.done():
+                continue
+            del self.pending[ply]
+            try:
+                arrived[ply] = self.evals[ply] = future.result()
+            except Exception:
+                self.failed.add(ply)
+        return arrived
+
+    def judgement(self, ply):
+        """'blunder', 'mistake', 'inaccuracy' or None for the ply-th move, once both evals are in."""
+        before, after = self.evals.get(ply - 1), self.evals.get(ply)
+        if ply < 1 or before is None or after is None:
+            return None
+        drop = win_percent(before) - win_percent(after)
+        if ply % 2 == 0:  # Black's move: the drop is in Black's win %
+            drop = -drop
+        return judgement_name(int(judge(drop)))
+
+    def cancel(self):
+        """Stop every queued or running search of this game."""
+        self.cancel_event.set()
+        self.pending = {}
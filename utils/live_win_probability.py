@@ -0,0 +1,131 @@
+import math
+
+import chess
+
+PIECE_VALUES = {
+    chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3,
+    chess.ROOK: 5, chess.QUEEN: 9, chess.KING: 0
+}
+CP_LOGIT = 0.00368208  # Lichess centipawn -> win% curve, in logit units
+PRIOR_DECAY_PLIES = 40  # Pre-game prior keeps ~37% of its weight after 40 plies
+CLOCK_WEIGHT = 1.5
+MAX_LOGIT = 8.0
+
+
+def _logit(p):
+    p = min(max(p, 1e-4), 1 - 1e-4)
+    return math.log(p / (1 - p))
+
+
+def _squash(logit):
+    logit = min(max(logit, -MAX_LOGIT), MAX_LOGIT)
+    return 1 / (1 + math.exp(-logit))
+
+
+def parse_base_time(time_control):
+    """Initial clock in seconds from a PGN TimeControl tag ('180+2' -> 180)."""
+    try:
+        return float(str(time_control).split('+')[0])
+    except (TypeError, ValueError):
+        return None
+
+
+class LiveWinProbability:
+    """White's win probability for a game in progress, updated move by move.
+
+    Starts from the pre-game probability and blends in the material balance
+    (or an engine eval when one is supplied) and the remaining clocks. Material
+    and clocks are tracked incrementally, so each move costs the same no matter
+    how long the game already is. An engine eval that arrives after its move
+    was pushed replaces the material estimate through ``set_eval``.
+    """
+
+    def __init__(self, pregame_prob, base_time=None):
+        self.pregame_prob = pregame_prob
+        self.prior_logit = _logit(pregame_prob)
+        self.base_time = base_time
+        self.board = chess.Board()
+        self.material = 0  # White minus Black, in pawns
+        self.clocks = {chess.WHITE: base_time, chess.BLACK: base_time}
+        self.moves = []
+        self.history = [pregame_prob]
+        self.base_logits = [None]  # Per ply: logit without the score term (None = fixed probability)
+
+    @property
+    def ply(self):
+        return len(self.moves)
+
+    def push(self, move, clock=None, evaluate=None):
+        """Apply one move and return White's updated win probability.
+
+        ``clock`` is the mover's remaining time in seconds (PGN ``[%clk]``).
+        ``evaluate`` is an optional callable returning the position's
+        centipawn score from White's side, e.g. a local engine.
+        """
+        mover = self.board.turn
+        if self.board.is_en_passant(move):
+            gain = 1
+        else:
+            captured = self.board.piece_at(move.to_square)
+            gain = PIECE_VALUES[captured.piece_type] if captured else 0
+        if move.promotion:
+            gain += PIECE_VALUES[move.promotion] - 1
+        self.material += gain if mover == chess.WHITE else -gain
+
+        self.board.push(move)
+        self.moves.append(move.uci())
+        if clock is not None:
+            self.clocks[mover] = clock
+
+        eval_cp = evaluate(self.board) if evaluate else None
+        base_logit = self._base_logit()
+        self.base_logits.append(base_logit)
+        self.history.append(self._probability(base_logit, eval_cp))
+        return self.history[-1]
+
+    def set_eval(self, ply, eval_cp):
+        """Use an engine score (White's side) for the position after ``ply`` moves."""
+        base_logit = self.base_logits[ply]
+        if base_logit is not None:
+            self.history[ply] = _squash(base_logit + CP_LOGIT * eval_cp)
+        return self.history[ply]
+
+    def sync(self, moves_uci, clocks=None, evaluate=None):
+        """Catch up with a growing move list, processing only the new moves.
+
+        Returns False when ``moves_uci`` does not continue the tracked game, in
+        which case the caller should start a new tracker.
+        """
+        if moves_uci[:self.ply] != self.moves:
+            return False
+        for i in range(self.ply, len(moves_uci)):
+            clock = clocks[i] if clocks and i < len(clocks) else None
+            self.push(chess.Move.from_uci(moves_uci[i]), clock, evaluate)
+        return True
+
+    def _clock_logit(self):
+        white, black = self.clocks[chess.WHITE], self.clocks[chess.BLACK]
+        if not self.base_time or white is None or black is None:
+            return 0.0
+        # sqrt: the same gap matters more when both players are short on time
+        white_frac = min(max(white / self.base_time, 0.0), 1.0)
+        black_frac = min(max(black / self.base_time, 0.0), 1.0)
+        return CLOCK_WEIGHT * (math.sqrt(white_frac) - math.sqrt(black_frac))
+
+    def _base_logit(self):
+        """Prior and clock part of the current logit, or None once the game is decided."""
+        board = self.board
+        if board.is_checkmate() or board.is_stalemate() or board.is_insufficient_material():
+            return None
+        prior_weight = math.exp(-self.ply / PRIOR_DECAY_PLIES)
+        return prior_weight * self.prior_logit + self._clock_logit()
+
+    def _probability(self, base_logit, eval_cp=None):
+        board = self.board
+        if board.is_checkmate():
+            return 0.0 if board.turn == chess.WHITE else 1.0
+        if base_logit is None:
+            return 0.5
+
+        cp = eval_cp if eval_cp is not None else 100 * self.material
+        return _squash(base_logit + CP_LOGIT * cp)
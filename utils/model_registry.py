@@ -0,0 +1,256 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+REGISTRY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pages", "models", "registry")
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class ArrayScaler:
+    """Scaler rebuilt from stored center/scale arrays (Robust or Standard)."""
+
+    def __init__(self, center, scale):
+        self.center_ = center
+        self.scale_ = scale
+
+    def transform(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if self.center_ is not None:
+            X = X - self.center_
+        if self.scale_ is not None:
+            X = X / self.scale_
+        return X
+
+
+class LinearRegressorModel:
+    """Linear regressor rebuilt from stored coefficients."""
+
+    def __init__(self, coef, intercept):
+        self.coef_ = coef
+        self.intercept_ = intercept
+
+    def predict(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.coef_ + self.intercept_
+
+
+class BoosterClassifier:
+    """Binary LightGBM classifier with optional isotonic calibration.
+
+    Mirrors ``CalibratedClassifierCV(method='isotonic')``: each fold booster's
+    probability is mapped through its isotonic thresholds and the folds are
+    averaged.
+    """
+
+    def __init__(self, boosters, calibrators=None):
+        self.boosters = boosters
+        self.calibrators = calibrators
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        positive = np.zeros(len(X))
+        for i, booster in enumerate(self.boosters):
+            raw = booster.predict(X)
+            if self.calibrators:
+                x_thresholds, y_thresholds = self.calibrators[i]
+                raw = np.interp(raw, x_thresholds, y_thresholds)
+            positive += raw
+        positive /= len(self.boosters)
+        return np.column_stack([1 - positive, positive])
+
+
+def _to_builtin(value):
+    """Convert numpy scalars inside metadata to JSON-friendly values."""
+    if isinstance(value, dict):
+        return {str(k): _to_builtin(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_builtin(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _save_array(version_dir, name, array):
+    np.save(os.path.join(version_dir, f"{name}.npy"), np.ascontiguousarray(array, dtype=np.float64))
+    return f"{name}.npy"
+
+
+def _export_model(model, version_dir):
+    """Write the estimator in a native format and return its manifest entry."""
+    from sklearn.calibration import CalibratedClassifierCV
+
+    if isinstance(model, CalibratedClassifierCV):
+        folds = []
+        for i, fold in enumerate(model.calibrated_classifiers_):
+            booster_file = f"booster_{i}.txt"
+            fold.estimator.booster_.save_model(os.path.join(version_dir, booster_file))
+            calibrator = fold.calibrators[0]
+            folds.append({
+                'booster': booster_file,
+                'x_thresholds': _save_array(version_dir, f"isotonic_x_{i}", calibrator.X_thresholds_),
+                'y_thresholds': _save_array(version_dir, f"isotonic_y_{i}", calibrator.y_thresholds_)
+            })
+        return {'kind': 'lightgbm_classifier', 'folds': folds}
+
+    if hasattr(model, 'booster_'):
+        model.booster_.save_model(os.path.join(version_dir, "booster_0.txt"))
+        return {'kind': 'lightgbm_classifier', 'folds': [{'booster': "booster_0.txt"}]}
+
+    if hasattr(model, 'coef_'):
+        return {
+            'kind': 'linear_regressor',
+            'coef': _save_array(version_dir, "coef", np.ravel(model.coef_)),
+            'intercept': float(np.ravel(model.intercept_)[0])
+        }
+
+    raise ValueError(f"Unsupported model type: {type(model).__name__}")
+
+
+def _export_scaler(scaler, version_dir):
+    if scaler is None:
+        return None
+    center = getattr(scaler, 'center_', getattr(scaler, 'mean_', None))
+    scale = getattr(scaler, 'scale_', None)
+    return {
+        'kind': type(scaler).__name__,
+        'center': _save_array(version_dir, "scaler_center", center) if center is not None else None,
+        'scale': _save_array(version_dir, "scaler_scale", scale) if scale is not None else None
+    }
+
+
+def export_model_package(model_package, name, registry_dir=REGISTRY_DIR, version=None, activate=True):
+    """Write a pickled model package dict into the registry as a new version.
+
+    The model is stored as LightGBM text or NumPy arrays, the scaler as
+    center/scale arrays, and everything else in ``manifest.json``. With
+    ``activate`` the ``CURRENT`` pointer is swapped atomically, which running
+    apps pick up on their next ``load_model`` call.
+    """
+    version = version or datetime.now().strftime("%Y%m%d-%H%M%S")
+    version_dir = os.path.join(registry_dir, name, version)
+    os.makedirs(version_dir, exist_ok=False)
+
+    metadata = {k: v for k, v in model_package.items() if k not in ('model', 'base_model', 'scaler')}
+    manifest = {
+        'name': name,
+        'version': version,
+        'created_at': datetime.now().isoformat(),
+        'model': _export_model(model_package['model'], version_dir),
+        'scaler': _export_scaler(model_package.get('scaler'), version_dir),
+        'metadata': _to_builtin(metadata)
+    }
+
+    with open(os.path.join(version_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    if activate:
+        activate_version(name, version, registry_dir)
+
+    return version_dir
+
+
+def activate_version(name, version, registry_dir=REGISTRY_DIR):
+    """Point the model's ``CURRENT`` file at ``version`` (atomic rename)."""
+    model_dir = os.path.join(registry_dir, name)
+    if not os.path.exists(os.path.join(model_dir, version, MANIFEST_FILE)):
+        raise FileNotFoundError(f"No manifest for {name}/{version}")
+    tmp_path = os.path.join(model_dir, f".{CURRENT_FILE}.tmp")
+    with open(tmp_path, 'w') as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(model_dir, CURRENT_FILE))
+
+
+def list_versions(name, registry_dir=REGISTRY_DIR):
+    model_dir = os.path.join(registry_dir, name)
+    if not os.path.isdir(model_dir):
+        return []
+    return sorted(
+        v for v in os.listdir(model_dir)
+        if os.path.exists(os.path.join(model_dir, v, MANIFEST_FILE))
+    )
+
+
+def _current_version(model_dir):
+    """Return (version, mtime) of the active version, or (None, None)."""
+    current_path = os.path.join(model_dir, CURRENT_FILE)
+    try:
+        mtime = os.stat(current_path).st_mtime_ns
+        with open(current_path) as f:
+            return f.read().strip(), mtime
+    except FileNotFoundError:
+        return None, None
+
+
+def _load_array(version_dir, file_name, mmap=True):
+    if file_name is None:
+        return None
+    return np.load(os.path.join(version_dir, file_name), mmap_mode='r' if mmap else None)
+
+
+def _load_version(version_dir, mmap=True):
+    """Rebuild a model package dict from a version directory."""
+    with open(os.path.join(version_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+
+    model_info = manifest['model']
+    if model_info['kind'] == 'lightgbm_classifier':
+        import lightgbm as lgb
+        boosters = []
+        calibrators = []
+        for fold in model_info['folds']:
+            boosters.append(lgb.Booster(model_file=os.path.join(version_dir, fold['booster'])))
+            if 'x_thresholds' in fold:
+                calibrators.append((
+                    _load_array(version_dir, fold['x_thresholds'], mmap),
+                    _load_array(version_dir, fold['y_thresholds'], mmap)
+                ))
+        model = BoosterClassifier(boosters, calibrators or None)
+    elif model_info['kind'] == 'linear_regressor':
+        model = LinearRegressorModel(_load_array(version_dir, model_info['coef'], mmap), model_info['intercept'])
+    else:
+        raise ValueError(f"Unknown model kind in manifest: {model_info['kind']}")
+
+    scaler = None
+    if manifest.get('scaler'):
+        scaler = ArrayScaler(
+            _load_array(version_dir, manifest['scaler']['center'], mmap),
+            _load_array(version_dir, manifest['scaler']['scale'], mmap)
+        )
+
+    package = dict(manifest.get('metadata', {}))
+    package['model'] = model
+    package['scaler'] = scaler
+    package['version'] = manifest['version']
+    return package
+
+
+def load_model(name, registry_dir=REGISTRY_DIR, mmap=True):
+    """Load the active version of a registered model, or None if not registered.
+
+    The result is cached per process and keyed by the ``CURRENT`` pointer's
+    mtime, so each call costs one ``stat`` and a newly activated version is
+    picked up without restarting the app.
+    """
+    model_dir = os.path.join(registry_dir, name)
+    version, mtime = _current_version(model_dir)
+    if version is None:
+        return None
+
+    key = (os.path.abspath(model_dir), version, mtime)
+    cached = _cache.get(model_dir)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    with _cache_lock:
+        cached = _cache.get(model_dir)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        package = _load_version(os.path.join(model_dir, version), mmap=mmap)
+        _cache[model_dir] = (key, package)
+        return package
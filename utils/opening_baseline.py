@@ -0,0 +1,192 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(ROOT_DIR, "pages", "opening_baseline")
+TABLE_FILE = "baseline.npy"
+OPENINGS_FILE = "openings.json"
+
+COLORS = ('white', 'black')
+BAND_EDGES = np.array([1000, 1200, 1400, 1600, 1800, 2000, 2200, 2400])
+BAND_LABELS = ["<1000", "1000-1200", "1200-1400", "1400-1600", "1600-1800",
+               "1800-2000", "2000-2200", "2200-2400", "2400+"]
+ALL_BANDS = len(BAND_LABELS)  # Band slot holding every rating together
+MIN_BASELINE_GAMES = 30  # Fewer population games than this falls back to a wider row
+Z_95 = 1.96
+
+TABLE_DTYPE = np.dtype([
+    ('key', '<i8'),
+    ('games', '<i4'),
+    ('wins', '<i4'),
+    ('draws', '<i4'),
+])
+
+
+def base_opening_name(name):
+    """Family name of a Lichess opening, e.g. 'Sicilian Defense' for any Sicilian line."""
+    return name.split(':')[0].split(',')[0].strip()
+
+
+def rating_band(ratings):
+    """Band index (0 .. ALL_BANDS - 1) for each rating."""
+    return np.searchsorted(BAND_EDGES, np.asarray(ratings, dtype=float), side='right')
+
+
+def _keys(opening_ids, colors, bands):
+    return (np.asarray(opening_ids, dtype=np.int64) * len(COLORS) + colors) * (ALL_BANDS + 1) + bands
+
+
+def split_keys(keys):
+    """(opening id, color index, band) of table keys."""
+    keys = np.asarray(keys)
+    return keys // ((ALL_BANDS + 1) * len(COLORS)), keys // (ALL_BANDS + 1) % len(COLORS), keys % (ALL_BANDS + 1)
+
+
+def build_baseline(games):
+    """Population table from an iterable of Lichess game dicts.
+
+    Every game counts once per side, under that side's color and rating band.
+    Besides each (opening, color, band) row the table holds the
+    (opening, color, all bands) and (any opening, color, band) aggregates the
+    lookup falls back to. Returns (structured array sorted by key, opening names).
+    """
+    opening_ids = {}
+    openings, colors, ratings, scores = [], [], [], []
+    for game in games:
+        name = game.get('opening', {}).get('name')
+        if not name or game.get('variant', 'standard') != 'standard':
+            continue
+        opening = opening_ids.setdefault(base_opening_name(name), len(opening_ids))
+        winner = game.get('winner')
+        players = game.get('players', {})
+        for color_index, color in enumerate(COLORS):
+            rating = players.get(color, {}).get('rating')
+            if not rating:
+                continue
+            openings.append(opening)
+            colors.append(color_index)
+            ratings.append(rating)
+            scores.append(1.0 if winner == color else 0.5 if winner is None else 0.0)
+
+    openings = np.array(openings, dtype=np.int64)
+    colors = np.array(colors, dtype=np.int64)
+    bands = rating_band(ratings)
+    scores = np.array(scores)
+    any_opening = np.full_like(openings, len(opening_ids))
+
+    keys = np.concatenate([
+        _keys(openings, colors, bands),
+        _keys(openings, colors, np.full_like(bands, ALL_BANDS)),
+        _keys(any_opening, colors, bands),
+    ])
+    scores = np.tile(scores, 3)
+    unique, inverse = np.unique(keys, return_inverse=True)
+
+    table = np.zeros(len(unique), dtype=TABLE_DTYPE)
+    table['key'] = unique
+    table['games'] = np.bincount(inverse, minlength=len(unique))
+    table['wins'] = np.bincount(inverse, weights=scores == 1.0, minlength=len(unique))
+    table['draws'] = np.bincount(inverse, weights=scores == 0.5, minlength=len(unique))
+    names = sorted(opening_ids, key=opening_ids.get)
+    return table, names
+
+
+def save_baseline(table, openings, directory=BASELINE_DIR):
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, TABLE_FILE), table)
+    with open(os.path.join(directory, OPENINGS_FILE), 'w') as f:
+        json.dump(openings, f)
+
+
+class OpeningBaseline:
+    """Expected score per (opening, color, rating band) from the population table.
+
+    The table is memory-mapped, so loading it costs no more than reading the
+    opening names, and lookups are a vectorized ``searchsorted`` over its
+    sorted keys. Rows with fewer than MIN_BASELINE_GAMES fall back to the
+    opening at all ratings, then to every opening in the band.
+    """
+
+    def __init__(self, table, openings):
+        self.table = table
+        self.openings = openings
+        self.opening_ids = {name: i for i, name in enumerate(openings)}
+
+    @classmethod
+    def load(cls, directory=BASELINE_DIR):
+        """The saved baseline, or None if it has not been built."""
+        table_path = os.path.join(directory, TABLE_FILE)
+        openings_path = os.path.join(directory, OPENINGS_FILE)
+        if not (os.path.exists(table_path) and os.path.exists(openings_path)):
+            return None
+        with open(openings_path) as f:
+            openings = json.load(f)
+        return cls(np.load(table_path, mmap_mode='r'), openings)
+
+    def __len__(self):
+        return len(self.table)
+
+    def _find(self, keys):
+        """Table row of each key, -1 where missing or too small."""
+        table_keys = self.table['key']
+        rows = np.minimum(np.searchsorted(table_keys, keys), len(table_keys) - 1)
+        found = (table_keys[rows] == keys) & (self.table['games'][rows] >= MIN_BASELINE_GAMES)
+        return np.where(found, rows, -1)
+
+    def expected(self, opening_names, colors, ratings):
+        """Expected score and per-game score variance for each game.
+
+        ``opening_names`` are family names, ``colors`` 'white'/'black' and
+        ``ratings`` the player's rating at the time. Games without any usable
+        row get NaN.
+        """
+        names = pd.Series(opening_names)
+        opening = names.map(self.opening_ids).fillna(-1).to_numpy(dtype=np.int64)
+        color = (pd.Series(colors).to_numpy() == 'black').astype(np.int64)
+        bands = rating_band(pd.Series(ratings).fillna(0).to_numpy())
+
+        if not len(self.table):
+            return np.full(len(names), np.nan), np.full(len(names), np.nan)
+
+        known = opening >= 0
+        band_rows = np.where(known, self._find(_keys(opening, color, bands)), -1)
+        opening_rows = np.where(known, self._find(_keys(opening, color, ALL_BANDS)), -1)
+        population_rows = self._find(_keys(len(self.openings), color, bands))
+        rows = np.where(band_rows >= 0, band_rows, np.where(opening_rows >= 0, opening_rows, population_rows))
+
+        valid = rows >= 0
+        row_games = self.table['games'][rows].astype(float)
+        wins = self.table['wins'][rows] / row_games
+        draws = self.table['draws'][rows] / row_games
+        score = wins + 0.5 * draws
+        variance = wins + 0.25 * draws - score ** 2
+        return np.where(valid, score, np.nan), np.where(valid, variance, np.nan)
+
+
+def compare_to_baseline(stats, games, keys):
+    """Add population expectation columns to a grouped opening table.
+
+    ``games`` has one row per game with columns ``keys``, 'outcome',
+    'expected' and 'expected_var'; ``stats`` is its groupby(keys) summary
+    with win_rate in percent. Adds expected (%), vs_expected (points) and its
+    95% interval (ci_low/ci_high), using the population variance of a game's
+    score so the interval is meaningful even for a handful of games.
+    """
+    rated = games.dropna(subset=['expected'])
+    grouped = rated.groupby(keys).agg(
+        baseline_games=('outcome', 'size'),
+        actual=('outcome', 'mean'),
+        expected=('expected', 'mean'),
+        variance=('expected_var', 'sum')
+    ).reset_index()
+    difference = (grouped['actual'] - grouped['expected']) * 100
+    margin = Z_95 * np.sqrt(grouped['variance']) / grouped['baseline_games'] * 100
+    grouped['expected'] *= 100
+    grouped['vs_expected'] = difference
+    grouped['ci_low'] = difference - margin
+    grouped['ci_high'] = difference + margin
+    columns = keys + ['expected', 'vs_expected', 'ci_low', 'ci_high']
+    return stats.merge(grouped[columns], on=keys, how='left')
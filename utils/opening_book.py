@@ -0,0 +1,133 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import chess
+import chess.polyglot
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BOOK = os.path.join(ROOT_DIR, "books", "opening_book.bin")
+BOOK_PATH = os.environ.get("POLYGLOT_BOOK") or (DEFAULT_BOOK if os.path.exists(DEFAULT_BOOK) else None)
+
+MAX_BOOK_PLIES = 40  # Stop looking after this many plies even if still in book
+PARALLEL_MIN_GAMES = 200  # Games before replaying them in a process pool pays off
+LEFT_BY = ('you', 'opponent', 'book end', 'still in book')
+LEFT_BY_LABELS = {
+    'you': 'You left book',
+    'opponent': 'Opponent left book',
+    'book end': 'Book ran out',
+    'still in book': 'Still in book'
+}
+
+
+def _walk_book(reader, moves, max_plies):
+    """(plies in book, who left, SAN played, top book moves) for one game's SAN moves."""
+    board = chess.Board()
+    for ply, san in enumerate(moves[:max_plies]):
+        entries = sorted(reader.find_all(board), key=lambda e: -e.weight)
+        if not entries:
+            return ply, 'book end', None, []
+        try:
+            move = board.parse_san(san)
+        except ValueError:
+            return ply, 'book end', None, []
+        if all(entry.move != move for entry in entries):
+            book_moves = [board.san(entry.move) for entry in entries[:3]]
+            return ply, board.turn, san, book_moves
+        board.push(move)
+    return min(len(moves), max_plies), 'still in book', None, []
+
+
+def _deviation_chunk(book_path, move_lists, max_plies):
+    with chess.polyglot.open_reader(book_path) as reader:
+        return [_walk_book(reader, moves, max_plies) for moves in move_lists]
+
+
+def find_book_deviations(games, username, book_path=BOOK_PATH, max_plies=MAX_BOOK_PLIES, workers=None):
+    """Where each game left the opening book.
+
+    Every game is replayed once against the Polyglot book and stops at the
+    first move the book does not contain (or where the book has no entry).
+    Games are split over a process pool, each worker opening the book once.
+
+    Returns one row per standard game: game_id, opening, color, score
+    (1/0.5/0 for the player), book_plies, left_by (one of LEFT_BY),
+    deviation (the SAN played) and book_moves (the book's top choices there).
+    """
+    username = username.lower()
+    meta, move_lists = [], []
+    for game in games:
+        if game.get('variant', 'standard') != 'standard' or not game.get('moves'):
+            continue
+        players = game.get('players', {})
+        is_white = players.get('white', {}).get('user', {}).get('name', '').lower() == username
+        color = 'white' if is_white else 'black'
+        winner = game.get('winner')
+        meta.append((game.get('id'), game.get('opening', {}).get('name', 'Unknown'), color,
+                     1.0 if winner == color else 0.5 if winner is None else 0.0))
+        move_lists.append(game['moves'].split()[:max_plies])
+
+    if workers is None:
+        workers = (os.cpu_count() or 1) if len(move_lists) >= PARALLEL_MIN_GAMES else 1
+    workers = max(1, min(workers, len(move_lists)))
+    if workers > 1:
+        chunk = -(-len(move_lists) // workers)
+        chunks = [move_lists[i:i + chunk] for i in range(0, len(move_lists), chunk)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = pool.map(_deviation_chunk, [book_path] * len(chunks), chunks, [max_plies] * len(chunks))
+            walks = [walk for part in parts for walk in part]
+    else:
+        walks = _deviation_chunk(book_path, move_lists, max_plies) if move_lists else []
+
+    rows = []
+    for (game_id, opening, color, score), (plies, leaver, deviation, book_moves) in zip(meta, walks):
+        if isinstance(leaver, bool):  # The side to move deviated
+            leaver = 'you' if (leaver == chess.WHITE) == (color == 'white') else 'opponent'
+        rows.append((game_id, opening, color, score, plies, leaver, deviation, book_moves))
+    return pd.DataFrame(rows, columns=['game_id', 'opening', 'color', 'score', 'book_plies',
+                                       'left_by', 'deviation', 'book_moves'])
+
+
+def deviation_summary(deviations):
+    """Games, average score and average book depth by who left the book first."""
+    summary = deviations.groupby('left_by').agg(
+        games=('score', 'size'),
+        score=('score', 'mean'),
+        avg_book_plies=('book_plies', 'mean')
+    ).reindex(LEFT_BY).dropna(subset=['games'])
+    summary['games'] = summary['games'].astype(int)
+    summary['score'] *= 100
+    return summary.reset_index()
+
+
+def frequent_deviations(deviations, min_games=2, limit=10):
+    """The player's own most repeated departures from book, with their score."""
+    own = deviations[deviations['left_by'] == 'you'].copy()
+    if own.empty:
+        return own
+    own['book_moves'] = own['book_moves'].str.join(', ')
+    grouped = own.groupby(['opening', 'color', 'book_plies', 'deviation', 'book_moves']).agg(
+        games=('score', 'size'),
+        score=('score', 'mean')
+    ).reset_index()
+    grouped['score'] *= 100
+    grouped = grouped[grouped['games'] >= min_games]
+    return grouped.sort_values(['games', 'score'], ascending=[False, True]).head(limit).reset_index(drop=True)
+
+
+def deviations_by_opening(deviations, min_games=3):
+    """Per opening: book depth, how often the player left book first and how they scored then."""
+    flags = deviations.assign(
+        you_left=deviations['left_by'] == 'you',
+        score_you_left=deviations['score'].where(deviations['left_by'] == 'you')
+    )
+    by_opening = flags.groupby('opening').agg(
+        games=('score', 'size'),
+        avg_book_plies=('book_plies', 'mean'),
+        you_left=('you_left', 'mean'),
+        score_you_left=('score_you_left', 'mean'),
+        score=('score', 'mean')
+    ).reset_index()
+    by_opening[['you_left', 'score_you_left', 'score']] *= 100
+    by_opening = by_opening[by_opening['games'] >= min_games]
+    return by_opening.sort_values('games', ascending=False).reset_index(drop=True)
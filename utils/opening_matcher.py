@@ -0,0 +1,48 @@
+import re
+import unicodedata
+
+
+def normalize_name(name):
+    """Case-, accent- and punctuation-insensitive form of an opening name."""
+    name = unicodedata.normalize('NFKD', str(name))
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    name = name.casefold().replace('’', "'")
+    return ' '.join(re.sub(r"[^\w']+", ' ', name).split())
+
+
+class OpeningMatcher:
+    """Finds which of a fixed set of opening names occurs in a full opening name.
+
+    All patterns are compiled once into a single regex alternation (longest
+    first), so one scan of the name finds the leftmost, longest pattern, e.g.
+    'Queen's Gambit Declined' rather than 'Queen's Gambit'. Results are
+    memoized per distinct name, so repeated lookups across thousands of games
+    or variations are dict hits.
+    """
+
+    def __init__(self, names):
+        self.names = list(names)
+        by_normal = {}
+        for name in self.names:
+            by_normal.setdefault(normalize_name(name), name)
+        self._by_normal = by_normal
+        alternatives = sorted(by_normal, key=len, reverse=True)
+        self._pattern = None
+        if alternatives:
+            self._pattern = re.compile(r'\b(?:' + '|'.join(map(re.escape, alternatives)) + r')\b')
+        self._cache = {}
+
+    def match(self, opening_name):
+        """Best matching name from the set, or None."""
+        try:
+            return self._cache[opening_name]
+        except KeyError:
+            pass
+        # Longest alternatives come first, so the leftmost match is also the longest there
+        found = self._pattern.search(normalize_name(opening_name)) if self._pattern else None
+        result = self._by_normal[found.group()] if found else None
+        self._cache[opening_name] = result
+        return result
+
+    def __contains__(self, opening_name):
+        return self.match(opening_name) is not None
@@ -0,0 +1,174 @@
+import re
+from array import array
+
+MAX_PLIES = 30  # Depth of the explorer; later moves are no longer "the opening"
+COLORS = ('white', 'black')
+MOVE_BITS = 20  # Interned move ids per node key; far more than distinct SAN moves
+
+_MOVE_NUMBER = re.compile(r'^\d+\.+')
+
+
+def parse_moves(moves):
+    """SAN list from '1.e4 c5 2.Nf3', 'e4 c5 Nf3' or an existing list."""
+    if isinstance(moves, str):
+        moves = moves.split()
+    parsed = []
+    for token in moves:
+        token = _MOVE_NUMBER.sub('', token)
+        if token:
+            parsed.append(token)
+    return parsed
+
+
+class MoveTrie:
+    """Opening explorer over one player's games, keyed by the actual moves.
+
+    Every node is a move sequence from the start position. Node statistics
+    live in flat typed arrays (one slot per node and player color), moves are
+    interned to small ints, and children are linked through first-child /
+    next-sibling arrays plus one ``(node, move) -> child`` dict for lookups,
+    so a node costs a few dozen bytes and adding a game walks at most
+    ``max_plies`` nodes. Games are remembered by id, so feeding the same games
+    again (e.g. after refetching) only inserts the new ones.
+    """
+
+    def __init__(self, max_plies=MAX_PLIES):
+        self.max_plies = max_plies
+        self.move_ids = {}
+        self.move_names = []
+        self.edges = {}
+        self.parent = array('l', [-1])
+        self.node_move = array('l', [-1])
+        self.first_child = array('l', [-1])
+        self.next_sibling = array('l', [-1])
+        # Per node and color: index 2 * node + color
+        self.wins = array('l', [0, 0])
+        self.draws = array('l', [0, 0])
+        self.losses = array('l', [0, 0])
+        self.opponent_sum = array('d', [0.0, 0.0])
+        self.opponent_count = array('l', [0, 0])
+        self.game_ids = set()
+
+    def __len__(self):
+        return len(self.parent)
+
+    def _intern(self, san):
+        move_id = self.move_ids.get(san)
+        if move_id is None:
+            move_id = self.move_ids[san] = len(self.move_names)
+            self.move_names.append(san)
+        return move_id
+
+    def _child(self, node, san, create=False):
+        move_id = self.move_ids.get(san) if not create else self._intern(san)
+        if move_id is None:
+            return None
+        key = (node << MOVE_BITS) | move_id
+        child = self.edges.get(key)
+        if child is None and create:
+            child = self.edges[key] = len(self.parent)
+            self.parent.append(node)
+            self.node_move.append(move_id)
+            self.first_child.append(-1)
+            self.next_sibling.append(self.first_child[node])
+            self.first_child[node] = child
+            for stats in (self.wins, self.draws, self.losses, self.opponent_count):
+                stats.extend((0, 0))
+            self.opponent_sum.extend((0.0, 0.0))
+        return child
+
+    def _record(self, node, color, result, opponent_rating):
+        i = 2 * node + color
+        if result == 'win':
+            self.wins[i] += 1
+        elif result == 'draw':
+            self.draws[i] += 1
+        else:
+            self.losses[i] += 1
+        if opponent_rating:
+            self.opponent_sum[i] += opponent_rating
+            self.opponent_count[i] += 1
+
+    def add_game(self, game, username):
+        """Insert one Lichess game dict; returns False if it was already added or has no moves."""
+        game_id = game.get('id')
+        if game_id is not None:
+            if game_id in self.game_ids:
+                return False
+            self.game_ids.add(game_id)
+
+        moves = game.get('moves', '').split()[:self.max_plies]
+        if not moves:
+            return False
+
+        players = game.get('players', {})
+        is_white = players.get('white', {}).get('user', {}).get('name', '').lower() == username.lower()
+        color = 'white' if is_white else 'black'
+        winner = game.get('winner')
+        result = 'win' if winner == color else 'draw' if winner is None else 'loss'
+        opponent_rating = players.get('black' if is_white else 'white', {}).get('rating')
+
+        color_index = COLORS.index(color)
+        node = 0
+        self._record(node, color_index, result, opponent_rating)
+        for san in moves:
+            node = self._child(node, san, create=True)
+            self._record(node, color_index, result, opponent_rating)
+        return True
+
+    def add_games(self, games, username):
+        """Insert many games; returns how many were new."""
+        return sum(self.add_game(game, username) for game in games)
+
+    def find(self, moves):
+        """Node for a move sequence, or None if it never occurred."""
+        node = 0
+        for san in parse_moves(moves):
+            node = self._child(node, san)
+            if node is None:
+                return None
+        return node
+
+    def moves_to(self, node):
+        """SAN sequence leading to ``node``."""
+        moves = []
+        while node > 0:
+            moves.append(self.move_names[self.node_move[node]])
+            node = self.parent[node]
+        return moves[::-1]
+
+    def node_stats(self, node, color=None):
+        """Games, W/D/L, score % and average opponent rating at a node, for one color or both."""
+        slots = [2 * node + COLORS.index(color)] if color else [2 * node, 2 * node + 1]
+        wins = sum(self.wins[i] for i in slots)
+        draws = sum(self.draws[i] for i in slots)
+        losses = sum(self.losses[i] for i in slots)
+        games = wins + draws + losses
+        rated = sum(self.opponent_count[i] for i in slots)
+        return {
+            'games': games,
+            'wins': wins,
+            'draws': draws,
+            'losses': losses,
+            'score': (wins + 0.5 * draws) / games * 100 if games else 0.0,
+            'avg_opponent_rating': sum(self.opponent_sum[i] for i in slots) / rated if rated else 0.0
+        }
+
+    def continuations(self, moves=(), color=None):
+        """Next moves after a prefix with their stats, most played first.
+
+        ``color`` limits the counts to games where the player had that color,
+        e.g. color='black' after '1.e4 c5 2.Nf3' answers "what do I play here
+        as Black and how do I score?".
+        """
+        node = self.find(moves)
+        if node is None:
+            return []
+        rows = []
+        child = self.first_child[node]
+        while child != -1:
+            stats = self.node_stats(child, color)
+            if stats['games']:
+                rows.append({'move': self.move_names[self.node_move[child]], **stats})
+            child = self.next_sibling[child]
+        return sorted(rows, key=lambda row: -row['games'])
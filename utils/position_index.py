@@ -0,0 +1,197 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import chess
+import chess.polyglot
+import numpy as np
+import pandas as pd
+
+DEFAULT_PLIES = 20
+PARALLEL_MIN_GAMES = 300  # Games before replaying them in a process pool pays off
+COLORS = ('white', 'black')
+START_HASH = np.uint64(chess.polyglot.zobrist_hash(chess.Board()))
+
+
+def _replay_hashes(move_strings, max_plies):
+    """Zobrist hash after each of the first ``max_plies`` moves of every game."""
+    hashes = []
+    for moves in move_strings:
+        board = chess.Board()
+        game_hashes = []
+        for san in moves.split()[:max_plies]:
+            try:
+                board.push_san(san)
+            except ValueError:
+                break
+            game_hashes.append(chess.polyglot.zobrist_hash(board))
+        hashes.append(np.array(game_hashes, dtype=np.uint64))
+    return hashes
+
+
+def _segments(*keys):
+    """Start of every run of equal rows in already-sorted key arrays."""
+    change = np.zeros(len(keys[0]), dtype=bool)
+    change[0] = True
+    for key in keys:
+        change[1:] |= key[1:] != key[:-1]
+    return np.flatnonzero(change)
+
+
+class PositionIndex:
+    """Transposition-aware statistics over the first plies of a player's games.
+
+    Positions are identified by their Polyglot Zobrist hash, so different move
+    orders reaching the same position share one entry. The table is a set of
+    parallel NumPy arrays sorted by (hash, player color): ``keys`` (uint64)
+    and ``colors`` identify a row; games/wins/draws/losses count the games
+    that reached it (once per game); ``first_ply`` is the earliest ply it was
+    seen at, and ``move_orders`` the number of distinct preceding positions
+    it was reached from. One example game and ply per row reproduce a line
+    leading there.
+    """
+
+    def __init__(self, games, username, max_plies=DEFAULT_PLIES, workers=None):
+        self.max_plies = max_plies
+        self.lines = []
+        colors, results = [], []
+        for game in games:
+            if game.get('variant', 'standard') != 'standard' or not game.get('moves'):
+                continue
+            players = game.get('players', {})
+            is_white = players.get('white', {}).get('user', {}).get('name', '').lower() == username.lower()
+            color = 'white' if is_white else 'black'
+            winner = game.get('winner')
+            self.lines.append(game['moves'])
+            colors.append(COLORS.index(color))
+            results.append(1.0 if winner == color else 0.5 if winner is None else 0.0)
+
+        hashes = self._replay(workers)
+        self._aggregate(hashes, np.array(colors, dtype=np.int8), np.array(results))
+
+    def _replay(self, workers):
+        lines = [' '.join(line.split()[:self.max_plies]) for line in self.lines]
+        if workers is None:
+            workers = (os.cpu_count() or 1) if len(lines) >= PARALLEL_MIN_GAMES else 1
+        workers = max(1, min(workers, len(lines)))
+        if workers == 1:
+            return _replay_hashes(lines, self.max_plies)
+
+        chunk = -(-len(lines) // workers)
+        chunks = [lines[i:i + chunk] for i in range(0, len(lines), chunk)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(_replay_hashes, chunks, [self.max_plies] * len(chunks))
+            return [h for part in results for h in part]
+
+    def _aggregate(self, hashes, colors, results):
+        lengths = np.array([len(h) for h in hashes], dtype=np.int64)
+        key = np.concatenate(hashes) if lengths.sum() else np.zeros(0, dtype=np.uint64)
+        game = np.repeat(np.arange(len(hashes)), lengths)
+        ply = np.arange(len(key)) - np.repeat(np.cumsum(lengths) - lengths, lengths) + 1
+        previous = np.empty_like(key)
+        previous[1:] = key[:-1]
+        previous[ply == 1] = START_HASH
+        color = colors[game]
+
+        if not len(key):
+            for name in ('keys', 'colors', 'games', 'wins', 'draws', 'losses',
+                         'first_ply', 'example_game', 'example_ply', 'move_orders'):
+                setattr(self, name, np.zeros(0, dtype=np.uint64 if name == 'keys' else np.int32))
+            return
+
+        # Count each position once per game (repetitions), at its first ply
+        order = np.lexsort((ply, game, key))
+        first = order[_segments(key[order], game[order])]
+
+        # Rows: (hash, color), most recent game (lowest index) first within each row
+        order = first[np.lexsort((game[first], color[first], key[first]))]
+        starts = _segments(key[order], color[order])
+        score = results[game[order]]
+
+        self.keys = key[order][starts]
+        self.colors = color[order][starts]
+        self.games = np.diff(np.append(starts, len(order))).astype(np.int32)
+        self.wins = np.add.reduceat(score == 1.0, starts).astype(np.int32)
+        self.draws = np.add.reduceat(score == 0.5, starts).astype(np.int32)
+        self.losses = self.games - self.wins - self.draws
+        self.first_ply = np.minimum.reduceat(ply[order], starts).astype(np.int16)
+        self.example_game = game[order][starts].astype(np.int32)
+        self.example_ply = ply[order][starts].astype(np.int16)
+
+        # Move orders: distinct positions each row was reached from
+        order = np.lexsort((previous, color, key))
+        arrivals = order[_segments(key[order], color[order], previous[order])]
+        rows = self._rows(key[arrivals], color[arrivals])
+        self.move_orders = np.bincount(rows, minlength=len(self.keys)).astype(np.int16)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _rows(self, keys, colors):
+        """Row index of each (hash, color) pair; pairs must be present."""
+        left = np.searchsorted(self.keys, keys, side='left')
+        return left + (colors != self.colors[np.minimum(left, len(self.keys) - 1)]).astype(np.int64)
+
+    def line(self, row):
+        """SAN moves of one game reaching the row's position."""
+        return self.lines[self.example_game[row]].split()[:self.example_ply[row]]
+
+    def fen(self, row):
+        board = chess.Board()
+        for san in self.line(row):
+            board.push_san(san)
+        return board.fen()
+
+    def lookup(self, board, color=None):
+        """Stats for a position reached by any move order ({} if never reached)."""
+        key = np.uint64(chess.polyglot.zobrist_hash(board))
+        left = np.searchsorted(self.keys, key, side='left')
+        right = np.searchsorted(self.keys, key, side='right')
+        rows = [r for r in range(left, right) if color is None or self.colors[r] == COLORS.index(color)]
+        if not rows:
+            return {}
+        games = int(self.games[rows].sum())
+        wins, draws = int(self.wins[rows].sum()), int(self.draws[rows].sum())
+        return {
+            'games': games,
+            'wins': wins,
+            'draws': draws,
+            'losses': games - wins - draws,
+            'score': (wins + 0.5 * draws) / games * 100,
+            'move_orders': int(self.move_orders[rows].max())
+        }
+
+    def table(self):
+        """Every (position, color) row as a DataFrame."""
+        return pd.DataFrame({
+            'hash': self.keys,
+            'color': np.array(COLORS)[self.colors],
+            'games': self.games,
+            'wins': self.wins,
+            'draws': self.draws,
+            'losses': self.losses,
+            'score': (self.wins + 0.5 * self.draws) / self.games * 100,
+            'first_ply': self.first_ply,
+            'move_orders': self.move_orders,
+            'player_to_move': (self.first_ply % 2 == 0) == (self.colors == 0)
+        })
+
+    def mishandled_positions(self, min_games=3, max_score=40.0, limit=20):
+        """Positions where it is the player's move and they score poorly, worst first.
+
+        Consecutive positions of a line that every game followed have identical
+        records; only the deepest of them is reported. Positions on different
+        lines are kept even when their records match.
+        """
+        table = self.table()
+        weak = table[table['player_to_move'] & (table['games'] >= min_games) & (table['score'] <= max_score)].copy()
+        weak['line'] = [' '.join(self.line(row)) for row in weak.index]
+        shallower = set()
+        for _, group in weak.groupby(['color', 'games', 'wins', 'draws']):
+            lines = group['line'].tolist()
+            for row, line in zip(group.index, lines):
+                if any(other.startswith(line + ' ') for other in lines):
+                    shallower.add(row)
+        weak = weak.drop(index=list(shallower))
+        weak = weak.sort_values(['score', 'games'], ascending=[True, False]).head(limit).copy()
+        weak['fen'] = [self.fen(row) for row in weak.index]
+        return weak.reset_index(drop=True)
@@ -0,0 +1,271 @@
+import math
+from operator import mul
+
+import numpy as np
+import pandas as pd
+
+from utils.rating_series import LAG_DAYS, ROLLING_WINDOWS, CHANGE_DAYS, EMA_SPANS, VOLATILITY_WINDOWS
+
+FUTURE_WINRATE = 0.5  # Assumed daily win rate for forecast days
+HISTORY_TAIL = max(CHANGE_DAYS + LAG_DAYS + ROLLING_WINDOWS + VOLATILITY_WINDOWS) + 1
+
+
+def _linear_weights(model, scaler, n_features):
+    """Fold the scaler into the model's coefficients so that pred = x @ w + b."""
+    coef = np.asarray(model.coef_, dtype=np.float64).ravel()
+    if coef.shape[0] != n_features:
+        return None
+    intercept = float(np.ravel(model.intercept_)[0])
+    if scaler is not None:
+        center = getattr(scaler, 'center_', getattr(scaler, 'mean_', None))
+        scale = getattr(scaler, 'scale_', None)
+        if scale is not None:
+            coef = coef / np.asarray(scale, dtype=np.float64)
+        if center is not None:
+            intercept -= float(np.asarray(center, dtype=np.float64) @ coef)
+    return coef.tolist(), intercept
+
+
+def _prefix(values, size):
+    """Preallocated prefix-sum buffer: out[i] = sum(values[:i])."""
+    out = [0.0] * (size + 1)
+    total = 0.0
+    for i, v in enumerate(values):
+        total += v
+        out[i + 1] = total
+    return out
+
+
+def forecast_ratings(model_package, features_df, days=30):
+    """Recursive day-by-day rating forecast.
+
+    Starts from the last row of ``features_df`` (output of ``create_features``)
+    and feeds each prediction back in as the next day's rating, assuming a 50%
+    win rate and unchanged activity. History and forecast share preallocated
+    buffers with prefix sums, so rolling means/stds, trends, EMAs and
+    volatility cost O(1) per day; linear models are a single dot product with
+    the scaler folded into the weights.
+    """
+    model = model_package['model']
+    scaler = model_package.get('scaler')
+    feature_cols = list(model_package['feature_columns'])
+    col_index = {name: i for i, name in enumerate(feature_cols)}
+
+    last_row = features_df.iloc[-1]
+    x = last_row.reindex(feature_cols).fillna(0).astype(float).tolist()
+    linear = _linear_weights(model, scaler, len(feature_cols)) if hasattr(model, 'coef_') else None
+
+    # Buffers hold the last HISTORY_TAIL days followed by the forecast days.
+    # Ratings are stored relative to the last known rating so sums of squares
+    # stay accurate.
+    history_len = len(features_df)
+    tail = min(history_len, HISTORY_TAIL)
+    size = tail + days
+    anchor = float(features_df['rating'].iloc[-1])
+    ratings = [0.0] * size
+    ratings[:tail] = (features_df['rating'].to_numpy(dtype=np.float64)[-tail:] - anchor).tolist()
+    winrates = features_df['daily_winrate'].to_numpy(dtype=np.float64)[-tail:].tolist()
+    games = features_df['daily_games'].to_numpy(dtype=np.float64)[-tail:].tolist()
+    future_games = float(last_row['daily_games'])
+
+    diffs = [0.0] + [ratings[i] - ratings[i - 1] for i in range(1, tail)]
+    rating_sum = _prefix(ratings[:tail], size)
+    rating_sq = _prefix([r * r for r in ratings[:tail]], size)
+    winrate_sum = _prefix(winrates, size)
+    games_sum = _prefix(games, size)
+    diff_sum = _prefix(diffs, size)
+    diff_sq = _prefix([d * d for d in diffs], size)
+
+    emas = [float(last_row[f'rating_ema_{span}']) for span in EMA_SPANS]
+    alphas = [2 / (span + 1) for span in EMA_SPANS]
+
+    def position(name):
+        return col_index.get(name)
+
+    lag_pos = [(lag, position(f'rating_lag_{lag}')) for lag in LAG_DAYS]
+    window_pos = [
+        (w, position(f'rating_ma_{w}'), position(f'rating_std_{w}'), position(f'rating_min_{w}'),
+         position(f'rating_max_{w}'), position(f'winrate_ma_{w}'), position(f'games_ma_{w}'))
+        for w in ROLLING_WINDOWS
+    ]
+    change_pos = [(d, position(f'rating_change_{d}d')) for d in CHANGE_DAYS]
+    ema_pos = [position(f'rating_ema_{span}') for span in EMA_SPANS]
+    vol_pos = [(w, position(f'rating_volatility_{w}')) for w in VOLATILITY_WINDOWS]
+    change_1d_pos = position('rating_change_1d')
+    rating_pos = position('rating')
+
+    predictions = [0.0] * days
+    for day in range(days):
+        if linear is not None:
+            pred = sum(map(mul, x, linear[0])) + linear[1]
+        else:
+            X_input = np.array(x).reshape(1, -1)
+            if scaler is not None:
+                X_input = scaler.transform(X_input)
+            pred = float(model.predict(X_input)[0])
+        predictions[day] = pred
+
+        # Append the new day to every buffer
+        n = tail + day
+        value = pred - anchor
+        diff = value - ratings[n - 1] if n else 0.0
+        ratings[n] = value
+        rating_sum[n + 1] = rating_sum[n] + value
+        rating_sq[n + 1] = rating_sq[n] + value * value
+        winrate_sum[n + 1] = winrate_sum[n] + FUTURE_WINRATE
+        games_sum[n + 1] = games_sum[n] + future_games
+        diff_sum[n + 1] = diff_sum[n] + diff
+        diff_sq[n + 1] = diff_sq[n] + diff * diff
+        total_len = history_len + day + 1
+
+        # Lags fall back to the prediction itself while the history is short
+        for lag, pos in lag_pos:
+            if pos is not None:
+                x[pos] = ratings[n - lag] + anchor if lag < total_len else pred
+
+        # Rolling statistics over the last w days (fewer while history is short)
+        for w, ma_pos, std_pos, min_pos, max_pos, wr_pos, games_pos in window_pos:
+            start = max(n + 1 - w, 0)
+            count = n + 1 - start
+            mean = (rating_sum[n + 1] - rating_sum[start]) / count
+            if ma_pos is not None:
+                x[ma_pos] = mean + anchor
+            if std_pos is not None:
+                variance = (rating_sq[n + 1] - rating_sq[start]) / count - mean * mean
+                x[std_pos] = math.sqrt(variance) if count > 1 and variance > 0 else 0.0
+            if min_pos is not None:
+                x[min_pos] = min(ratings[start:n + 1]) + anchor
+            if max_pos is not None:
+                x[max_pos] = max(ratings[start:n + 1]) + anchor
+            if wr_pos is not None:
+                x[wr_pos] = (winrate_sum[n + 1] - winrate_sum[start]) / count
+            if games_pos is not None:
+                x[games_pos] = (games_sum[n + 1] - games_sum[start]) / count
+
+        # Trends
+        if change_1d_pos is not None:
+            x[change_1d_pos] = diff if total_len > 1 else 0.0
+        for d, pos in change_pos:
+            if pos is not None:
+                x[pos] = value - ratings[n - d] if d < total_len else 0.0
+
+        # EMA
+        for i, pos in enumerate(ema_pos):
+            emas[i] = alphas[i] * pred + (1 - alphas[i]) * emas[i]
+            if pos is not None:
+                x[pos] = emas[i]
+
+        # Volatility: std of the last w daily changes, once w changes exist
+        for w, pos in vol_pos:
+            if pos is not None and w < total_len:
+                mean = (diff_sum[n + 1] - diff_sum[n + 1 - w]) / w
+                variance = (diff_sq[n + 1] - diff_sq[n + 1 - w]) / w - mean * mean
+                x[pos] = math.sqrt(variance) if variance > 0 else 0.0
+
+        if rating_pos is not None:
+            x[rating_pos] = pred
+
+    return predictions
+
+
+def forecast_ratings_batch(model_package, features_df, days=30):
+    """Recursive forecasts for many users at once.
+
+    ``features_df`` holds every user's daily feature rows (``username`` and
+    ``date`` columns, e.g. from ``create_grouped_features``). All users advance
+    together: their feature rows form one (users x features) matrix, so each
+    forecast day is a single ``scaler.transform``/``model.predict`` call, and
+    the feature updates are array operations over right-aligned history
+    buffers (NaN where a user's history is shorter).
+
+    Returns (usernames, predictions) with predictions shaped (users, days);
+    each row matches ``forecast_ratings`` for that user.
+    """
+    model = model_package['model']
+    scaler = model_package.get('scaler')
+    feature_cols = list(model_package['feature_columns'])
+    col_index = {name: i for i, name in enumerate(feature_cols)}
+
+    frame = features_df.sort_values(['username', 'date'], kind='stable')
+    codes, usernames = pd.factorize(frame['username'], sort=False)
+    history_len = np.bincount(codes)
+    ends = np.cumsum(history_len)
+    n_users = len(usernames)
+
+    last_rows = frame.iloc[ends - 1]
+    X = last_rows.reindex(columns=feature_cols).fillna(0).to_numpy(dtype=np.float64)
+
+    # Right-aligned buffers: column tail - 1 is every user's last known day
+    tail = HISTORY_TAIL
+    size = tail + days
+    column = np.arange(len(frame)) - np.repeat(ends, history_len) + tail
+    keep = column >= 0
+
+    def buffer(values, future=np.nan):
+        out = np.full((n_users, size), np.nan)
+        out[codes[keep], column[keep]] = values[keep]
+        out[:, tail:] = future
+        return out
+
+    anchor = last_rows['rating'].to_numpy(dtype=np.float64)
+    ratings = buffer(frame['rating'].to_numpy(dtype=np.float64)) - anchor[:, None]
+    winrates = buffer(frame['daily_winrate'].to_numpy(dtype=np.float64), FUTURE_WINRATE)
+    games = buffer(frame['daily_games'].to_numpy(dtype=np.float64))
+    games[:, tail:] = last_rows['daily_games'].to_numpy(dtype=np.float64)[:, None]
+    diffs = np.full((n_users, size), np.nan)
+    diffs[:, 1:tail] = np.diff(ratings[:, :tail], axis=1)
+
+    emas = last_rows[[f'rating_ema_{span}' for span in EMA_SPANS]].to_numpy(dtype=np.float64)
+    alphas = 2 / (np.array(EMA_SPANS) + 1)
+
+    def set_column(name, values):
+        if name in col_index:
+            X[:, col_index[name]] = values
+
+    predictions = np.empty((n_users, days))
+    for day in range(days):
+        X_input = scaler.transform(X) if scaler is not None else X
+        pred = np.asarray(model.predict(X_input), dtype=np.float64)
+        predictions[:, day] = pred
+
+        n = tail + day
+        ratings[:, n] = pred - anchor
+        diffs[:, n] = ratings[:, n] - ratings[:, n - 1]
+        total_len = history_len + day + 1
+
+        # Lags fall back to the prediction itself while the history is short
+        for lag in LAG_DAYS:
+            lagged = ratings[:, n - lag] + anchor
+            set_column(f'rating_lag_{lag}', np.where(np.isnan(lagged), pred, lagged))
+
+        # Rolling statistics over the last w days (fewer while history is short)
+        for w in ROLLING_WINDOWS:
+            recent = ratings[:, n + 1 - w:n + 1]
+            set_column(f'rating_ma_{w}', np.nanmean(recent, axis=1) + anchor)
+            set_column(f'rating_std_{w}', np.nanstd(recent, axis=1))
+            set_column(f'rating_min_{w}', np.nanmin(recent, axis=1) + anchor)
+            set_column(f'rating_max_{w}', np.nanmax(recent, axis=1) + anchor)
+            set_column(f'winrate_ma_{w}', np.nanmean(winrates[:, n + 1 - w:n + 1], axis=1))
+            set_column(f'games_ma_{w}', np.nanmean(games[:, n + 1 - w:n + 1], axis=1))
+
+        # Trends
+        set_column('rating_change_1d', np.nan_to_num(diffs[:, n]))
+        for d in CHANGE_DAYS:
+            set_column(f'rating_change_{d}d', np.nan_to_num(ratings[:, n] - ratings[:, n - d]))
+
+        # EMA
+        emas = alphas * pred[:, None] + (1 - alphas) * emas
+        for i, span in enumerate(EMA_SPANS):
+            set_column(f'rating_ema_{span}', emas[:, i])
+
+        # Volatility: std of the last w daily changes, once w changes exist
+        for w in VOLATILITY_WINDOWS:
+            name = f'rating_volatility_{w}'
+            if name in col_index:
+                ready = total_len > w
+                volatility = np.std(diffs[ready, n + 1 - w:n + 1], axis=1)
+                X[ready, col_index[name]] = volatility
+
+        set_column('rating', pred)
+
+    return list(usernames), predictions
@@ -0,0 +1,206 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+LAG_DAYS = [1, 2, 3, 5, 7]
+ROLLING_WINDOWS = [3, 7, 14, 30]
+CHANGE_DAYS = [7, 14, 30]
+EMA_SPANS = [7, 14, 30]
+VOLATILITY_WINDOWS = [7, 14]
+
+
+def games_to_rating_df(games_by_user):
+    """Per-game rating rows for every user, as consumed by ``build_daily_rating_series``.
+
+    ``games_by_user`` maps username -> Lichess game dicts (API ndjson or the
+    bucket archives). Mirrors the per-game parsing on the Rating Prediction page.
+    """
+    rows = []
+    for username, games in games_by_user.items():
+        user = username.lower()
+        for game in games:
+            players = game.get('players', {})
+            white_info = players.get('white', {})
+            black_info = players.get('black', {})
+            is_white = white_info.get('user', {}).get('name', '').lower() == user
+
+            player_info = white_info if is_white else black_info
+            opponent_info = black_info if is_white else white_info
+            player_rating = player_info.get('rating')
+            opponent_rating = opponent_info.get('rating')
+            created_at = game.get('createdAt', 0)
+            if not player_rating or not opponent_rating or not created_at:
+                continue
+
+            winner = game.get('winner')
+            player_color = 'white' if is_white else 'black'
+            outcome = 1.0 if winner == player_color else (0.5 if winner is None else 0.0)
+
+            # Time trouble: the player's clock dropped under 30 seconds
+            player_clocks = game.get('clocks', [])[0 if is_white else 1::2]
+            time_trouble = 1 if player_clocks and min(player_clocks) / 100 < 30 else 0
+
+            moves_str = game.get('moves', '')
+            rows.append({
+                'username': user,
+                'date': datetime.fromtimestamp(created_at / 1000),
+                'player_rating': player_rating,
+                'opponent_rating': opponent_rating,
+                'rating_diff': opponent_rating - player_rating,
+                'outcome': outcome,
+                'time_trouble': time_trouble,
+                'num_moves': len(moves_str.split()) // 2 if moves_str else 0
+            })
+
+    df = pd.DataFrame(rows, columns=['username', 'date', 'player_rating', 'opponent_rating',
+                                     'rating_diff', 'outcome', 'time_trouble', 'num_moves'])
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def build_daily_rating_series(df, min_games=50, min_days=30):
+    """Aggregate per-game rows into daily rating series for every user at once.
+
+    Expects the per-game frame produced by ``parse_games_to_rating_df``. Users
+    with fewer than ``min_games`` games or ``min_days`` active days are dropped.
+    The result is sorted by (username, date) with a clean RangeIndex.
+    """
+    game_counts = df['username'].value_counts()
+    eligible = game_counts.index[game_counts >= min_games]
+    games = df[df['username'].isin(eligible)]
+    games = games.sort_values(['username', 'date'], kind='stable')
+
+    daily = games.groupby(['username', games['date'].dt.normalize()], sort=True).agg(
+        rating=('player_rating', 'last'),
+        daily_wins=('outcome', 'sum'),
+        daily_games=('outcome', 'count'),
+        daily_winrate=('outcome', 'mean'),
+        avg_opponent_rating=('opponent_rating', 'mean'),
+        avg_rating_diff=('rating_diff', 'mean'),
+        time_trouble_rate=('time_trouble', 'mean'),
+        avg_moves=('num_moves', 'mean')
+    ).reset_index()
+
+    if min_days:
+        days_per_user = daily.groupby('username')['date'].transform('size')
+        daily = daily[days_per_user >= min_days]
+
+    return daily.reset_index(drop=True)
+
+
+def _rolling(series, users, window, stat):
+    """Per-user rolling statistic aligned back to the original index."""
+    rolled = getattr(series.groupby(users).rolling(window, min_periods=1), stat)()
+    return rolled.reset_index(level=0, drop=True)
+
+
+def create_grouped_features(daily, lookback_windows=ROLLING_WINDOWS):
+    """Create the rating-model features for every user's daily series in one pass.
+
+    Produces the same columns, in the same order, as running
+    ``create_features_for_prediction`` on each user's frame separately, but
+    every shift/rolling/EMA is evaluated per user through a single groupby.
+    """
+    df = daily.sort_values(['username', 'date'], kind='stable').reset_index(drop=True)
+    users = df['username']
+    by_user = df.groupby('username', sort=False)
+
+    # Lag features
+    for lag in LAG_DAYS:
+        df[f'rating_lag_{lag}'] = by_user['rating'].shift(lag)
+
+    # Rolling statistics (shifted so the current day never leaks in)
+    prev_rating = by_user['rating'].shift(1)
+    prev_winrate = by_user['daily_winrate'].shift(1)
+    prev_games = by_user['daily_games'].shift(1)
+    for window in lookback_windows:
+        df[f'rating_ma_{window}'] = _rolling(prev_rating, users, window, 'mean')
+        df[f'rating_std_{window}'] = _rolling(prev_rating, users, window, 'std')
+        df[f'rating_min_{window}'] = _rolling(prev_rating, users, window, 'min')
+        df[f'rating_max_{window}'] = _rolling(prev_rating, users, window, 'max')
+        df[f'winrate_ma_{window}'] = _rolling(prev_winrate, users, window, 'mean')
+        df[f'games_ma_{window}'] = _rolling(prev_games, users, window, 'mean')
+
+    # Trend features
+    df['rating_change_1d'] = by_user['rating'].diff().groupby(users).shift(1)
+    for days in CHANGE_DAYS:
+        change = df['rating'] - by_user['rating'].shift(days)
+        df[f'rating_change_{days}d'] = change.groupby(users).shift(1)
+
+    # EMA
+    for span in EMA_SPANS:
+        ema = prev_rating.groupby(users).ewm(span=span, adjust=False).mean()
+        df[f'rating_ema_{span}'] = ema.reset_index(level=0, drop=True)
+
+    # Volatility
+    prev_change = df['rating_change_1d'].groupby(users).shift(1)
+    for window in VOLATILITY_WINDOWS:
+        df[f'rating_volatility_{window}'] = _rolling(prev_change, users, window, 'std')
+
+    # Streaks: consecutive winning days, reset at every user boundary
+    winning = (df['daily_winrate'] > 0.5).astype(int)
+    run_id = ((winning != winning.shift()) | (users != users.shift())).cumsum()
+    df['win_streak'] = winning.groupby(run_id).cumsum().groupby(users).shift(1)
+
+    # Time features
+    df['day_of_week'] = df['date'].dt.dayofweek
+    df['month'] = df['date'].dt.month
+    df['is_weekend'] = (df['day_of_week'] >= 5).astype(int)
+
+    # Fill NaN within each user's history only
+    value_cols = df.columns.difference(['username', 'date'], sort=False)
+    filled = df[value_cols].groupby(users).bfill()
+    df[value_cols] = filled.groupby(users).ffill()
+
+    return df
+
+
+def build_training_frame(df, min_games=50, min_days=30):
+    """Daily series plus features for every eligible user, ready for training."""
+    daily = build_daily_rating_series(df, min_games=min_games, min_days=min_days)
+    if daily.empty:
+        return daily
+    return create_grouped_features(daily)
+
+
+def rating_history_to_daily(history, perf_type):
+    """Daily ratings for one perf from the /api/user/{name}/rating-history payload.
+
+    The endpoint returns one compact [year, month (0-based), day, rating]
+    point per day the rating changed, for the player's whole career.
+    """
+    perf_name = perf_type.lower()
+    points = next((item.get('points') for item in history or []
+                   if isinstance(item, dict) and str(item.get('name', '')).lower() == perf_name), None)
+    if not points:
+        return pd.DataFrame(columns=['date', 'rating'])
+
+    points = np.asarray(points, dtype=np.int64)
+    dates = pd.to_datetime(pd.DataFrame({'year': points[:, 0], 'month': points[:, 1] + 1, 'day': points[:, 2]}),
+                           errors='coerce')
+    daily = pd.DataFrame({'date': dates, 'rating': points[:, 3].astype(np.float64)}).dropna(subset=['date'])
+    return daily.drop_duplicates('date', keep='last').sort_values('date').reset_index(drop=True)
+
+
+def merge_rating_history(history_daily, games_daily):
+    """Long-range daily series: ratings from the rating history, activity from recent games.
+
+    ``games_daily`` holds one user's game-derived daily rows (``rating`` plus
+    the activity/outcome columns). Ratings come from the history wherever it
+    has a point, else from the games. Days known only from the history get the
+    average of the game days for the activity columns, and ``has_games`` marks
+    which rows have real activity data.
+    """
+    if games_daily is None or games_daily.empty:
+        return None
+    if history_daily is None or history_daily.empty:
+        return games_daily.assign(has_games=True)
+
+    merged = history_daily.merge(games_daily, on='date', how='outer', suffixes=('', '_games'), indicator=True)
+    merged['rating'] = merged['rating'].fillna(merged.pop('rating_games'))
+    merged['has_games'] = merged.pop('_merge') != 'left_only'
+
+    activity_cols = games_daily.columns.difference(['date', 'rating'], sort=False)
+    merged[activity_cols] = merged[activity_cols].fillna(games_daily[activity_cols].mean())
+    return merged.sort_values('date').reset_index(drop=True)
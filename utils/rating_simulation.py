@@ -0,0 +1,74 @@
+import math
+
+import numpy as np
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+DEFAULT_PATHS = 5000
+
+# Glicko parameters (rating deviation in rating points)
+GLICKO_Q = math.log(10) / 400
+DEFAULT_RD = 50
+OPPONENT_RD = 50
+RD_MIN = 45
+RD_MAX = 350
+RD_INFLATION = 10  # Per day; an active player settles near RD_MIN (~6 points per game)
+
+
+def _glicko_g(rd):
+    return 1 / np.sqrt(1 + 3 * (GLICKO_Q * rd) ** 2 / math.pi ** 2)
+
+
+def simulate_rating_paths(daily_df, days=30, n_paths=DEFAULT_PATHS, rating_deviation=DEFAULT_RD,
+                          seed=None, quantiles=QUANTILES):
+    """
+    Monte Carlo rating paths for the next ``days`` days.
+
+    Each simulated day the player is active with the observed share of active
+    days; active days bootstrap a historical day for the number of games and
+    the average opponent rating offset. Results are drawn from the ELO
+    expectation against that offset and the rating moves by a Glicko-1 update
+    for the day's games. Games and results are sampled for all paths x days in
+    bulk; only the deterministic RD recursion steps through the days.
+
+    Returns {'quantiles': {q: array(days)}, 'mean': array(days), 'paths': n_paths}.
+    """
+    rng = np.random.default_rng(seed)
+
+    dates = daily_df['date']
+    span_days = max((dates.max() - dates.min()).days + 1, 1)
+    active_share = min(len(daily_df) / span_days, 1.0)
+
+    daily_games = daily_df['daily_games'].to_numpy(dtype=np.int64)
+    rating_diffs = daily_df['avg_rating_diff'].to_numpy(dtype=np.float64)
+
+    # Activity and opponents: a bootstrapped historical day per simulated day
+    active = rng.random((n_paths, days)) < active_share
+    sampled_day = rng.integers(0, len(daily_df), size=(n_paths, days))
+    games = np.where(active, daily_games[sampled_day], 0)
+    opponent_offset = rating_diffs[sampled_day]
+
+    # Results depend only on the offset, so they can be drawn up front
+    expected = 1 / (1 + 10 ** (opponent_offset / 400))
+    wins = rng.binomial(games, expected)
+
+    # Glicko-1: variance of the day's results against opponents of RD OPPONENT_RD
+    g = _glicko_g(OPPONENT_RD)
+    info = GLICKO_Q ** 2 * g ** 2 * games * expected * (1 - expected)  # 1 / d^2
+    surprise = g * (wins - games * expected)
+
+    deltas = np.empty((n_paths, days))
+    rd = np.full(n_paths, float(rating_deviation))
+    for day in range(days):
+        rd = np.minimum(np.sqrt(rd ** 2 + RD_INFLATION ** 2), RD_MAX)
+        precision = 1 / rd ** 2 + info[:, day]
+        deltas[:, day] = GLICKO_Q / precision * surprise[:, day]
+        rd = np.maximum(np.sqrt(1 / precision), RD_MIN)
+
+    paths = float(daily_df['rating'].iloc[-1]) + np.cumsum(deltas, axis=1)
+    levels = np.quantile(paths, quantiles, axis=0)
+
+    return {
+        'quantiles': dict(zip(quantiles, levels)),
+        'mean': paths.mean(axis=0),
+        'paths': n_paths
+    }
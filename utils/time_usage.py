@@ -0,0 +1,338 @@
+import numpy as np
+import pandas as pd
+
+MEDIAN_BIN_WIDTH = 0.1  # Seconds; approximate medians are exact to within one bin
+MEDIAN_MAX_TIME = 300  # Longer thinks share the last bin
+N_MEDIAN_BINS = int(MEDIAN_MAX_TIME / MEDIAN_BIN_WIDTH) + 1
+
+TIME_TROUBLE = 30  # Seconds left on the clock
+CRITICAL_TIME = 10
+OPENING_MOVES = 10  # Phase boundaries, in the player's moves
+MIDDLEGAME_MOVES = 30
+
+RESULTS = ('win', 'draw', 'loss')
+RESULT_METRICS = ('avg_time_per_move', 'opening_avg', 'middlegame_avg', 'endgame_avg', 'max_think', 'final_time')
+MAX_TRACKED_MOVES = 150  # Per-move statistics cover the first 150 moves
+FLUSH_MOVES = 50_000  # Buffered move times before folding them into the totals
+RECENT_GAMES = 200  # Games whose clock and move-time histories are kept
+
+
+class RaggedArray:
+    """Variable-length per-game sequences stored as one flat array.
+
+    ``values`` holds every game's entries back to back (float32) and
+    ``offsets`` marks where each game starts, so game ``i`` is
+    ``values[offsets[i]:offsets[i + 1]]``. Replaces DataFrame columns holding
+    one Python list per row: a few bytes per entry instead of a boxed float,
+    and per-move statistics become array operations over ``values``.
+    """
+
+    def __init__(self, values, offsets):
+        self.values = np.asarray(values, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def from_lists(cls, sequences):
+        lengths = np.fromiter((len(s) for s in sequences), dtype=np.int64, count=len(sequences))
+        offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        values = np.fromiter((v for s in sequences for v in s), dtype=np.float32, count=offsets[-1])
+        return cls(values, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        """Game ``i``'s entries (a view, no copy)."""
+        if i < 0:
+            i += len(self)
+        return self.values[self.offsets[i]:self.offsets[i + 1]]
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.offsets.nbytes
+
+    def game_ids(self):
+        """Game index of every entry in ``values``."""
+        return np.repeat(np.arange(len(self)), self.lengths)
+
+    def positions(self):
+        """Index of every entry within its own game (0, 1, 2, ... per game)."""
+        return np.arange(len(self.values)) - np.repeat(self.offsets[:-1], self.lengths)
+
+
+def _move_moments(positions, values, size):
+    """Per-position count, sum, sum of squares and MEDIAN_BIN_WIDTH histogram."""
+    values = values.astype(np.float64)
+    count = np.bincount(positions, minlength=size)
+    total = np.bincount(positions, weights=values, minlength=size)
+    squares = np.bincount(positions, weights=values * values, minlength=size)
+    time_bin = np.clip((values / MEDIAN_BIN_WIDTH).astype(np.int64), 0, N_MEDIAN_BINS - 1)
+    hist = np.bincount(positions * N_MEDIAN_BINS + time_bin,
+                       minlength=size * N_MEDIAN_BINS).reshape(size, N_MEDIAN_BINS)
+    return count, total, squares, hist
+
+
+def _summarize_moments(count, total, squares, hist):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        std = np.sqrt(np.maximum(squares / count - mean * mean, 0.0))
+
+    # Median: interpolate inside the bin where the cumulative count crosses half
+    cumulative = np.cumsum(hist, axis=1)
+    half = count / 2
+    median_bin = np.argmax(cumulative >= half[:, None], axis=1)
+    rows = np.arange(len(count))
+    below = cumulative[rows, median_bin] - hist[rows, median_bin]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = np.clip((half - below) / hist[rows, median_bin], 0.0, 1.0)
+    median = np.where(count > 0, (median_bin + fraction) * MEDIAN_BIN_WIDTH, np.nan)
+
+    return {'position': rows, 'count': count, 'mean': mean, 'std': std, 'median': median}
+
+
+def move_time_histogram(ragged, move_bin=5, time_bin=5, max_position=50, time_cap=30):
+    """2D counts over (move index bin, time bin) in one ``np.bincount``.
+
+    Times at or above ``time_cap`` land in the last time bin. Returns
+    (counts, move_edges, time_edges) with empty leading/trailing bins kept so
+    the axes stay regular.
+    """
+    positions = ragged.positions()
+    keep = positions < max_position
+    positions, values = positions[keep], ragged.values[keep]
+
+    n_move = -(-max_position // move_bin)
+    n_time = time_cap // time_bin + 1
+    move_index = positions // move_bin
+    time_index = np.minimum(values // time_bin, n_time - 1).astype(np.int64)
+    counts = np.bincount(move_index * n_time + time_index, minlength=n_move * n_time).reshape(n_move, n_time)
+    return counts, np.arange(n_move) * move_bin, np.arange(n_time) * time_bin
+
+
+def parse_game_clocks(game, username):
+    """Per-game time stats, player clock history and time per move for one game.
+
+    Returns (game_data, player_clocks, time_per_move), or None when the game
+    has too little clock data.
+    """
+    clocks = game.get('clocks') or []
+    if len(clocks) < 4:
+        return None
+
+    players = game.get('players', {})
+    is_white = players.get('white', {}).get('user', {}).get('name', '').lower() == username.lower()
+    color = 'white' if is_white else 'black'
+
+    # Player's clock times in seconds
+    player_clocks = [clock / 100 for clock in clocks[0 if is_white else 1::2]]
+    if len(player_clocks) < 2:
+        return None
+
+    # Time per move, ignoring increment additions
+    time_per_move = [spent for spent in (a - b for a, b in zip(player_clocks, player_clocks[1:])) if spent >= 0]
+    if not time_per_move:
+        return None
+
+    total_moves = len(time_per_move)
+    initial_time = player_clocks[0]
+    final_time = player_clocks[-1]
+
+    # Phase breakdown
+    opening_end = min(OPENING_MOVES, total_moves)
+    middlegame_end = min(MIDDLEGAME_MOVES, total_moves)
+    opening_time = time_per_move[:opening_end]
+    middlegame_time = time_per_move[opening_end:middlegame_end]
+    endgame_time = time_per_move[middlegame_end:]
+
+    winner = game.get('winner')
+    result = 'win' if winner == color else 'draw' if winner is None else 'loss'
+
+    min_clock = min(player_clocks)
+    max_think = max(time_per_move)
+    max_think_move = time_per_move.index(max_think) + 1 if max_think > 0 else 0
+
+    game_data = {
+        'game_id': game.get('id'),
+        'date': pd.to_datetime(game.get('createdAt', 0) / 1000, unit='s'),
+        'speed': game.get('speed'),
+        'color': color,
+        'result': result,
+        'total_moves': total_moves,
+        'initial_time': initial_time,
+        'final_time': final_time,
+        'time_used': initial_time - final_time,
+        'avg_time_per_move': np.mean(time_per_move),
+        'median_time_per_move': np.median(time_per_move),
+        'max_think': max_think,
+        'max_think_move': max_think_move,
+        'opening_avg': np.mean(opening_time) if opening_time else 0,
+        'middlegame_avg': np.mean(middlegame_time) if middlegame_time else 0,
+        'endgame_avg': np.mean(endgame_time) if endgame_time else 0,
+        'time_trouble': min_clock < TIME_TROUBLE,
+        'critical_time': min_clock < CRITICAL_TIME,
+        'min_clock': min_clock
+    }
+    return game_data, player_clocks, time_per_move
+
+
+class TimeStatsAccumulator:
+    """Time-management statistics over any number of games in constant memory.
+
+    Games are added one at a time (e.g. straight from the API stream). Totals
+    are kept as fixed-size arrays: game counts per (result, time trouble),
+    sums of the per-game metrics per result, per-move-index moments and
+    median histograms for the first MAX_TRACKED_MOVES moves, and the heatmap
+    counts. Move times are buffered and folded in with ``np.bincount`` every
+    FLUSH_MOVES entries. Every game keeps its small per-game summary row;
+    only the most recent ``keep_games`` keep their clock and move-time
+    histories. Accumulators over disjoint game sets combine with ``merge``.
+    """
+
+    def __init__(self, keep_games=RECENT_GAMES):
+        self.keep_games = keep_games
+        self.trouble_counts = np.zeros((len(RESULTS), 2), dtype=np.int64)  # [result, time trouble]
+        self.critical_counts = np.zeros(len(RESULTS), dtype=np.int64)
+        self.metric_sums = np.zeros((len(RESULTS), len(RESULT_METRICS)))
+        self.move_count = np.zeros(MAX_TRACKED_MOVES, dtype=np.int64)
+        self.move_total = np.zeros(MAX_TRACKED_MOVES)
+        self.move_squares = np.zeros(MAX_TRACKED_MOVES)
+        self.move_hist = np.zeros((MAX_TRACKED_MOVES, N_MEDIAN_BINS), dtype=np.int64)
+        self.heatmap = None
+        self.heatmap_edges = None
+        self.rows = []
+        self.recent_clocks = []
+        self.recent_moves = []
+        self._pending = []
+        self._pending_size = 0
+
+    @property
+    def total_games(self):
+        return int(self.trouble_counts.sum())
+
+    def add_game(self, game, username):
+        """Add one Lichess game dict; returns False when it has no usable clocks."""
+        parsed = parse_game_clocks(game, username)
+        if parsed is None:
+            return False
+        game_data, player_clocks, time_per_move = parsed
+
+        result = RESULTS.index(game_data['result'])
+        self.trouble_counts[result, int(game_data['time_trouble'])] += 1
+        self.critical_counts[result] += game_data['critical_time']
+        self.metric_sums[result] += [game_data[m] for m in RESULT_METRICS]
+
+        self.rows.append(game_data)
+        if len(self.recent_clocks) < self.keep_games:
+            self.recent_clocks.append(player_clocks)
+            self.recent_moves.append(time_per_move)
+
+        self._pending.append(time_per_move[:MAX_TRACKED_MOVES])
+        self._pending_size += len(self._pending[-1])
+        if self._pending_size >= FLUSH_MOVES:
+            self._flush()
+        return True
+
+    def _flush(self):
+        if not self._pending:
+            return
+        chunk = RaggedArray.from_lists(self._pending)
+        self._pending, self._pending_size = [], 0
+
+        count, total, squares, hist = _move_moments(chunk.positions(), chunk.values, MAX_TRACKED_MOVES)
+        self.move_count += count
+        self.move_total += total
+        self.move_squares += squares
+        self.move_hist += hist
+
+        counts, move_edges, time_edges = move_time_histogram(chunk)
+        self.heatmap = counts if self.heatmap is None else self.heatmap + counts
+        self.heatmap_edges = (move_edges, time_edges)
+
+    def merge(self, other):
+        """Fold in another accumulator built from different games (this one is treated as newer)."""
+        self._flush()
+        other._flush()
+        self.trouble_counts += other.trouble_counts
+        self.critical_counts += other.critical_counts
+        self.metric_sums += other.metric_sums
+        self.move_count += other.move_count
+        self.move_total += other.move_total
+        self.move_squares += other.move_squares
+        self.move_hist += other.move_hist
+        if other.heatmap is not None:
+            self.heatmap = other.heatmap.copy() if self.heatmap is None else self.heatmap + other.heatmap
+            self.heatmap_edges = other.heatmap_edges
+        self.rows += other.rows
+        room = self.keep_games - len(self.recent_clocks)
+        self.recent_clocks += other.recent_clocks[:room]
+        self.recent_moves += other.recent_moves[:room]
+        return self
+
+    def stats(self):
+        """Overall statistics, same keys as the Time Management page's summary."""
+        self._flush()
+        total = self.total_games
+        if not total:
+            return None
+
+        win, loss = RESULTS.index('win'), RESULTS.index('loss')
+        trouble = self.trouble_counts
+        metric = dict(zip(RESULT_METRICS, self.metric_sums.sum(axis=0) / total))
+
+        def rate(part, whole):
+            return part / whole * 100 if whole else np.nan
+
+        return {
+            'total_games': total,
+            'time_trouble_rate': rate(trouble[:, 1].sum(), total),
+            'critical_time_rate': rate(self.critical_counts.sum(), total),
+            'avg_time_per_move': metric['avg_time_per_move'],
+            'avg_final_clock': metric['final_time'],
+            'avg_max_think': metric['max_think'],
+
+            # By result
+            'win_time_trouble': rate(trouble[win, 1], trouble[win].sum()),
+            'loss_time_trouble': rate(trouble[loss, 1], trouble[loss].sum()),
+
+            # Win rates
+            'wr_no_trouble': rate(trouble[win, 0], trouble[:, 0].sum()) if trouble[:, 0].sum() else 0,
+            'wr_with_trouble': rate(trouble[win, 1], trouble[:, 1].sum()) if trouble[:, 1].sum() else 0,
+
+            # Phase averages
+            'opening_avg': metric['opening_avg'],
+            'middlegame_avg': metric['middlegame_avg'],
+            'endgame_avg': metric['endgame_avg']
+        }
+
+    def result_means(self):
+        """{result: {metric: mean}} and {result: games} for the win/loss comparison."""
+        self._flush()
+        games = self.trouble_counts.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = self.metric_sums / games[:, None]
+        return ({r: dict(zip(RESULT_METRICS, means[i])) for i, r in enumerate(RESULTS)},
+                dict(zip(RESULTS, games.tolist())))
+
+    def move_stats(self):
+        """Count, mean, std and approximate median of the move times at each move index.
+
+        Sums and sums of squares give mean and std; the median is interpolated
+        inside the MEDIAN_BIN_WIDTH bin where the cumulative count crosses
+        half. Returns a dict of arrays indexed by position (0 = first move).
+        """
+        self._flush()
+        return _summarize_moments(self.move_count, self.move_total, self.move_squares, self.move_hist)
+
+    def games(self):
+        """Per-game summary rows of every game, most recent first."""
+        return pd.DataFrame(self.rows)
+
+    def recent_games(self):
+        """(clock RaggedArray, move-time RaggedArray) for the first ``keep_games`` games."""
+        return (RaggedArray.from_lists(self.recent_clocks),
+                RaggedArray.from_lists(self.recent_moves))
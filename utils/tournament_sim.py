@@ -0,0 +1,200 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.win_probability import calculate_elo_expected
+
+FORMATS = ("round_robin", "swiss")
+DEFAULT_ITERATIONS = 10000
+CHUNK_CELLS = 5_000_000  # floats held per chunk (~40 MB)
+PARALLEL_MIN_GAMES = 20_000_000  # simulated games before a process pool pays off
+
+
+def elo_probability_matrix(ratings):
+    """Pairwise expected scores from ratings alone (ELO formula)."""
+    ratings = np.asarray(ratings, dtype=float)
+    probs = calculate_elo_expected(ratings[None, :] - ratings[:, None])
+    np.fill_diagonal(probs, 0.5)
+    return probs
+
+
+def _outcomes(p, u, draw_rate):
+    """Game scores for the first player from uniforms ``u``, keeping E[score] = p."""
+    if not draw_rate:
+        return (u < p).astype(float)
+    draw = np.minimum(draw_rate, 2 * np.minimum(p, 1 - p))
+    win = p - draw / 2
+    return np.where(u < win, 1.0, np.where(u < win + draw, 0.5, 0.0))
+
+
+def _finish_positions(scores, rng):
+    """0-based finishing position per player, ties broken at random."""
+    order = np.lexsort((rng.random(scores.shape), -scores), axis=1)
+    positions = np.empty_like(order)
+    np.put_along_axis(positions, order, np.arange(scores.shape[1])[None, :], axis=1)
+    return positions
+
+
+def _round_robin_scores(probs, iterations, cycles, draw_rate, rng):
+    n = len(probs)
+    a, b = np.triu_indices(n, k=1)
+    p = probs[a, b]
+
+    # Pair -> player incidence (+1 first, -1 second): totals are one matmul,
+    # since second players score (games played - first player's score)
+    pairs = np.arange(len(a))
+    incidence = np.zeros((len(a), n))
+    incidence[pairs, a] = 1
+    incidence[pairs, b] = -1
+    second_games = np.bincount(b, minlength=n).astype(float)
+
+    scores = np.zeros((iterations, n))
+    for _ in range(cycles):
+        result = _outcomes(p, rng.random((iterations, len(a))), draw_rate)
+        scores += result @ incidence + second_games
+    return scores
+
+
+def _swiss_scores(probs, iterations, rounds, draw_rate, rng):
+    n = len(probs)
+    half = n // 2
+    strength = probs.mean(axis=1)
+
+    sims = np.arange(iterations)[:, None]
+    scores = np.zeros((iterations, n))
+    played = np.zeros((iterations, n, n), dtype=bool)
+    had_bye = np.zeros((iterations, n), dtype=bool)
+    tiebreak = np.broadcast_to(-strength, scores.shape)
+
+    for round_num in range(rounds):
+        order = np.lexsort((tiebreak, -scores), axis=1)
+        if n % 2:
+            # Odd fields: the bye (a point) goes to the lowest-ranked player without one yet
+            eligible = ~had_bye[sims, order]
+            slot = n - 1 - np.argmax(eligible[:, ::-1], axis=1)
+            bye = order[sims[:, 0], slot]
+            scores[sims[:, 0], bye] += 1
+            had_bye[sims[:, 0], bye] = True
+            order = order[np.arange(n)[None, :] != slot[:, None]].reshape(iterations, n - 1)
+
+        if round_num == 0:
+            # Dutch system first round: top half against bottom half by seed
+            top, bottom = order[:, :half], order[:, half:].copy()
+        else:
+            # Later rounds: neighbours in the standings, one pass to dodge rematches
+            top, bottom = order[:, 0::2], order[:, 1::2].copy()
+            for k in range(half if half > 1 else 0):
+                other = k + 1 if k + 1 < half else k - 1
+                clash = played[sims[:, 0], top[:, k], bottom[:, k]]
+                if clash.any():
+                    swap = bottom[clash, k].copy()
+                    bottom[clash, k] = bottom[clash, other]
+                    bottom[clash, other] = swap
+
+        result = _outcomes(probs[top, bottom], rng.random((iterations, half)), draw_rate)
+        scores[sims, top] += result
+        scores[sims, bottom] += 1 - result
+        played[sims, top, bottom] = True
+        played[sims, bottom, top] = True
+
+    return scores
+
+
+def _simulate_chunk(probs, fmt, iterations, rounds, draw_rate, seed):
+    """Run one block of iterations and return summed statistics."""
+    rng = np.random.default_rng(seed)
+    if fmt == "round_robin":
+        scores = _round_robin_scores(probs, iterations, rounds, draw_rate, rng)
+    else:
+        scores = _swiss_scores(probs, iterations, rounds, draw_rate, rng)
+
+    n = scores.shape[1]
+    positions = _finish_positions(scores, rng)
+    cells = np.arange(n)[None, :] * n + positions
+    position_counts = np.bincount(cells.ravel(), minlength=n * n).reshape(n, n)
+    return scores.sum(axis=0), (scores ** 2).sum(axis=0), position_counts
+
+
+def simulate_tournament(probs, fmt="round_robin", iterations=DEFAULT_ITERATIONS, rounds=None,
+                        draw_rate=0.0, seed=None, workers=None):
+    """
+    Monte Carlo projection of final standings.
+
+    ``probs[i, j]`` is player i's expected score against j, e.g. the 'average'
+    table from ``predict_matchup_matrix`` or ``elo_probability_matrix``. For
+    round robin ``rounds`` is the number of cycles (2 = double round robin);
+    for Swiss it defaults to ceil(log2(players)). ``draw_rate`` turns part of
+    each game's probability mass into draws without changing its expectation.
+
+    Every iteration is simulated in bulk with NumPy; iterations are processed
+    in memory-bounded chunks, spread over a process pool for large runs
+    (``workers=1`` forces a single process).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown tournament format: {fmt}")
+
+    probs = np.array(probs, dtype=float)
+    n = len(probs)
+    if n < 2:
+        raise ValueError("Need at least two players")
+    probs[np.isnan(probs)] = 0.5
+    probs = np.clip(probs, 0.0, 1.0)
+
+    if fmt == "round_robin":
+        rounds = rounds or 1
+        games = rounds * n * (n - 1) // 2
+        cells = games
+    else:
+        rounds = rounds or math.ceil(math.log2(n))
+        games = rounds * ((n + 1) // 2)
+        cells = (n + 1) ** 2
+
+    chunk_size = max(1, min(iterations, CHUNK_CELLS // cells))
+    chunks = [min(chunk_size, iterations - start) for start in range(0, iterations, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    args = [(probs, fmt, size, rounds, draw_rate, s) for size, s in zip(chunks, seeds)]
+
+    if workers is None:
+        workers = (os.cpu_count() or 1) if games * iterations >= PARALLEL_MIN_GAMES else 1
+    workers = min(workers, len(chunks))
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_simulate_chunk, *zip(*args)))
+    else:
+        results = [_simulate_chunk(*a) for a in args]
+
+    score_sum = sum(r[0] for r in results)
+    score_sq_sum = sum(r[1] for r in results)
+    position_counts = sum(r[2] for r in results)
+
+    expected_score = score_sum / iterations
+    position_probs = position_counts / iterations
+
+    return {
+        'format': fmt,
+        'rounds': rounds,
+        'iterations': iterations,
+        'expected_score': expected_score,
+        'score_std': np.sqrt(np.maximum(score_sq_sum / iterations - expected_score ** 2, 0)),
+        'position_probs': position_probs,
+        'win_probability': position_probs[:, 0],
+        'expected_position': position_probs @ np.arange(1, n + 1)
+    }
+
+
+def standings_table(result, names):
+    """Projected standings as a DataFrame, best expected finish first."""
+    position_probs = result['position_probs']
+    table = pd.DataFrame({
+        'Player': names,
+        'Expected Score': result['expected_score'].round(2),
+        'Score Std': result['score_std'].round(2),
+        'Avg Position': result['expected_position'].round(1),
+        'Win %': (result['win_probability'] * 100).round(1),
+        'Top 3 %': (position_probs[:, :3].sum(axis=1) * 100).round(1)
+    })
+    return table.sort_values('Avg Position').reset_index(drop=True)
@@ -0,0 +1,424 @@
+import json
+import numpy as np
+import pandas as pd
+import requests
+
+MIN_GAMES_REQUIRED = 10
+ELO_FALLBACK_THRESHOLD = 400
+
+# Bump whenever process_games_for_player / calculate_player_features change,
+# so cached player features from the old code are not reused.
+FEATURE_VERSION = 1
+
+
+# Feature columns must match the trained model
+FEATURE_COLUMNS = [
+    # Rating
+    'rating_diff', 'elo_expected',
+    
+    # Player features
+    'form_5_adj', 'form_10_adj', 'form_20_adj',
+    'streak_norm', 'time_management', 'time_trouble_rate',
+    'is_white', 'color_advantage',
+    'rating_trend_norm', 'residual_ma10', 'avg_game_length',
+    'eco_A_wr', 'eco_B_wr', 'eco_C_wr', 'eco_D_wr', 'eco_E_wr',
+    
+    # Opponent features
+    'opp_form_5_adj', 'opp_form_10_adj', 'opp_streak_norm',
+    'opp_time_management', 'opp_rating_trend_norm', 'opp_residual_ma10',
+    'has_opponent_data',
+    
+    # Difference features
+    'form_5_diff', 'form_10_diff', 'streak_diff',
+    'time_mgmt_diff', 'residual_diff'
+]
+
+
+def get_api_headers():
+    return {"Accept": "application/x-ndjson"}
+
+
+def fetch_user_games(username, max_games=100, perf_type="blitz"):
+    url = f"https://lichess.org/api/games/user/{username}"
+    headers = get_api_headers()
+    params = {
+        "max": max_games,
+        "rated": "true",
+        "perfType": perf_type,
+        "clocks": "true",
+        "opening": "true"
+    }
+    
+    games = []
+    try:
+        response = requests.get(url, headers=headers, params=params, stream=True, timeout=30)
+        
+        if response.status_code == 404:
+            return None, "User not found"
+        
+        response.raise_for_status()
+        
+        for line in response.iter_lines():
+            if line:
+                game = json.loads(line.decode('utf-8'))
+                games.append(game)
+        
+        if len(games) == 0:
+            return None, f"No {perf_type} games found"
+        
+        return games, None
+        
+    except requests.exceptions.Timeout:
+        return None, "Request timeout"
+    except requests.exceptions.RequestException as e:
+        return None, f"API error: {str(e)}"
+
+
+def fetch_latest_game_id(username, perf_type="blitz"):
+    """Id of the player's newest rated game via a single-game probe, or None."""
+    url = f"https://lichess.org/api/games/user/{username}"
+    params = {
+        "max": 1,
+        "rated": "true",
+        "perfType": perf_type,
+        "moves": "false"
+    }
+    
+    try:
+        response = requests.get(url, headers=get_api_headers(), params=params, timeout=10)
+        if response.status_code != 200:
+            return None
+        lines = response.text.strip().splitlines()
+        return json.loads(lines[0]).get('id') if lines else None
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+
+
+def process_games_for_player(games, username):
+    processed = []
+    
+    for game in games:
+        try:
+            players = game.get('players', {})
+            white_info = players.get('white', {})
+            black_info = players.get('black', {})
+            
+            white_user = white_info.get('user', {}).get('name', '').lower()
+            black_user = black_info.get('user', {}).get('name', '').lower()
+            
+            is_white = white_user == username.lower()
+            player_color = 'white' if is_white else 'black'
+            
+            player_info = white_info if is_white else black_info
+            opponent_info = black_info if is_white else white_info
+            
+            player_rating = player_info.get('rating')
+            opponent_rating = opponent_info.get('rating')
+            
+            if not player_rating or not opponent_rating:
+                continue
+            
+            winner = game.get('winner')
+            if winner == player_color:
+                outcome_numeric = 1.0
+            elif winner is None:
+                outcome_numeric = 0.5
+            else:
+                outcome_numeric = 0.0
+            
+            clocks = game.get('clocks', [])
+            time_trouble = 0
+            
+            if clocks and len(clocks) > 0:
+                player_clocks = []
+                for i, clock in enumerate(clocks):
+                    if (i % 2 == 0 and is_white) or (i % 2 == 1 and not is_white):
+                        player_clocks.append(clock / 100)
+                
+                if player_clocks:
+                    min_clock = min(player_clocks)
+                    time_trouble = 1 if min_clock < 30 else 0
+            
+            opening = game.get('opening', {})
+            opening_eco = opening.get('eco', 'X')
+            eco_category = opening_eco[0] if opening_eco else 'X'
+            
+            moves_str = game.get('moves', '')
+            num_moves = len(moves_str.split()) // 2 if moves_str else 0
+            
+            processed.append({
+                'player_rating': player_rating,
+                'opponent_rating': opponent_rating,
+                'rating_gap': opponent_rating - player_rating,
+                'outcome_numeric': outcome_numeric,
+                'player_color': player_color,
+                'time_trouble': time_trouble,
+                'eco_category': eco_category,
+                'num_moves': num_moves
+            })
+            
+        except Exception:
+            continue
+    
+    return processed
+
+
+def calculate_elo_expected(rating_diff):
+    return 1 / (1 + 10 ** (rating_diff / 400))
+
+
+def calculate_player_features(processed_games):
+    if len(processed_games) < MIN_GAMES_REQUIRED:
+        return None
+    
+    df = pd.DataFrame(processed_games)
+    
+    current_rating = df.iloc[0]['player_rating']
+    
+    form_5 = df.head(5)['outcome_numeric'].mean()
+    form_10 = df.head(10)['outcome_numeric'].mean()
+    form_20 = df.head(20)['outcome_numeric'].mean()
+    
+    streak = 0
+    for outcome in df['outcome_numeric']:
+        if outcome == 1:
+            if streak >= 0:
+                streak += 1
+            else:
+                streak = 1
+        elif outcome == 0:
+            if streak <= 0:
+                streak -= 1
+            else:
+                streak = -1
+        else:
+            break
+    
+    time_trouble_rate = df['time_trouble'].mean()
+    
+    white_games = df[df['player_color'] == 'white']
+    black_games = df[df['player_color'] == 'black']
+    
+    white_wr = white_games['outcome_numeric'].mean() if len(white_games) > 0 else 0.5
+    black_wr = black_games['outcome_numeric'].mean() if len(black_games) > 0 else 0.5
+    
+    if len(df) >= 20:
+        rating_trend = df.iloc[0]['player_rating'] - df.iloc[19]['player_rating']
+    else:
+        rating_trend = 0
+    
+    avg_game_length = df.head(20)['num_moves'].mean()
+    
+    eco_wrs = {}
+    for eco_cat in ['A', 'B', 'C', 'D', 'E']:
+        eco_games = df[df['eco_category'] == eco_cat]
+        if len(eco_games) >= 3:
+            eco_wrs[eco_cat] = eco_games['outcome_numeric'].mean()
+        else:
+            eco_wrs[eco_cat] = 0.5
+    
+    residuals = []
+    for _, row in df.head(10).iterrows():
+        expected = calculate_elo_expected(row['rating_gap'])
+        residual = row['outcome_numeric'] - expected
+        residuals.append(residual)
+    residual_ma10 = np.mean(residuals) if residuals else 0
+    
+    games_last_7d = len(df)
+    
+    return {
+        'rating': current_rating,
+        'form_5': form_5,
+        'form_10': form_10,
+        'form_20': form_20,
+        'streak': streak,
+        'time_trouble_rate': time_trouble_rate,
+        'white_wr': white_wr,
+        'black_wr': black_wr,
+        'rating_trend': rating_trend,
+        'avg_game_length': avg_game_length,
+        'eco_A_wr': eco_wrs['A'],
+        'eco_B_wr': eco_wrs['B'],
+        'eco_C_wr': eco_wrs['C'],
+        'eco_D_wr': eco_wrs['D'],
+        'eco_E_wr': eco_wrs['E'],
+        'residual_ma10': residual_ma10,
+        'games_last_7d': games_last_7d,
+        'games_analyzed': len(df)
+    }
+
+
+def prepare_model_features(player_features, opponent_features, is_white):
+    """
+    Prepare features for the model including opponent and difference features.
+    """
+    rating_diff = opponent_features['rating'] - player_features['rating']
+    elo_expected = calculate_elo_expected(rating_diff)
+    
+    # Player features (adjusted)
+    form_5_adj = player_features['form_5'] - 0.5
+    form_10_adj = player_features['form_10'] - 0.5
+    form_20_adj = player_features['form_20'] - 0.5
+    streak_norm = player_features['streak'] / 10
+    time_management = 1 - player_features['time_trouble_rate']
+    rating_trend_norm = player_features['rating_trend'] / 100
+    
+    if is_white:
+        color_advantage = player_features['white_wr'] - 0.5
+    else:
+        color_advantage = player_features['black_wr'] - 0.5
+    
+    # Opponent features (adjusted)
+    opp_form_5_adj = opponent_features['form_5'] - 0.5
+    opp_form_10_adj = opponent_features['form_10'] - 0.5
+    opp_streak_norm = opponent_features['streak'] / 10
+    opp_time_management = 1 - opponent_features['time_trouble_rate']
+    opp_rating_trend_norm = opponent_features['rating_trend'] / 100
+    
+    # Difference features
+    form_5_diff = form_5_adj - opp_form_5_adj
+    form_10_diff = form_10_adj - opp_form_10_adj
+    streak_diff = streak_norm - opp_streak_norm
+    time_mgmt_diff = time_management - opp_time_management
+    residual_diff = player_features['residual_ma10'] - opponent_features['residual_ma10']
+    
+    features = {
+        # Rating
+        'rating_diff': rating_diff,
+        'elo_expected': elo_expected,
+        
+        # Player features
+        'form_5_adj': form_5_adj,
+        'form_10_adj': form_10_adj,
+        'form_20_adj': form_20_adj,
+        'streak_norm': streak_norm,
+        'time_management': time_management,
+        'time_trouble_rate': player_features['time_trouble_rate'],
+        'is_white': 1 if is_white else 0,
+        'color_advantage': color_advantage,
+        'rating_trend_norm': rating_trend_norm,
+        'residual_ma10': player_features['residual_ma10'],
+        'avg_game_length': player_features['avg_game_length'],
+        'eco_A_wr': player_features['eco_A_wr'],
+        'eco_B_wr': player_features['eco_B_wr'],
+        'eco_C_wr': player_features['eco_C_wr'],
+        'eco_D_wr': player_features['eco_D_wr'],
+        'eco_E_wr': player_features['eco_E_wr'],
+        
+        # Opponent features
+        'opp_form_5_adj': opp_form_5_adj,
+        'opp_form_10_adj': opp_form_10_adj,
+        'opp_streak_norm': opp_streak_norm,
+        'opp_time_management': opp_time_management,
+        'opp_rating_trend_norm': opp_rating_trend_norm,
+        'opp_residual_ma10': opponent_features['residual_ma10'],
+        'has_opponent_data': 1,
+        
+        # Difference features
+        'form_5_diff': form_5_diff,
+        'form_10_diff': form_10_diff,
+        'streak_diff': streak_diff,
+        'time_mgmt_diff': time_mgmt_diff,
+        'residual_diff': residual_diff
+    }
+    
+    return features
+
+
+def predict_win_probability(model_package, player_a_features, player_b_features, a_is_white):
+    """
+    Predict win probability with ELO fallback for extreme rating differences.
+    """
+    rating_diff = abs(player_a_features['rating'] - player_b_features['rating'])
+    
+    # Prepare features for display (always needed)
+    a_model_features = prepare_model_features(player_a_features, player_b_features, a_is_white)
+    b_model_features = prepare_model_features(player_b_features, player_a_features, not a_is_white)
+    
+    # Fallback: Extreme rating difference → Use ELO baseline
+    if rating_diff > ELO_FALLBACK_THRESHOLD:
+        elo_prob_a = calculate_elo_expected(player_b_features['rating'] - player_a_features['rating'])
+        elo_prob_b = 1 - elo_prob_a
+        
+        return elo_prob_a, elo_prob_b, a_model_features, b_model_features, True
+    
+    # Normal: Use ML model
+    model = model_package['model']
+    feature_columns = model_package.get('feature_columns', FEATURE_COLUMNS)
+    
+    a_input = np.array([[a_model_features[col] for col in feature_columns]])
+    b_input = np.array([[b_model_features[col] for col in feature_columns]])
+    
+    prob_a = model.predict_proba(a_input)[0, 1]
+    prob_b = model.predict_proba(b_input)[0, 1]
+    
+    total = prob_a + prob_b
+    if total > 0:
+        prob_a_normalized = prob_a / total
+        prob_b_normalized = prob_b / total
+    else:
+        prob_a_normalized = 0.5
+        prob_b_normalized = 0.5
+    
+    return prob_a_normalized, prob_b_normalized, a_model_features, b_model_features, False
+
+
+def predict_matchup_matrix(model_package, players_features):
+    """
+    Win probabilities for every ordered pair of players in one model call.
+    
+    Features are computed once per player, every (player, opponent, color) row
+    is stacked into a single matrix and scored with one predict_proba call.
+    Pairs beyond ELO_FALLBACK_THRESHOLD use the ELO baseline via a mask, so each
+    cell matches predict_win_probability for the same pair.
+    
+    Returns N x N arrays: 'white'[i, j] = P(i beats j with White),
+    'black'[i, j] = P(i beats j with Black), their 'average', and the
+    'fallback' mask. The diagonal is NaN.
+    """
+    n = len(players_features)
+    stacked = {
+        key: np.array([features[key] for features in players_features], dtype=float)
+        for key in players_features[0]
+    }
+    
+    # Every ordered pair (i, j) with i != j
+    rows, cols = np.nonzero(~np.eye(n, dtype=bool))
+    player = {key: values[rows] for key, values in stacked.items()}
+    opponent = {key: values[cols] for key, values in stacked.items()}
+    
+    feature_columns = model_package.get('feature_columns', FEATURE_COLUMNS)
+    blocks = []
+    for is_white in (True, False):
+        model_features = prepare_model_features(player, opponent, is_white)
+        blocks.append(np.column_stack([
+            np.broadcast_to(np.asarray(model_features[col], dtype=float), rows.shape)
+            for col in feature_columns
+        ]))
+    
+    scores = model_package['model'].predict_proba(np.vstack(blocks))[:, 1]
+    
+    raw_white = np.full((n, n), np.nan)
+    raw_black = np.full((n, n), np.nan)
+    raw_white[rows, cols] = scores[:len(rows)]
+    raw_black[rows, cols] = scores[len(rows):]
+    
+    # Same normalization as predict_win_probability: i as White against j as Black
+    with np.errstate(invalid='ignore', divide='ignore'):
+        total = raw_white + raw_black.T
+        white = np.where(total > 0, raw_white / total, 0.5)
+    
+    # ELO fallback for extreme rating differences
+    rating_gap = stacked['rating'][None, :] - stacked['rating'][:, None]
+    fallback = np.abs(rating_gap) > ELO_FALLBACK_THRESHOLD
+    white = np.where(fallback, calculate_elo_expected(rating_gap), white)
+    np.fill_diagonal(white, np.nan)
+    
+    black = 1 - white.T
+    
+    return {
+        'white': white,
+        'black': black,
+        'average': (white + black) / 2,
+        'fallback': fallback
+    }